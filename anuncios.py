@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sistema de Chamada Hospitalar - Áudio dos anúncios
+Gera uma vez no servidor o áudio de cada chamada para todas as telas tocarem
+"""
+
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+import threading
+import time
+import unicodedata
+import wave
+
+from cache import CacheLRU
+
+# Biblioteca opcional de trechos gravados: static/voz/<palavra>.wav
+PASTA_TRECHOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'voz')
+# Motor de voz offline opcional (espeak-ng ou espeak no PATH)
+MOTOR_TTS = shutil.which('espeak-ng') or shutil.which('espeak')
+VOZ_TTS = os.getenv('VOZ_TTS', 'pt-br')
+# Por quanto tempo (s) um texto cuja geração falhou não é tentado de novo
+VALIDADE_FALHA = 60
+
+audios = CacheLRU(64)      # {chave: bytes do WAV}
+textos = CacheLRU(1024)    # {chave: texto}, para gerar de novo após descarte
+falhas = CacheLRU(1024)    # {chave: instante da última falha}
+_gerando = {}              # {chave: threading.Event}
+_lock = threading.Lock()
+
+
+def texto_do_anuncio(paciente, sala):
+    """Mesma frase que as telas falavam com speechSynthesis"""
+    return f"{paciente}, compareça à {sala}"
+
+
+def chave_do_texto(texto):
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()[:20]
+
+
+def _palavras(texto):
+    normalizado = unicodedata.normalize('NFKD', texto.lower())
+    sem_acento = ''.join(c for c in normalizado if not unicodedata.combining(c))
+    return ''.join(c if c.isalnum() else ' ' for c in sem_acento).split()
+
+
+def _caminhos_trechos(texto):
+    """Trechos gravados de cada palavra do texto; None se faltar algum"""
+    if not os.path.isdir(PASTA_TRECHOS):
+        return None
+    caminhos = [os.path.join(PASTA_TRECHOS, f'{palavra}.wav') for palavra in _palavras(texto)]
+    if not caminhos or not all(os.path.exists(c) for c in caminhos):
+        return None
+    return caminhos
+
+
+def _concatenar_trechos(texto):
+    """Junta os trechos gravados de cada palavra; None se faltar alguma"""
+    caminhos = _caminhos_trechos(texto)
+    if caminhos is None:
+        return None
+
+    saida = io.BytesIO()
+    with wave.open(saida, 'wb') as destino:
+        for i, caminho in enumerate(caminhos):
+            with wave.open(caminho, 'rb') as trecho:
+                if i == 0:
+                    destino.setparams(trecho.getparams())
+                destino.writeframes(trecho.readframes(trecho.getnframes()))
+    return saida.getvalue()
+
+
+def _sintetizar(texto):
+    if not MOTOR_TTS:
+        return None
+    try:
+        resultado = subprocess.run(
+            [MOTOR_TTS, '-v', VOZ_TTS, '--stdout', texto],
+            capture_output=True, timeout=10, check=True
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"Erro ao sintetizar anúncio: {e}")
+        return None
+    return resultado.stdout or None
+
+
+def _falhou_ha_pouco(chave, agora=None):
+    instante = falhas.get(chave)
+    agora = time.monotonic() if agora is None else agora
+    return instante is not None and agora - instante < VALIDADE_FALHA
+
+
+def disponivel(texto):
+    """True se o servidor consegue gerar o áudio deste texto: motor TTS ou todos os
+    trechos gravados, e sem falha recente ao gerá-lo"""
+    if _falhou_ha_pouco(chave_do_texto(texto)):
+        return False
+    return bool(MOTOR_TTS) or _caminhos_trechos(texto) is not None
+
+
+def obter_audio(chave):
+    """Bytes do WAV da chave, gerando no máximo uma vez mesmo com várias telas pedindo"""
+    audio = audios.get(chave)
+    if audio is not None:
+        return audio
+    texto = textos.get(chave)
+    if texto is None or _falhou_ha_pouco(chave):
+        return None
+
+    with _lock:
+        evento = _gerando.get(chave)
+        dono = evento is None
+        if dono:
+            evento = _gerando[chave] = threading.Event()
+
+    if not dono:
+        evento.wait(15)
+        return audios.get(chave)
+
+    try:
+        audio = _concatenar_trechos(texto) or _sintetizar(texto)
+        if audio:
+            audios.set(chave, audio)
+        else:
+            # Sem isto, cada tela que pede o áudio tentaria gerá-lo de novo
+            falhas.set(chave, time.monotonic())
+        return audio
+    finally:
+        with _lock:
+            del _gerando[chave]
+        evento.set()
+
+
+def preparar(texto):
+    """Registra o texto e começa a gerar o áudio em segundo plano; retorna a chave"""
+    chave = chave_do_texto(texto)
+    textos.set(chave, texto)
+    if chave not in audios:
+        threading.Thread(target=obter_audio, args=(chave,), daemon=True).start()
+    return chave
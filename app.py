@@ -1,12 +1,29 @@
-from flask import Flask, render_template, request, session, redirect, url_for, flash
-from flask_socketio import SocketIO, emit, join_room
+from flask import Flask, Response, abort, has_request_context, jsonify, render_template, request, session, redirect, url_for, flash, stream_with_context
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
+from collections import defaultdict
 from datetime import datetime, timedelta
 import os
+import time
 from dotenv import load_dotenv
 import argparse
 
+import anuncios
+import assinaturas
+import click
+import exportacao
+from gateway_tcp import GatewayTCP
+import idempotencia
+import metricas
+import perfil
+from arquivo import Arquivador, ArquivoChamadas
+import relatorios
+import voo_unico
+from rastreio import LIMITE_RASTROS, Rastreador
+from cache_http import configurar_cache_http
+from estado import GerenciadorEstado, JANELA_LOTE_CHAT, TAMANHO_MAXIMO_CHAT
+
 # Carrega variáveis de ambiente
 load_dotenv()
 
@@ -20,6 +37,78 @@ db = SQLAlchemy(app)
 socketio = SocketIO(app, async_mode='threading')
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
+configurar_cache_http(app)
+
+# Estado em memória por unidade. Em implantações com vários processos cada
+# unidade fica fixada em um deles por hash do servidor_id (WORKER_ID de
+# TOTAL_WORKERS); URLS_WORKERS lista a URL base de cada processo, na ordem.
+estados = GerenciadorEstado(
+    total_workers=int(os.getenv('TOTAL_WORKERS', '1')),
+    worker_id=int(os.getenv('WORKER_ID', '0'))
+)
+# Folga (ms) entre a emissão da chamada e o instante em que as telas a tocam juntas
+ATRASO_ANUNCIO_MS = int(os.getenv('ANUNCIO_ATRASO_MS', '1500'))
+URLS_WORKERS = [url.rstrip('/') for url in os.getenv('URLS_WORKERS', '').split(',') if url]
+# Áreas de espera ('nome=1,2,3;outra=7,8'): cada recepção pode acompanhar só as salas de uma área
+AREAS_ESPERA = assinaturas.ler_areas(os.getenv('AREAS_ESPERA'))
+# Painel da sala de espera: tempo máximo (s) de um long-poll e intervalo entre batimentos do SSE
+PAINEL_ESPERA = int(os.getenv('PAINEL_ESPERA', '25'))
+PAINEL_BATIMENTO = int(os.getenv('PAINEL_BATIMENTO', '15'))
+
+# Métricas de operação, publicadas em /metrics no formato do Prometheus
+registro_metricas = metricas.Registro()
+metrica_chamadas = registro_metricas.contador('chamadas_total', 'Pacientes chamados', ['servidor_id'])
+metrica_chamar = registro_metricas.histograma(
+    'chamar_paciente_segundos', 'Duração de chamar_paciente, da gravação ao envio para as telas')
+metrica_chamadas_repetidas = registro_metricas.contador(
+    'chamadas_repetidas_total', 'Chamadas descartadas por repetir a chave de idempotência')
+metrica_rechamadas = registro_metricas.contador('rechamadas_total', 'Chamadas repetidas com chamar novamente')
+metrica_conexoes = registro_metricas.contador('conexoes_total', 'Conexões Socket.IO aceitas', ['tipo'])
+metrica_clientes = registro_metricas.medidor('clientes_conectados', 'Conexões Socket.IO abertas', ['tipo'])
+metrica_paineis = registro_metricas.medidor(
+    'paineis_conectados', 'Painéis da sala de espera aguardando mudanças', ['modo'])
+metrica_connect = registro_metricas.histograma('connect_segundos', 'Duração de handle_connect')
+metrica_eventos = registro_metricas.contador('eventos_emitidos_total', 'Eventos enviados às telas', ['evento'])
+metrica_emissao = registro_metricas.histograma(
+    'emissao_segundos', 'Tempo para numerar e distribuir um evento a uma sala', ['evento'])
+metrica_db = registro_metricas.histograma('db_comando_segundos', 'Duração dos comandos SQL', ['operacao'])
+# Perfilador por amostragem, ligado sob demanda em /admin/perfil (PERFIL_TOKEN)
+perfilador = perfil.Perfilador()
+
+# trace_id e horário de cada estágio de chamar_paciente, até o anúncio nas telas
+rastreador = Rastreador(registro_metricas)
+# Gateway para os clientes Tk (protocolo do servidor central), ligado com GATEWAY_TCP_PORTA
+GATEWAY_TCP_PORTA = int(os.getenv('GATEWAY_TCP_PORTA', '0'))
+gateway_tcp = GatewayTCP(
+    GATEWAY_TCP_PORTA, int(os.getenv('GATEWAY_TCP_UNIDADE', '1')),
+    publicar_chamada=lambda *args: publicar_chamada(*args),
+    estado_da_unidade=lambda servidor_id: estado_da_unidade(servidor_id),
+    atende=estados.atende, rastreador=rastreador, contexto=lambda: app.app_context(), areas=AREAS_ESPERA)
+registro_metricas.coletar('gateway_tcp_clientes', 'Clientes Tk conectados pelo gateway TCP', ['tipo'],
+                          gateway_tcp.contar_clientes)
+# Chaves de idempotência de chamar_paciente já atendidas, por unidade e médico
+chamadas_idempotentes = idempotencia.CacheIdempotencia(
+    validade=int(os.getenv('IDEMPOTENCIA_VALIDADE', str(idempotencia.VALIDADE_PADRAO))))
+# Cache por versão do snapshot da fila, por unidade e salas. O snapshot é montado
+# sob o lock da unidade (a sequência enviada tem de bater com ele), então os pedidos
+# já chegam um de cada vez: aqui o VooUnico só evita remontar uma versão já montada.
+# O emit ainda codifica o snapshot para cada tela. O gateway TCP tem o seu, já codificado por codec.
+cache_filas = voo_unico.VooUnico()
+registro_metricas.coletar(
+    'fila_pedidos_total', 'Envios da fila: montados (calculados) ou reaproveitados (compartilhados)',
+    ['origem', 'resultado'],
+    lambda: {**{('web', k): v for k, v in cache_filas.resumo().items()},
+             **{('tcp', k): v for k, v in gateway_tcp.filas_compartilhadas.resumo().items()}},
+    tipo='counter')
+registro_metricas.coletar(
+    'medicos_conectados', 'Médicos conectados por sala', ['servidor_id', 'sala'],
+    lambda: {(estado.servidor_id, sala): total
+             for estado in estados.unidades() for sala, total in estado.resumo()['salas_conectadas'].items()})
+registro_metricas.coletar(
+    'unidade_eventos_total', 'Contadores do estado de cada unidade (chat, conexões...)', ['servidor_id', 'contador'],
+    lambda: {(estado.servidor_id, nome): total
+             for estado in estados.unidades() for nome, total in estado.resumo()['contadores'].items()},
+    tipo='counter')
 
 # Modelos
 class Servidor(db.Model):
@@ -53,11 +142,72 @@ class Chamada(db.Model):
     cor = db.Column(db.String(20), nullable=False, default='cinza')  # cor do paciente
     classificacao = db.Column(db.String(100), nullable=True)  # classificação da sala
     servidor_id = db.Column(db.Integer, db.ForeignKey('servidor.id'), nullable=False)
+    # "Chamar novamente" atualiza a própria linha em vez de criar outra
+    rechamadas = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    ultima_chamada = db.Column(db.DateTime, nullable=True)
+
+    # Consultas de chamadas recentes e relatórios filtram por unidade e período
+    __table_args__ = (db.Index('ix_chamada_servidor_timestamp', 'servidor_id', 'timestamp'),)
+
+class ResumoChamadas(db.Model):
+    """Total de chamadas por hora, unidade, médico, cor e classificação (atualizado a cada chamada)"""
+    id = db.Column(db.Integer, primary_key=True)
+    servidor_id = db.Column(db.Integer, db.ForeignKey('servidor.id'), nullable=False)
+    periodo = db.Column(db.DateTime, nullable=False)  # hora cheia, no mesmo horário de Chamada.timestamp
+    medico = db.Column(db.String(80), nullable=False)  # username
+    nome_medico = db.Column(db.String(100), nullable=True)
+    cor = db.Column(db.String(20), nullable=False, default='cinza')
+    classificacao = db.Column(db.String(100), nullable=False, default='')
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('servidor_id', 'periodo', 'medico', 'cor', 'classificacao', name='unique_resumo_chamadas'),
+        db.Index('ix_resumo_servidor_periodo', 'servidor_id', 'periodo'),
+    )
 
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
 
+def chamada_para_dict(c):
+    return {
+        'id': c.id,
+        'paciente': c.paciente,
+        'sala': c.sala,
+        'medico': c.nome_medico or c.medico,
+        'timestamp': c.timestamp.isoformat(),
+        'cor': getattr(c, 'cor', 'cinza') or 'cinza',
+        'classificacao': getattr(c, 'classificacao', '') or '',
+        'rechamadas': c.rechamadas or 0,
+        'ultima_chamada': c.ultima_chamada.isoformat() if c.ultima_chamada else None
+    }
+
+def chamada_para_registro(c):
+    """Todos os campos da chamada, como guardados no arquivo mensal"""
+    return {
+        'id': c.id,
+        'servidor_id': c.servidor_id,
+        'paciente': c.paciente,
+        'sala': c.sala,
+        'medico': c.medico,
+        'nome_medico': c.nome_medico,
+        'timestamp': c.timestamp.isoformat(),
+        'cor': c.cor or 'cinza',
+        'classificacao': c.classificacao or ''
+    }
+
+def estado_da_unidade(servidor_id):
+    """Shard da unidade, com as chamadas recentes carregadas do banco no primeiro uso"""
+    estado = estados.unidade(servidor_id)
+    if not estado.chamadas_carregadas:
+        with estado.lock:
+            if not estado.chamadas_carregadas:
+                chamadas = Chamada.query.filter_by(
+                    servidor_id=servidor_id
+                ).order_by(Chamada.timestamp.desc()).limit(estado.chamadas_recentes.maxlen).all()
+                estado.carregar_chamadas([(c.medico, chamada_para_dict(c)) for c in chamadas])
+    return estado
+
 # Rotas
 @app.route('/')
 def index():
@@ -78,6 +228,9 @@ def selecionar_servidor():
                 session['servidor_id'] = servidor.id
                 session['servidor_nome'] = servidor.nome
                 flash(f'Servidor "{servidor.nome}" selecionado com sucesso!', 'success')
+                # Unidade fixada em outro processo: continua o login por lá
+                if not estados.atende(servidor.id) and URLS_WORKERS:
+                    return redirect(URLS_WORKERS[estados.worker_da_unidade(servidor.id)] + url_for('login'))
                 return redirect(url_for('login'))
             else:
                 flash('Servidor não encontrado ou inativo.', 'danger')
@@ -167,14 +320,7 @@ def dashboard():
             medico=current_user.username,
             servidor_id=current_user.servidor_id
         ).order_by(Chamada.timestamp.desc()).limit(5).all()
-        chamadas_json = [{
-            'id': c.id,
-            'paciente': c.paciente,
-            'sala': c.sala,
-            'medico': c.nome_medico or c.medico,
-            'timestamp': c.timestamp.isoformat(),
-            'cor': getattr(c, 'cor', 'cinza') or 'cinza'
-        } for c in ultimas_chamadas]
+        chamadas_json = [chamada_para_dict(c) for c in ultimas_chamadas]
         return render_template('medico.html', ultimas_chamadas=chamadas_json)
     return render_template('recepcao.html')
 
@@ -188,52 +334,263 @@ def editar_perfil():
         flash('Perfil atualizado com sucesso!', 'success')
     return redirect(url_for('dashboard'))
 
+@app.route('/anuncio/<chave>.wav')
+@login_required
+def audio_anuncio(chave):
+    audio = anuncios.obter_audio(chave)
+    if audio is None:
+        abort(404)
+    resposta = Response(audio, mimetype='audio/wav')
+    # A chave é o hash do texto, então o conteúdo de uma URL nunca muda
+    resposta.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return resposta
+
+@app.route('/api/relatorios')
+@login_required
+def api_relatorios():
+    """Chamadas por hora/dia, por médico, por cor e por classificação da unidade"""
+    try:
+        inicio, fim = relatorios.intervalo_de_datas(request.args.get('inicio'), request.args.get('fim'))
+    except ValueError:
+        return jsonify({'erro': 'Datas devem estar no formato AAAA-MM-DD'}), 400
+    agrupar = request.args.get('agrupar', 'dia')
+    if agrupar not in ('hora', 'dia'):
+        return jsonify({'erro': "agrupar deve ser 'hora' ou 'dia'"}), 400
+
+    filtro = (
+        ResumoChamadas.servidor_id == current_user.servidor_id,
+        ResumoChamadas.periodo >= inicio,
+        ResumoChamadas.periodo < fim,
+    )
+    soma = db.func.sum(ResumoChamadas.total)
+    por_hora = db.session.query(ResumoChamadas.periodo, soma).filter(*filtro).group_by(ResumoChamadas.periodo).all()
+    por_medico = db.session.query(
+        ResumoChamadas.medico, db.func.max(ResumoChamadas.nome_medico), soma
+    ).filter(*filtro).group_by(ResumoChamadas.medico).order_by(soma.desc()).all()
+    por_cor = db.session.query(ResumoChamadas.cor, soma).filter(*filtro).group_by(ResumoChamadas.cor).all()
+    por_classificacao = db.session.query(
+        ResumoChamadas.classificacao, soma
+    ).filter(*filtro).group_by(ResumoChamadas.classificacao).all()
+
+    return jsonify({
+        'inicio': inicio.strftime('%Y-%m-%d'),
+        'fim': (fim - timedelta(days=1)).strftime('%Y-%m-%d'),
+        'total': sum(total for _, total in por_hora),
+        'por_periodo': relatorios.agrupar_periodos(por_hora, agrupar),
+        'por_medico': [{'medico': nome or medico, 'usuario': medico, 'total': total}
+                       for medico, nome, total in por_medico],
+        'por_cor': {cor: total for cor, total in por_cor},
+        'por_classificacao': {classificacao: total for classificacao, total in por_classificacao},
+    })
+
+def painel_da_unidade(servidor_id):
+    """Shard da unidade para o painel público; 404 se a unidade não existe ou é de outro processo"""
+    if not estados.atende(servidor_id):
+        abort(404)
+    estado = estados.unidade(servidor_id)
+    if not estado.chamadas_carregadas:
+        # Só o primeiro acesso consulta o banco; depois tudo vem da memória
+        servidor = db.session.get(Servidor, servidor_id)
+        if servidor is None or not servidor.ativo:
+            abort(404)
+    return estado_da_unidade(servidor_id)
+
+def relogio_ms():
+    return round(time.time() * 1000)
+
+@app.route('/painel/<int:servidor_id>')
+def painel(servidor_id):
+    """Tela da sala de espera, sem login: destaque e últimas chamadas da unidade"""
+    if not estados.atende(servidor_id) and URLS_WORKERS:
+        return redirect(URLS_WORKERS[estados.worker_da_unidade(servidor_id)] + request.full_path)
+    servidor = db.session.get(Servidor, servidor_id)
+    if servidor is None or not servidor.ativo:
+        abort(404)
+    return render_template('painel.html', servidor=servidor)
+
+@app.route('/api/painel/<int:servidor_id>')
+def api_painel(servidor_id):
+    """Snapshot do painel com ETag. Com esperar=1 e If-None-Match igual à versão atual,
+    a resposta fica presa até a próxima chamada (ou PAINEL_ESPERA s, com 304)"""
+    estado = painel_da_unidade(servidor_id)
+    etag, corpo = estado.painel()
+    if request.args.get('esperar') and request.if_none_match.contains(etag):
+        metrica_paineis.rotulos('longpoll').inc()
+        try:
+            etag, corpo = estado.esperar_painel(etag, PAINEL_ESPERA)
+        finally:
+            metrica_paineis.rotulos('longpoll').dec()
+    if request.if_none_match.contains(etag):
+        resposta = Response(status=304)
+    else:
+        resposta = Response(corpo, mimetype='application/json')
+    resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = 'no-cache'
+    # Relógio do servidor, para o painel tocar a chamada em "tocar_em" junto com as outras telas
+    resposta.headers['X-Relogio-Servidor'] = str(relogio_ms())
+    return resposta
+
+@app.route('/api/painel/<int:servidor_id>/eventos')
+def api_painel_eventos(servidor_id):
+    """O mesmo snapshot por Server-Sent Events: um evento 'painel' por versão (id = ETag)
+    e um 'relogio' a cada PAINEL_BATIMENTO s, que também mantém a conexão aberta"""
+    estado = painel_da_unidade(servidor_id)
+    ultimo = request.headers.get('Last-Event-ID')
+
+    def eventos():
+        etag = ultimo
+        metrica_paineis.rotulos('sse').inc()
+        try:
+            yield f'retry: 3000\nevent: relogio\ndata: {relogio_ms()}\n\n'
+            while True:
+                novo, corpo = estado.esperar_painel(etag, PAINEL_BATIMENTO)
+                if novo == etag:
+                    yield f'event: relogio\ndata: {relogio_ms()}\n\n'
+                    continue
+                etag = novo
+                yield (f'event: relogio\ndata: {relogio_ms()}\n\n'
+                       f'id: {etag}\nevent: painel\ndata: {corpo.decode("utf-8")}\n\n')
+        finally:
+            metrica_paineis.rotulos('sse').dec()
+
+    resposta = Response(eventos(), mimetype='text/event-stream')
+    resposta.headers['Cache-Control'] = 'no-cache'
+    resposta.headers['X-Accel-Buffering'] = 'no'  # nginx não pode acumular o stream
+    return resposta
+
+def url_do_audio(chave):
+    """Caminho do áudio do anúncio, também fora de um pedido HTTP (gateway TCP)"""
+    if has_request_context():
+        return url_for('audio_anuncio', chave=chave)
+    return app.url_map.bind('').build('audio_anuncio', {'chave': chave})
+
+def horario_do_anuncio():
+    """Instante (epoch em ms, relógio do servidor) em que todas as telas tocam a chamada"""
+    return round(time.time() * 1000) + ATRASO_ANUNCIO_MS
+
+def sala_da_recepcao(servidor_id, sala):
+    """Sala de socket das recepções que acompanham só algumas salas da unidade"""
+    return f'recepcao_{sala}_{servidor_id}'
+
+def emitir_para_unidade(estado, evento, dados, sala_socket, destino=None):
+    """Emite um evento numerado para uma sala da unidade e guarda-o para replay.
+
+    `destino` (padrão: a própria sala_socket) são as salas de socket que recebem;
+    a numeração e o log de replay continuam sendo os de sala_socket.
+    """
+    # Numerar e emitir sob o lock da unidade mantém a ordem dos números na rede
+    with metrica_emissao.rotulos(evento).medir(), estado.lock:
+        dados = estado.registrar_evento(sala_socket, evento, dados)
+        socketio.emit(evento, dados, room=destino or sala_socket)
+        gateway_tcp.publicar(estado.servidor_id, evento, dados, sala_socket)
+    metrica_eventos.rotulos(evento).inc()
+    return dados
+
+def destino_da_chamada(servidor_id, sala):
+    """Recepções sem filtro e as que assinaram a sala: as salas de socket são o índice sala -> telas"""
+    return [f'recepcao_{servidor_id}', sala_da_recepcao(servidor_id, sala)]
+
+def versao_da_fila(estado):
+    """(versão das chamadas, sequência da recepção): muda com qualquer coisa que o snapshot mostre"""
+    return estado.versao_chamadas, estado.sequencia_atual(f'recepcao_{estado.servidor_id}')['seq']
+
+def enviar_fila_atual(estado, salas=None):
+    """Snapshot das últimas chamadas (das salas assinadas) junto com a sequência que ele representa.
+
+    Sob o lock da unidade, nenhum evento é numerado entre montar o snapshot e
+    emiti-lo; o cache só evita remontar a mesma versão para cada tela.
+    """
+    chave = (estado.servidor_id, salas)
+    with estado.lock:
+        versao = versao_da_fila(estado)
+        chamadas, _ = cache_filas.obter(chave, versao, lambda: estado.ultimas_chamadas(6, salas=salas))
+        emit('fila_atual', (chamadas, estado.sequencia_atual(f'recepcao_{estado.servidor_id}')))
+
 # WebSocket events
 @socketio.on('connect')
-def handle_connect():
+@perfilador.medir('connect')
+@metrica_connect.cronometrar
+def handle_connect(auth=None):
+    tipo = current_user.role if current_user.is_authenticated else 'anonimo'
+    if current_user.is_authenticated and not estados.atende(current_user.servidor_id):
+        return False  # Unidade pertence a outro processo
     if current_user.is_authenticated:
-        join_room(f'{current_user.role}_{current_user.servidor_id}')
+        estado = estado_da_unidade(current_user.servidor_id)
+        sala_unidade = f'{current_user.role}_{current_user.servidor_id}'
         if current_user.role == 'medico':
+            join_room(sala_unidade)
             join_room(f'medico_{current_user.sala}_{current_user.servidor_id}')
+            estado.conectar_sala(current_user.sala)
+            # Médico que entra agora recebe o que já foi conversado
+            emit('chat_historico', estado.historico_chat())
             # Envia as últimas chamadas ao conectar
             ultimas_chamadas = Chamada.query.filter_by(
                 medico=current_user.username,
                 servidor_id=current_user.servidor_id
             ).order_by(Chamada.timestamp.desc()).limit(8).all()
-            chamadas_json = [{
-                'id': c.id,
-                'paciente': c.paciente,
-                'sala': c.sala,
-                'medico': c.nome_medico or c.medico,
-                'timestamp': c.timestamp.isoformat(),
-                'cor': getattr(c, 'cor', 'cinza') or 'cinza',
-                'classificacao': getattr(c, 'classificacao', '') or ''
-            } for c in ultimas_chamadas]
-            emit('ultimas_chamadas', chamadas_json)
+            emit('ultimas_chamadas', [chamada_para_dict(c) for c in ultimas_chamadas])
         elif current_user.role == 'recepcao':
-            # Envia as últimas 6 chamadas ao conectar
-            chamadas = Chamada.query.filter_by(
-                servidor_id=current_user.servidor_id
-            ).order_by(Chamada.timestamp.desc()).limit(6).all()
-            chamadas_json = [{
-                'id': c.id,
-                'paciente': c.paciente,
-                'sala': c.sala,
-                'medico': c.nome_medico or c.medico,
-                'timestamp': c.timestamp.isoformat(),
-                'cor': getattr(c, 'cor', 'cinza') or 'cinza',
-                'classificacao': getattr(c, 'classificacao', '') or ''
-            } for c in chamadas]
-            emit('fila_atual', chamadas_json)
+            # Reconexão: a tela informa o último evento que viu e recebe só o
+            # que perdeu; sem isso (ou se for antigo demais) vai o snapshot
+            auth = auth or {}
+            try:
+                salas = assinaturas.normalizar_salas(auth.get('salas'), AREAS_ESPERA)
+            except ValueError:
+                return False
+            session['salas_assinadas'] = salas
+            with estado.lock:
+                entrar_nas_salas(current_user.servidor_id, salas)
+                perdidos = estado.eventos_desde(sala_unidade, auth.get('ultimo_seq'), auth.get('epoca'))
+                if perdidos is None:
+                    enviar_fila_atual(estado, salas)
+                else:
+                    for evento, dados in perdidos:
+                        if assinaturas.na_assinatura(salas, dados.get('sala')):
+                            emit(evento, dados)
+        else:
+            join_room(sala_unidade)
+    # Só conexões aceitas: uma recusada (return False) não recebe o disconnect que desconta o cliente
+    metrica_conexoes.rotulos(tipo).inc()
+    metrica_clientes.rotulos(tipo).inc()
+
+def entrar_nas_salas(servidor_id, salas):
+    """Recepção sem filtro entra na sala da unidade; com filtro, na sala de socket de cada sala assinada"""
+    if salas is None:
+        join_room(f'recepcao_{servidor_id}')
+    else:
+        for sala in salas:
+            join_room(sala_da_recepcao(servidor_id, sala))
+
+def sair_das_salas(servidor_id, salas):
+    if salas is None:
+        leave_room(f'recepcao_{servidor_id}')
+    else:
+        for sala in salas:
+            leave_room(sala_da_recepcao(servidor_id, sala))
+
+@socketio.on('disconnect')
+@perfilador.medir('disconnect')
+def handle_disconnect():
+    metrica_clientes.rotulos(current_user.role if current_user.is_authenticated else 'anonimo').dec()
+    if current_user.is_authenticated and current_user.role == 'medico':
+        estado = estados.unidade(current_user.servidor_id)
+        estado.desconectar_sala(current_user.sala)
+        estado.esquecer_remetente(request.sid)
 
 @socketio.on('atualizar_sala')
+@perfilador.medir('atualizar_sala')
 def handle_atualizar_sala(data):
     if current_user.role != 'medico':
         return
     
     # Atualiza a sala do médico
+    estado = estados.unidade(current_user.servidor_id)
+    estado.desconectar_sala(current_user.sala)
+    leave_room(f'medico_{current_user.sala}_{current_user.servidor_id}')
     current_user.sala = data['sala']
     db.session.commit()
+    join_room(f'medico_{current_user.sala}_{current_user.servidor_id}')
+    estado.conectar_sala(current_user.sala)
     
     # Notifica o médico
     emit('sala_atualizada', {
@@ -241,81 +598,412 @@ def handle_atualizar_sala(data):
     })
 
 @socketio.on('chamar_paciente')
+@perfilador.medir('chamar_paciente')
+@metrica_chamar.cronometrar
 def handle_chamar_paciente(data):
     if current_user.role != 'medico':
         return
-    # Subtrai 3 horas do horário atual
-    horario_chamada = datetime.utcnow() - timedelta(hours=3)
+    chave = data.get('idempotency_key')
+    if not idempotencia.chave_valida(chave):
+        return registrar_chamada(data)
+    # Clique duplo ou reenvio: a mesma chave recebe a resposta guardada, sem gravar nem anunciar
+    resposta, repetida = chamadas_idempotentes.executar(
+        (current_user.servidor_id, current_user.username, chave), lambda: registrar_chamada(data))
+    if repetida:
+        metrica_chamadas_repetidas.inc()
+        return dict(resposta, repetida=True)
+    return resposta
+
+def registrar_chamada(data):
+    """Grava a chamada do médico atual e avisa as telas da unidade"""
+    chamada = publicar_chamada(current_user.servidor_id, current_user.username, current_user.nome_completo, data)
+    # Atualiza a lista de chamadas do próprio médico
+    ultimas_chamadas = Chamada.query.filter_by(
+        medico=current_user.username,
+        servidor_id=current_user.servidor_id
+    ).order_by(Chamada.timestamp.desc()).limit(8).all()
+    chamadas_json = [chamada_para_dict(c) for c in ultimas_chamadas]
+    emit('ultimas_chamadas', chamadas_json, room=f'medico_{current_user.sala}_{current_user.servidor_id}')
+    # Resposta (ack) ao médico: o id usado por "chamar novamente"
+    return {'id': chamada['id']}
+
+def publicar_chamada(servidor_id, medico, nome_medico, data):
+    """Grava a chamada e a envia às telas da unidade (web e gateway TCP); retorna o dict enviado"""
+    trace_id = rastreador.iniciar(data.get('trace_id'), data.get('enviado_em'),
+                                  servidor_id=servidor_id, sala=data['sala'])
+    horario_chamada = relatorios.agora_local()
     chamada = Chamada(
         paciente=data['paciente'],
         sala=data['sala'],
-        medico=current_user.username,
-        nome_medico=current_user.nome_completo,
+        medico=medico,
+        nome_medico=nome_medico,
         timestamp=horario_chamada,
         cor=data.get('cor', 'cinza'),
         classificacao=data.get('classificacao', ''),
-        servidor_id=current_user.servidor_id
+        servidor_id=servidor_id
     )
     db.session.add(chamada)
+    # O resumo por hora é atualizado na mesma transação da chamada
+    relatorios.somar_resumo(db.session, ResumoChamadas, chamada.servidor_id,
+                            relatorios.truncar_hora(chamada.timestamp), chamada.medico,
+                            chamada.nome_medico, chamada.cor, chamada.classificacao)
     db.session.commit()
-    chamada_dict = {
-        'id': chamada.id,
-        'paciente': chamada.paciente,
-        'sala': chamada.sala,
-        'medico': chamada.nome_medico or chamada.medico,
-        'timestamp': chamada.timestamp.isoformat(),
-        'cor': chamada.cor,
-        'classificacao': chamada.classificacao
-    }
-    emit('nova_chamada', chamada_dict, room=f'recepcao_{current_user.servidor_id}')
-    emit('nova_chamada', chamada_dict, room=f'medico_{current_user.servidor_id}')  # Envia para todos os médicos conectados
-    # Atualiza a lista de chamadas do próprio médico
-    ultimas_chamadas = Chamada.query.filter_by(
-        medico=current_user.username,
-        servidor_id=current_user.servidor_id
-    ).order_by(Chamada.timestamp.desc()).limit(8).all()
-    chamadas_json = [{
-        'id': c.id,
-        'paciente': c.paciente,
-        'sala': c.sala,
-        'medico': c.nome_medico or c.medico,
-        'timestamp': c.timestamp.isoformat(),
-        'cor': getattr(c, 'cor', 'cinza') or 'cinza',
-        'classificacao': getattr(c, 'classificacao', '') or ''
-    } for c in ultimas_chamadas]
-    emit('ultimas_chamadas', chamadas_json, room=f'medico_{current_user.sala}_{current_user.servidor_id}')
+    rastreador.marcar(trace_id, 'persistido')
+    metrica_chamadas.rotulos(chamada.servidor_id).inc()
+    chamada_dict = chamada_para_dict(chamada)
+    chamada_dict['trace_id'] = trace_id
+    texto = anuncios.texto_do_anuncio(chamada.paciente, chamada.sala)
+    if anuncios.disponivel(texto):
+        # Áudio gerado uma vez no servidor; as telas só tocam o arquivo
+        chamada_dict['audio_url'] = url_do_audio(anuncios.preparar(texto))
+    chamada_dict['tocar_em'] = horario_do_anuncio()
+    estado = estado_da_unidade(servidor_id)
+    with estado.lock:
+        estado.registrar_chamada(chamada.medico, chamada_dict)
+        emitir_para_unidade(estado, 'nova_chamada', chamada_dict, f'recepcao_{servidor_id}',
+                            destino_da_chamada(servidor_id, chamada.sala))
+        emitir_para_unidade(estado, 'nova_chamada', chamada_dict, f'medico_{servidor_id}')  # Envia para todos os médicos conectados
+    rastreador.marcar(trace_id, 'emitido')
+    return chamada_dict
+
+@socketio.on('sincronizar_relogio')
+@perfilador.medir('sincronizar_relogio')
+def handle_sincronizar_relogio(data=None):
+    """Troca no estilo NTP: com os instantes de chegada e resposta a tela estima atraso e diferença de relógio"""
+    recebido_em = time.time() * 1000
+    return {'recebido_em': recebido_em, 'enviado_em': time.time() * 1000}
+
+@socketio.on('rechamar_paciente')
+@perfilador.medir('rechamar_paciente')
+def handle_rechamar_paciente(data):
+    """Repete o anúncio de uma chamada existente: um UPDATE pela chave, sem nova linha nem consulta"""
+    if not current_user.is_authenticated or current_user.role != 'medico' or not isinstance(data, dict):
+        return
+    try:
+        chamada_id = int(data.get('id'))
+    except (TypeError, ValueError):
+        return {'erro': 'Chamada inválida'}
+    trace_id = rastreador.iniciar(data.get('trace_id'), data.get('enviado_em'),
+                                  servidor_id=current_user.servidor_id, rechamada=True)
+    # Shard resolvido antes do UPDATE: carregado depois, ele já traria a rechamada que rechamar() soma
+    estado = estado_da_unidade(current_user.servidor_id)
+    agora = relatorios.agora_local()
+    atualizadas = Chamada.query.filter_by(
+        id=chamada_id, servidor_id=current_user.servidor_id, medico=current_user.username
+    ).update({Chamada.rechamadas: Chamada.rechamadas + 1, Chamada.ultima_chamada: agora},
+             synchronize_session=False)
+    db.session.commit()
+    if not atualizadas:
+        return {'erro': 'Chamada não encontrada'}
+    rastreador.marcar(trace_id, 'persistido')
+
+    chamada = estado.rechamar(chamada_id, agora.isoformat())
+    if chamada is None:
+        # Chamada antiga, fora do cache: lê só esta linha
+        chamada = chamada_para_dict(db.session.get(Chamada, chamada_id))
+    rechamada = {campo: chamada.get(campo) for campo in ('id', 'paciente', 'sala', 'cor', 'rechamadas', 'ultima_chamada')}
+    rechamada['trace_id'] = trace_id
+    rechamada['tocar_em'] = horario_do_anuncio()
+    texto = anuncios.texto_do_anuncio(chamada['paciente'], chamada['sala'])
+    if anuncios.disponivel(texto):
+        rechamada['audio_url'] = url_do_audio(anuncios.preparar(texto))
+    emitir_para_unidade(estado, 'rechamada', rechamada, f'recepcao_{current_user.servidor_id}',
+                        destino_da_chamada(current_user.servidor_id, rechamada['sala']))
+    # Os médicos também veem a rechamada, como veem a nova_chamada
+    emitir_para_unidade(estado, 'rechamada', rechamada, f'medico_{current_user.servidor_id}')
+    rastreador.marcar(trace_id, 'emitido')
+    metrica_rechamadas.inc()
+    return {'id': chamada_id, 'rechamadas': rechamada['rechamadas'], 'ultima_chamada': rechamada['ultima_chamada']}
+
+@socketio.on('chamada_ack')
+@perfilador.medir('chamada_ack')
+def handle_chamada_ack(data):
+    """Tela confirma que recebeu ('entregue') ou começou a anunciar ('anunciado') a chamada"""
+    if current_user.is_authenticated and isinstance(data, dict):
+        rastreador.confirmar(data.get('trace_id'), request.sid, data.get('estagio', 'entregue'))
 
 @socketio.on('get_fila')
+@perfilador.medir('get_fila')
 def handle_get_fila():
     if current_user.is_authenticated:
-        chamadas = Chamada.query.filter_by(
-            servidor_id=current_user.servidor_id
-        ).order_by(Chamada.timestamp.desc()).limit(6).all()
-        chamadas_json = [{
-            'id': c.id,
-            'paciente': c.paciente,
-            'sala': c.sala,
-            'medico': c.nome_medico or c.medico,
-            'timestamp': c.timestamp.isoformat(),
-            'cor': getattr(c, 'cor', 'cinza') or 'cinza',
-            'classificacao': getattr(c, 'classificacao', '') or ''
-        } for c in chamadas]
-        emit('fila_atual', chamadas_json)
+        enviar_fila_atual(estado_da_unidade(current_user.servidor_id), session.get('salas_assinadas'))
+
+@socketio.on('assinar_salas')
+@perfilador.medir('assinar_salas')
+def handle_assinar_salas(data):
+    """Recepção troca as salas que acompanha (lista, texto com vírgulas ou nome de área; vazio = todas)"""
+    if not current_user.is_authenticated or current_user.role != 'recepcao' or not isinstance(data, dict):
+        return
+    try:
+        salas = assinaturas.normalizar_salas(data.get('salas'), AREAS_ESPERA)
+    except ValueError as e:
+        return {'erro': str(e)}
+    estado = estado_da_unidade(current_user.servidor_id)
+    with estado.lock:
+        sair_das_salas(current_user.servidor_id, session.get('salas_assinadas'))
+        session['salas_assinadas'] = salas
+        entrar_nas_salas(current_user.servidor_id, salas)
+        enviar_fila_atual(estado, salas)
+    return {'salas': sorted(salas) if salas is not None else None}
 
 @socketio.on('chat_mensagem')
+@perfilador.medir('chat_mensagem')
 def handle_chat_mensagem(data):
-    if not current_user.is_authenticated or current_user.role != 'medico':
+    if not current_user.is_authenticated or current_user.role != 'medico' or not isinstance(data, dict):
+        return
+    texto = data.get('mensagem')
+    if not isinstance(texto, str) or not texto.strip():
+        return
+    texto = texto.strip()
+    estado = estados.unidade(current_user.servidor_id)
+    # Por conexão: todos os médicos web de uma unidade entram como o mesmo usuário
+    if not estado.pode_enviar_chat(request.sid, time.monotonic()):
+        emit('chat_erro', {'mensagem': 'Muitas mensagens em pouco tempo. Aguarde alguns segundos.'})
         return
     msg = {
         'nome': current_user.nome_completo or current_user.username,
-        'mensagem': data.get('mensagem', ''),
+        'mensagem': texto[:TAMANHO_MAXIMO_CHAT],
         'horario': datetime.now().isoformat()
     }
-    emit('chat_mensagem', msg, room=f'medico_{current_user.servidor_id}')
+    entrega = estado.publicar_chat(msg, time.monotonic())
+    if entrega == 'imediato':
+        emit('chat_mensagem', msg, room=f'medico_{current_user.servidor_id}')
+    elif entrega == 'agendar':
+        socketio.start_background_task(enviar_lote_chat, current_user.servidor_id)
+
+def enviar_lote_chat(servidor_id):
+    """Entrega de uma vez as mensagens que chegaram dentro da janela"""
+    socketio.sleep(JANELA_LOTE_CHAT)
+    lote = estados.unidade(servidor_id).retirar_lote_chat(time.monotonic())
+    if lote:
+        socketio.emit('chat_lote', lote, room=f'medico_{servidor_id}')
+
+def reconstruir_resumos(servidor_id=None):
+    """Recalcula ResumoChamadas a partir do histórico completo: arquivo mensal e tabela Chamada"""
+    consulta_resumos = ResumoChamadas.query
+    if servidor_id is not None:
+        consulta_resumos = consulta_resumos.filter_by(servidor_id=servidor_id)
+    consulta_resumos.delete()
+
+    total = 0
+    if servidor_id is not None:
+        unidades = [servidor_id]
+    else:
+        # Unidades com chamadas só no arquivo também têm resumos
+        unidades = sorted({s for (s,) in db.session.query(Chamada.servidor_id).distinct()}
+                          | {s for (s,) in db.session.query(Servidor.id)})
+    for unidade in unidades:
+        linhas = ((datetime.fromisoformat(c['timestamp']), c['medico'], c['nome_medico'], c['cor'], c['classificacao'])
+                  for c in consultar_chamadas(unidade))
+        contagem, nomes = relatorios.contar_chamadas(linhas)
+        for (periodo, medico, cor, classificacao), quantidade in contagem.items():
+            db.session.add(ResumoChamadas(
+                servidor_id=unidade, periodo=periodo, medico=medico, nome_medico=nomes.get(medico),
+                cor=cor, classificacao=classificacao, total=quantidade
+            ))
+            total += quantidade
+    db.session.commit()
+    return total
+
+# Retenção: chamadas com mais de ARQUIVO_DIAS dias vão para o arquivo mensal
+ARQUIVO_DIAS = int(os.getenv('ARQUIVO_DIAS', '90'))
+ARQUIVO_LOTE = int(os.getenv('ARQUIVO_LOTE', '1000'))
+arquivo_chamadas = ArquivoChamadas(os.getenv('ARQUIVO_PASTA', os.path.join(app.instance_path, 'arquivo')))
+
+def arquivar_lote():
+    """Move para o arquivo o próximo lote de chamadas fora da janela de retenção"""
+    with app.app_context():
+        corte = relatorios.agora_local() - timedelta(days=ARQUIVO_DIAS)
+        chamadas = Chamada.query.filter(
+            Chamada.timestamp < corte
+        ).order_by(Chamada.id).limit(ARQUIVO_LOTE).all()
+        if not chamadas:
+            return 0
+        por_mes = defaultdict(list)
+        for c in chamadas:
+            por_mes[(c.servidor_id, c.timestamp.strftime('%Y-%m'))].append(chamada_para_registro(c))
+        # Primeiro grava (com fsync), depois apaga: uma queda no meio só duplica o lote
+        for (servidor_id, mes), registros in por_mes.items():
+            arquivo_chamadas.anexar(servidor_id, mes, registros)
+        Chamada.query.filter(Chamada.id.in_([c.id for c in chamadas])).delete(synchronize_session=False)
+        db.session.commit()
+        return len(chamadas)
+
+arquivador = Arquivador(arquivar_lote, intervalo=int(os.getenv('ARQUIVO_INTERVALO', '3600')))
+
+def consultar_chamadas(servidor_id, inicio=None, fim=None):
+    """Chamadas da unidade em [inicio, fim): primeiro as arquivadas, depois as da tabela"""
+    yield from arquivo_chamadas.ler(servidor_id, inicio, fim)
+    # Só as colunas, em lotes: no PostgreSQL yield_per usa cursor do lado do servidor
+    consulta = db.session.query(
+        *[getattr(Chamada, coluna) for coluna in exportacao.COLUNAS]
+    ).filter(Chamada.servidor_id == servidor_id)
+    if inicio:
+        consulta = consulta.filter(Chamada.timestamp >= inicio)
+    if fim:
+        consulta = consulta.filter(Chamada.timestamp < fim)
+    for linha in consulta.order_by(Chamada.timestamp).yield_per(relatorios.TAMANHO_LOTE):
+        yield chamada_para_registro(linha)
+
+def iniciar_servicos():
+    """Arquivador e gateway TCP deste worker; roda na subida do worker (gunicorn.conf.py)"""
+    if ARQUIVO_DIAS > 0:
+        arquivador.iniciar()
+    # Só o worker da unidade do gateway abre a porta, uma vez; se ela estiver ocupada, o web segue sem ele
+    if GATEWAY_TCP_PORTA and estados.atende(gateway_tcp.unidade_padrao):
+        gateway_tcp.iniciar()
+
+@app.before_request
+def iniciar_servicos_sem_gunicorn():
+    """Fora do gunicorn (flask run), os serviços sobem no primeiro pedido; as duas chamadas são idempotentes"""
+    iniciar_servicos()
+
+@app.route('/api/chamadas')
+@login_required
+def api_chamadas():
+    """Histórico da unidade no período, incluindo as chamadas já arquivadas"""
+    try:
+        inicio, fim = relatorios.intervalo_de_datas(request.args.get('inicio'), request.args.get('fim'))
+        limite = min(int(request.args.get('limite', 500)), 5000)
+    except ValueError:
+        return jsonify({'erro': 'Parâmetros inválidos'}), 400
+    chamadas = []
+    for chamada in consultar_chamadas(current_user.servidor_id, inicio, fim):
+        chamadas.append(chamada)
+        if len(chamadas) >= limite:
+            break
+    return jsonify(chamadas)
+
+@app.route('/api/exportar')
+@login_required
+def api_exportar():
+    """Histórico da unidade no período como CSV ou Parquet, enviado em pedaços"""
+    formato = request.args.get('formato', 'csv')
+    if formato not in exportacao.formatos_disponiveis():
+        return jsonify({'erro': 'Formato indisponível', 'formatos': exportacao.formatos_disponiveis()}), 400
+    try:
+        inicio, fim = relatorios.intervalo_de_datas(request.args.get('inicio'), request.args.get('fim'), dias_padrao=31)
+    except ValueError:
+        return jsonify({'erro': 'Datas inválidas, use AAAA-MM-DD'}), 400
+    servidor_id = current_user.servidor_id
+    tipo, extensao = exportacao.FORMATOS[formato]
+    nome = f"chamadas_{servidor_id}_{inicio:%Y-%m-%d}_{fim - timedelta(days=1):%Y-%m-%d}.{extensao}"
+    corpo = exportacao.exportar(consultar_chamadas(servidor_id, inicio, fim), formato)
+    resposta = Response(stream_with_context(corpo), mimetype=tipo)
+    resposta.headers['Content-Disposition'] = f'attachment; filename="{nome}"'
+    resposta.headers['Cache-Control'] = 'private, no-store'
+    return resposta
+
+@app.route('/api/rastreio')
+@login_required
+def api_rastreio():
+    """Percentis de cada estágio das chamadas (ms) e os rastros recentes da unidade"""
+    try:
+        limite = max(0, min(int(request.args.get('limite', 20)), LIMITE_RASTROS))
+    except ValueError:
+        return jsonify({'erro': 'Parâmetros inválidos'}), 400
+    return jsonify({
+        'estagios': rastreador.percentis(current_user.servidor_id),
+        'recentes': rastreador.recentes(limite, servidor_id=current_user.servidor_id),
+    })
+
+@app.route('/metrics')
+def metrics():
+    """Métricas do processo para o Prometheus; METRICAS_TOKEN exige 'Authorization: Bearer'"""
+    token = os.getenv('METRICAS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(401)
+    return Response(registro_metricas.exportar(), mimetype=metricas.TIPO_CONTEUDO)
+
+def exigir_token_perfil():
+    token = os.getenv('PERFIL_TOKEN')
+    if not token:
+        abort(404)  # Perfilador desativado nesta instalação
+    if request.headers.get('Authorization') != f'Bearer {token}':
+        abort(401)
+
+@app.route('/admin/perfil', methods=['GET', 'POST'])
+def admin_perfil():
+    """GET: estado e tempos por handler. POST acao=iniciar&duracao=s | acao=parar"""
+    exigir_token_perfil()
+    if request.method == 'GET':
+        return jsonify(perfilador.resumo())
+    status, resumo = perfil.executar_acao(perfilador, request.values.get('acao'), request.values.get('duracao'))
+    return jsonify(resumo), status
+
+@app.route('/admin/perfil/pilhas.txt')
+def admin_perfil_pilhas():
+    """Pilhas da sessão no formato collapsed (flamegraph.pl, speedscope)"""
+    exigir_token_perfil()
+    return Response(perfilador.colapsado(), mimetype='text/plain')
+
+@app.route('/api/arquivo')
+@login_required
+def api_arquivo():
+    """Progresso do arquivamento e meses arquivados da unidade"""
+    return jsonify(dict(
+        arquivador.metricas,
+        retencao_dias=ARQUIVO_DIAS,
+        chamadas_na_tabela=Chamada.query.filter_by(servidor_id=current_user.servidor_id).count(),
+        meses_arquivados=arquivo_chamadas.meses(current_user.servidor_id)
+    ))
+
+@app.cli.command('arquivar-chamadas')
+def arquivar_chamadas_comando():
+    """Arquiva agora todas as chamadas fora da janela de retenção"""
+    arquivador.pausa_entre_lotes = 0
+    print(f"{arquivador.executar()} chamadas arquivadas em {arquivo_chamadas.pasta}")
+
+@app.cli.command('exportar-chamadas')
+@click.option('--unidade', type=int, required=True, help='id do Servidor (unidade)')
+@click.option('--inicio', help='primeiro dia, AAAA-MM-DD (padrão: 31 dias antes do fim)')
+@click.option('--fim', help='último dia, AAAA-MM-DD (padrão: hoje)')
+@click.option('--formato', type=click.Choice(list(exportacao.FORMATOS)), default='csv')
+@click.option('--saida', type=click.Path(dir_okay=False, writable=True), required=True)
+def exportar_chamadas_comando(unidade, inicio, fim, formato, saida):
+    """Exporta o histórico de chamadas de uma unidade, inclusive o arquivado"""
+    if formato not in exportacao.formatos_disponiveis():
+        raise click.ClickException('Exportação em Parquet requer o pacote pyarrow')
+    inicio, fim = relatorios.intervalo_de_datas(inicio, fim, dias_padrao=31)
+    with open(saida, 'wb') as arquivo:
+        for pedaco in exportacao.exportar(consultar_chamadas(unidade, inicio, fim), formato):
+            arquivo.write(pedaco)
+    print(f"Histórico de {inicio:%d/%m/%Y} a {fim - timedelta(days=1):%d/%m/%Y} exportado em {saida}")
+
+@app.cli.command('reconstruir-resumos')
+def reconstruir_resumos_comando():
+    """Recalcula os resumos por hora usados em /api/relatorios"""
+    print(f"{reconstruir_resumos()} chamadas contabilizadas nos resumos")
+
+def garantir_esquema():
+    """Cria tabelas novas e as colunas e índices que faltam em tabelas já existentes"""
+    db.create_all()
+    inspetor = db.inspect(db.engine)
+    for tabela in (Chamada.__table__, ResumoChamadas.__table__):
+        existentes = {coluna['name'] for coluna in inspetor.get_columns(tabela.name)}
+        for coluna in tabela.columns:
+            if coluna.name in existentes:
+                continue
+            tipo = coluna.type.compile(dialect=db.engine.dialect)
+            padrao = f' DEFAULT {coluna.server_default.arg}' if coluna.server_default is not None else ''
+            with db.engine.begin() as conexao:
+                conexao.execute(db.text(f'ALTER TABLE {tabela.name} ADD COLUMN {coluna.name} {tipo}{padrao}'))
+        for indice in tabela.indexes:
+            indice.create(bind=db.engine, checkfirst=True)
+
+@app.cli.command('atualizar-banco')
+def atualizar_banco_comando():
+    """Cria as tabelas, colunas e índices que faltam (rodar a cada atualização do sistema)"""
+    garantir_esquema()
+    print("Esquema do banco atualizado")
+
+with app.app_context():
+    metricas.instrumentar_engine(db.engine, metrica_db)
 
 # Criar servidores e usuários iniciais
 def criar_dados_iniciais():
     with app.app_context():
+        garantir_esquema()
         # Cria servidores se não existirem
         if Servidor.query.count() == 0:
             servidores = [
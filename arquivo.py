@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sistema de Chamada Hospitalar - Arquivo de chamadas antigas
+Chamadas fora da janela de retenção saem da tabela Chamada e vão para um
+arquivo comprimido por unidade e por mês (instance/arquivo/<unidade>/<AAAA-MM>.jsonl.gz).
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+
+class ArquivoChamadas:
+    """Arquivos mensais comprimidos; cada lote é um novo membro gzip no fim do arquivo"""
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+        self._lock = threading.Lock()
+
+    def caminho(self, servidor_id, mes):
+        return os.path.join(self.pasta, str(servidor_id), f'{mes}.jsonl.gz')
+
+    def anexar(self, servidor_id, mes, chamadas):
+        """Grava as chamadas (dicts) no arquivo do mês e garante que chegaram ao disco"""
+        caminho = self.caminho(servidor_id, mes)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        dados = ''.join(json.dumps(c, ensure_ascii=False) + '\n' for c in chamadas).encode('utf-8')
+        with self._lock, open(caminho, 'ab') as arquivo:
+            arquivo.write(gzip.compress(dados))
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+
+    def meses(self, servidor_id):
+        pasta = os.path.join(self.pasta, str(servidor_id))
+        if not os.path.isdir(pasta):
+            return []
+        return sorted(nome[:7] for nome in os.listdir(pasta) if nome.endswith('.jsonl.gz'))
+
+    def ler(self, servidor_id, inicio=None, fim=None):
+        """Chamadas arquivadas em [inicio, fim), em ordem cronológica de mês.
+
+        Um lote gravado duas vezes (queda entre gravar e apagar do banco) é
+        ignorado pelo id.
+        """
+        for mes in self.meses(servidor_id):
+            if inicio and mes < inicio.strftime('%Y-%m'):
+                continue
+            if fim and mes > fim.strftime('%Y-%m'):
+                break
+            vistos = set()
+            with gzip.open(self.caminho(servidor_id, mes), 'rt', encoding='utf-8') as arquivo:
+                for linha in arquivo:
+                    chamada = json.loads(linha)
+                    if chamada['id'] in vistos:
+                        continue
+                    vistos.add(chamada['id'])
+                    momento = datetime.fromisoformat(chamada['timestamp'])
+                    if (inicio is None or momento >= inicio) and (fim is None or momento < fim):
+                        yield chamada
+
+
+class Arquivador:
+    """Executa o arquivamento em lotes pequenos numa thread, com métricas de progresso"""
+
+    def __init__(self, arquivar_lote, intervalo, pausa_entre_lotes=0.5):
+        # arquivar_lote() move um lote e retorna quantas chamadas arquivou
+        self.arquivar_lote = arquivar_lote
+        self.intervalo = intervalo
+        self.pausa_entre_lotes = pausa_entre_lotes
+        self.metricas = {
+            'em_execucao': False,
+            'chamadas_arquivadas': 0,
+            'lotes': 0,
+            'erros': 0,
+            'ultimo_erro': None,
+            'ultima_execucao': None,
+            'duracao_ultima_execucao': None,
+        }
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def executar(self):
+        """Arquiva até não restar nada fora da janela; retorna o total desta execução"""
+        inicio = time.monotonic()
+        total = 0
+        self.metricas['em_execucao'] = True
+        try:
+            while True:
+                quantidade = self.arquivar_lote()
+                if not quantidade:
+                    break
+                total += quantidade
+                self.metricas['chamadas_arquivadas'] += quantidade
+                self.metricas['lotes'] += 1
+                # Lotes espaçados para não disputar o banco com as chamadas
+                time.sleep(self.pausa_entre_lotes)
+        except Exception as e:
+            self.metricas['erros'] += 1
+            self.metricas['ultimo_erro'] = str(e)
+            print(f"Erro no arquivamento de chamadas: {e}")
+        finally:
+            self.metricas['em_execucao'] = False
+            self.metricas['ultima_execucao'] = datetime.now().isoformat()
+            self.metricas['duracao_ultima_execucao'] = round(time.monotonic() - inicio, 3)
+        return total
+
+    def _laco(self):
+        while True:
+            self.executar()
+            time.sleep(self.intervalo)
+
+    def iniciar(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._laco, name='arquivador', daemon=True)
+                self._thread.start()
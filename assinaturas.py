@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sistema de Chamada Hospitalar - Assinaturas de salas
+Cada tela da recepção pode assinar só as salas (ou áreas de espera) que a
+interessam. Um índice invertido sala -> assinantes diz, para cada chamada,
+quem deve recebê-la, sem percorrer todas as telas da unidade. Quem não
+assina nada continua recebendo todas as salas.
+"""
+
+# Limites de uma assinatura: cada sala vira uma sala de socket e entra na
+# chave das filas compartilhadas, então um cliente não pode criar quantas quiser.
+# O tamanho é o da coluna Chamada.sala.
+TAMANHO_MAXIMO_SALA = 10
+MAXIMO_SALAS = 64
+
+
+def ler_areas(texto):
+    """Áreas de espera no formato 'nome=1,2,3;outra=7,8' -> {nome: frozenset de salas}"""
+    areas = {}
+    for trecho in (texto or '').split(';'):
+        nome, _, salas = trecho.partition('=')
+        nome = nome.strip().lower()
+        if nome and salas.strip():
+            areas[nome] = frozenset(s.strip() for s in salas.split(',') if s.strip())
+    return areas
+
+
+def normalizar_salas(itens, areas=None):
+    """Salas assinadas a partir de uma lista ou texto separado por vírgulas.
+
+    Nomes de áreas viram as salas delas. Com áreas configuradas, só valem as
+    salas que pertencem a alguma delas. Retorna None (todas as salas) se nada
+    foi informado; as salas são guardadas como texto, para casar 1 e '1'.
+    """
+    if itens is None:
+        return None
+    if isinstance(itens, str):
+        itens = itens.split(',')
+    elif not isinstance(itens, (list, tuple, set, frozenset)):
+        raise ValueError('Salas devem ser uma lista ou texto separado por vírgulas')
+    areas = areas or {}
+    conhecidas = frozenset().union(*areas.values()) if areas else None
+    salas = set()
+    for item in itens:
+        item = str(item).strip()
+        if not item:
+            continue
+        area = areas.get(item.lower())
+        if area is not None:
+            salas.update(area)
+        elif len(item) > TAMANHO_MAXIMO_SALA:
+            raise ValueError(f'Sala com mais de {TAMANHO_MAXIMO_SALA} caracteres: {item[:TAMANHO_MAXIMO_SALA]}...')
+        elif conhecidas is not None and item not in conhecidas:
+            raise ValueError(f'Sala {item} não pertence a nenhuma área de espera')
+        else:
+            salas.add(item)
+        if len(salas) > MAXIMO_SALAS:
+            raise ValueError(f'Assinatura com mais de {MAXIMO_SALAS} salas')
+    return frozenset(salas) or None
+
+
+def na_assinatura(salas, sala):
+    return salas is None or str(sala) in salas
+
+
+class Assinaturas:
+    """Índice sala -> assinantes; o chamador protege o acesso com o próprio lock"""
+
+    def __init__(self):
+        self._salas = {}  # {assinante: frozenset de salas ou None (todas)}
+        self._por_sala = {}  # {sala: {assinante}}
+        self._todas = set()  # Assinantes sem filtro
+
+    def assinar(self, assinante, salas=None):
+        self.cancelar(assinante)
+        self._salas[assinante] = salas
+        if salas is None:
+            self._todas.add(assinante)
+            return
+        for sala in salas:
+            self._por_sala.setdefault(sala, set()).add(assinante)
+
+    def cancelar(self, assinante):
+        if assinante not in self._salas:
+            return
+        salas = self._salas.pop(assinante)
+        if salas is None:
+            self._todas.discard(assinante)
+            return
+        for sala in salas:
+            assinantes = self._por_sala[sala]
+            assinantes.discard(assinante)
+            if not assinantes:
+                del self._por_sala[sala]
+
+    def salas_de(self, assinante):
+        return self._salas.get(assinante)
+
+    def destinatarios(self, sala):
+        """Quem recebe uma chamada da sala: os sem filtro e os que assinaram a sala"""
+        assinantes = self._por_sala.get(str(sala))
+        return self._todas | assinantes if assinantes else set(self._todas)
+
+    def grupos(self):
+        """{salas: [assinantes]}: uma fila filtrada por conjunto de salas, não por tela"""
+        grupos = {}
+        for assinante, salas in self._salas.items():
+            grupos.setdefault(salas, []).append(assinante)
+        return grupos
+
+    def __contains__(self, assinante):
+        return assinante in self._salas
+
+    def __len__(self):
+        return len(self._salas)
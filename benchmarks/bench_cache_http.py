@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de bytes transferidos por atualização dos painéis
+Compara um navegador sem cache (como antes) com revalidação por ETag,
+compressão e estáticos imutáveis.
+"""
+
+import os
+import re
+import sys
+import tempfile
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+
+_banco = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ.setdefault('DATABASE_URL', f'sqlite:///{_banco.name}')
+
+from app import app, db, criar_dados_iniciais, Servidor  # noqa: E402
+
+
+def entrar(role):
+    cliente = app.test_client()
+    with app.app_context():
+        servidor = Servidor.query.filter_by(ativo=True).first()
+    with cliente.session_transaction() as sessao:
+        sessao['servidor_id'] = servidor.id
+    cliente.post('/login', data={'role': role})
+    return cliente
+
+
+def carregar_painel(cliente, cabecalhos_pagina, cache_estaticos):
+    """Baixa a página e os estáticos locais que ela referencia; retorna bytes recebidos"""
+    resposta = cliente.get('/dashboard', headers=cabecalhos_pagina)
+    total = len(resposta.data)
+    etag = resposta.headers.get('ETag')
+    if resposta.status_code == 200:
+        html = resposta.get_data()
+        if resposta.headers.get('Content-Encoding') == 'gzip':
+            import gzip
+            html = gzip.decompress(html)
+        urls = re.findall(r'(?:src|href)="(/static/[^"]+)"', html.decode('utf-8'))
+    else:
+        urls = cache_estaticos.get('urls', [])
+    cache_estaticos['urls'] = urls
+    for url in urls:
+        # Com ?v= e Cache-Control immutable o navegador nem faz a requisição
+        if cache_estaticos.get(url) == 'imutavel':
+            continue
+        estatico = cliente.get(url, headers={k: v for k, v in cabecalhos_pagina.items()
+                                             if k == 'Accept-Encoding'})
+        total += len(estatico.data)
+        if 'immutable' in estatico.headers.get('Cache-Control', ''):
+            cache_estaticos[url] = 'imutavel'
+    return total, etag
+
+
+def main():
+    with app.app_context():
+        db.create_all()
+        criar_dados_iniciais()
+
+    print(f"{'painel':<10} {'cenário':<34} {'bytes/atualização':>18}")
+    for role in ('recepcao', 'medico'):
+        cliente = entrar(role)
+        sem_cache, _ = carregar_painel(cliente, {'Accept-Encoding': 'identity'}, {})
+
+        estaticos = {}
+        primeira, etag = carregar_painel(cliente, {'Accept-Encoding': 'gzip, br'}, estaticos)
+        seguinte, _ = carregar_painel(cliente, {'Accept-Encoding': 'gzip, br', 'If-None-Match': etag}, estaticos)
+
+        print(f"{role:<10} {'sem cache nem compressão (antes)':<34} {sem_cache:>18}")
+        print(f"{role:<10} {'primeira carga comprimida':<34} {primeira:>18}")
+        print(f"{role:<10} {'atualização com ETag (depois)':<34} {seguinte:>18}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        os.unlink(_banco.name)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark da exportação do histórico de chamadas
+Preenche um banco SQLite temporário com N chamadas de uma unidade (10 milhões
+por padrão) e mede tempo, vazão e pico de memória da exportação em CSV/Parquet.
+"""
+
+import argparse
+import os
+import random
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+
+# O banco e o arquivo precisam ser configurados antes de importar o app
+_pasta = tempfile.mkdtemp(prefix='bench_exportacao_')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_pasta, 'hospital.db')}")
+os.environ.setdefault('ARQUIVO_PASTA', os.path.join(_pasta, 'arquivo'))
+os.environ.setdefault('ARQUIVO_DIAS', '0')
+
+import exportacao  # noqa: E402
+from app import app, consultar_chamadas  # noqa: E402
+
+SERVIDOR_ID = 9
+CORES = [('vermelho', 'Emergência'), ('laranja', 'Muito urgente'), ('amarelo', 'Urgente'),
+         ('verde', 'Pouco urgente'), ('azul', 'Não urgente')]
+
+
+def pico_memoria_mb():
+    # ru_maxrss é em KB no Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def preencher(caminho_banco, linhas, inicio):
+    """Insere as chamadas direto pelo sqlite3, em transações de 100 mil"""
+    conexao = sqlite3.connect(caminho_banco)
+    conexao.execute('PRAGMA journal_mode=OFF')
+    conexao.execute('PRAGMA synchronous=OFF')
+    passo = timedelta(days=365) / linhas
+    gerador = random.Random(42)
+    inseridas = 0
+    while inseridas < linhas:
+        lote = []
+        for i in range(inseridas, min(linhas, inseridas + 100000)):
+            cor, classificacao = gerador.choice(CORES)
+            medico = gerador.randrange(40)
+            lote.append((f'Paciente {i}', str(medico % 12 + 1), f'medico{medico}', f'Dr(a). Médico {medico}',
+                         (inicio + passo * i).strftime('%Y-%m-%d %H:%M:%S.%f'), SERVIDOR_ID, cor, classificacao))
+        conexao.executemany(
+            'INSERT INTO chamada (paciente, sala, medico, nome_medico, timestamp, servidor_id, cor, classificacao) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', lote)
+        conexao.commit()
+        inseridas += len(lote)
+    conexao.close()
+
+
+def medir(formato, inicio, fim, destino):
+    memoria_antes = pico_memoria_mb()
+    comeco = time.perf_counter()
+    linhas = 0
+
+    def contar(chamadas):
+        nonlocal linhas
+        for chamada in chamadas:
+            linhas += 1
+            yield chamada
+
+    with app.app_context(), open(destino, 'wb') as arquivo:
+        for pedaco in exportacao.exportar(contar(consultar_chamadas(SERVIDOR_ID, inicio, fim)), formato):
+            arquivo.write(pedaco)
+    duracao = time.perf_counter() - comeco
+    print(f"{formato:8s} {linhas:>11,d} linhas  {duracao:8.1f} s  {linhas / duracao:>10,.0f} linhas/s  "
+          f"{os.path.getsize(destino) / 2**20:8.1f} MB  pico de memória {pico_memoria_mb():.0f} MB "
+          f"(antes: {memoria_antes:.0f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--linhas', type=int, default=10_000_000, help='chamadas no banco')
+    parser.add_argument('--formatos', default=','.join(exportacao.formatos_disponiveis()))
+    args = parser.parse_args()
+
+    caminho_banco = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '', 1)
+    inicio = datetime(2024, 1, 1)
+    comeco = time.perf_counter()
+    preencher(caminho_banco, args.linhas, inicio)
+    print(f"{args.linhas:,d} chamadas inseridas em {time.perf_counter() - comeco:.1f} s")
+
+    for formato in args.formatos.split(','):
+        medir(formato, inicio, inicio + timedelta(days=366), os.path.join(_pasta, f'chamadas.{formato}'))
+
+
+if __name__ == '__main__':
+    main()
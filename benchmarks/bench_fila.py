@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark da fila de atendimento do servidor central
+Compara a FilaPrioridade (heap) com uma lista mantida ordenada a cada
+mudança, em filas de milhares de chamadas: inserir, remover por id, retirar
+a mais urgente e montar a lista ordenada enviada à recepção.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fila_prioridade import TEMPO_ALVO, FilaPrioridade  # noqa: E402
+from registros import ChamadaFila  # noqa: E402
+
+CORES = list(TEMPO_ALVO)
+
+
+class FilaLista:
+    """Referência: lista reordenada a cada inserção, remoção por varredura"""
+
+    def __init__(self):
+        self.itens = []
+
+    def inserir(self, chamada, agora):
+        self.itens.append((agora + TEMPO_ALVO[chamada.cor], chamada.id, chamada))
+        self.itens.sort(key=lambda item: item[:2])
+
+    def remover(self, chamada_id):
+        for i, item in enumerate(self.itens):
+            if item[1] == chamada_id:
+                return self.itens.pop(i)[2]
+        return None
+
+    def retirar(self):
+        return self.itens.pop(0)[2] if self.itens else None
+
+    def ordenada(self):
+        return [item[2] for item in self.itens]
+
+
+def chamadas(n, gerador):
+    return [ChamadaFila(i, gerador.randrange(20), f'Paciente {i}', gerador.choice(CORES))
+            for i in range(n)]
+
+
+def medir(nome, funcao, operacoes):
+    comeco = time.perf_counter()
+    funcao()
+    duracao = time.perf_counter() - comeco
+    return f'{nome} {duracao * 1e6 / operacoes:9.2f} µs/op'
+
+
+def rodar(classe, n, gerador, com_lista):
+    fila = classe()
+    entrada = chamadas(n, gerador)
+    ids = [c.id for c in entrada]
+    gerador.shuffle(ids)
+    metade = ids[:n // 2]
+
+    def inserir():
+        for i, chamada in enumerate(entrada):
+            fila.inserir(chamada, i)
+
+    def remover():
+        for chamada_id in metade:
+            fila.remover(chamada_id)
+
+    def retirar():
+        while fila.retirar() is not None:
+            pass
+
+    resultados = [medir('inserir', inserir, n)]
+    if com_lista:
+        resultados.append(medir('ordenada', fila.ordenada, 1))
+    resultados.append(medir('remover id', remover, len(metade)))
+    resultados.append(medir('retirar', retirar, n - len(metade)))
+    return '  '.join(resultados)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tamanhos', default='1000,5000,20000,100000')
+    parser.add_argument('--limite-lista', type=int, default=20000,
+                        help='maior fila medida com a lista (ela é quadrática)')
+    args = parser.parse_args()
+
+    for n in map(int, args.tamanhos.split(',')):
+        print(f'{n:>7,d} heap   {rodar(FilaPrioridade, n, random.Random(n), True)}')
+        if n <= args.limite_lista:
+            print(f'{n:>7,d} lista  {rodar(FilaLista, n, random.Random(n), True)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env node
+/*
+ * Benchmark da renderização das listas de chamadas, sem navegador
+ * Compara a reconstrução completa com innerHTML (como era) com a ListaChaveada,
+ * usando um DOM mínimo que conta as operações feitas em cada nova_chamada.
+ *
+ * Uso: node benchmarks/bench_lista_chamadas.js [eventos]
+ */
+'use strict';
+
+const path = require('path');
+const ListaChaveada = require(path.join(__dirname, '..', 'static', 'js', 'lista_chamadas.js'));
+
+const contagem = { criados: 0, inseridos: 0, removidos: 0, textos: 0, parse: 0 };
+
+class Elemento {
+    constructor(tag) {
+        contagem.criados++;
+        this.tag = tag;
+        this.children = [];
+        this.parentNode = null;
+        this.className = '';
+        this.style = {};
+        this._texto = '';
+        const el = this;
+        this.classList = {
+            add(c) { el.className += ' ' + c; },
+            remove(c) { el.className = el.className.split(' ').filter((x) => x !== c).join(' '); }
+        };
+    }
+    get firstChild() { return this.children[0] || null; }
+    get nextSibling() {
+        if (!this.parentNode) return null;
+        const irmaos = this.parentNode.children;
+        return irmaos[irmaos.indexOf(this) + 1] || null;
+    }
+    _desanexar(no) {
+        if (no.parentNode) {
+            const irmaos = no.parentNode.children;
+            irmaos.splice(irmaos.indexOf(no), 1);
+        }
+    }
+    appendChild(no) { return this.insertBefore(no, null); }
+    insertBefore(no, referencia) {
+        contagem.inseridos++;
+        this._desanexar(no);
+        const i = referencia ? this.children.indexOf(referencia) : this.children.length;
+        this.children.splice(i, 0, no);
+        no.parentNode = this;
+        return no;
+    }
+    removeChild(no) {
+        contagem.removidos++;
+        this._desanexar(no);
+        no.parentNode = null;
+        return no;
+    }
+    set textContent(valor) { contagem.textos++; this._texto = String(valor); }
+    get textContent() { return this._texto; }
+    set innerHTML(html) {
+        // Parse do HTML: cada tag aberta vira um elemento novo
+        contagem.parse += html.length;
+        this.children = [];
+        const tags = html.match(/<([a-z0-9]+)([^>]*)>/g) || [];
+        for (const tag of tags) {
+            const filho = new Elemento(tag.match(/<([a-z0-9]+)/)[1]);
+            const classe = tag.match(/class="([^"]*)"/);
+            filho.className = classe ? classe[1] : '';
+            filho.parentNode = this;
+            this.children.push(filho);
+        }
+    }
+    querySelector(seletor) {
+        const classe = seletor.slice(1);
+        return this.children.find((c) => c.className.split(' ').includes(classe)) || null;
+    }
+}
+
+const CORES = ['cinza', 'vermelho', 'laranja', 'amarelo', 'verde', 'azul'];
+
+function chamada(i) {
+    return { id: i, paciente: `Paciente ${i}`, medico: 'Genérico', sala: `SALA ${i % 12}`, cor: CORES[i % 6] };
+}
+
+// Como recepcao.html fazia antes: limpa tudo e recria os 5 itens
+function renderizarAntes(container, fila) {
+    container.innerHTML = '';
+    for (const c of fila.slice(1, 6)) {
+        const div = new Elemento('div');
+        div.className = 'list-group-item';
+        div.style.borderLeft = `5px solid ${c.cor}`;
+        div.innerHTML = `
+            <div class="d-flex justify-content-between align-items-center">
+                <div>
+                    <h6 class="mb-1">${c.paciente}</h6>
+                    <small class="text-muted"><i class="fas fa-user-md me-1"></i>
+                        Dr(a). ${c.medico}<br><i class="fas fa-door-open me-1"></i>
+                        <strong>${c.sala}</strong><br></small>
+                </div>
+                <div><span class="badge cor-badge" style="background-color: ${c.cor}">ㅤㅤㅤ</span></div>
+            </div>`;
+        container.appendChild(div);
+    }
+}
+
+function criarDepois() {
+    const div = new Elemento('div');
+    div.className = 'list-group-item';
+    div.innerHTML = '<h6 class="item-paciente"></h6><span class="item-medico"></span>'
+        + '<strong class="item-sala"></strong><span class="cor-badge"></span>';
+    div.campos = {
+        paciente: div.querySelector('.item-paciente'),
+        medico: div.querySelector('.item-medico'),
+        sala: div.querySelector('.item-sala'),
+        cor: div.querySelector('.cor-badge')
+    };
+    return div;
+}
+
+function preencherDepois(div, c) {
+    div.style.borderLeft = `5px solid ${c.cor}`;
+    div.campos.paciente.textContent = c.paciente;
+    div.campos.medico.textContent = `Dr(a). ${c.medico}`;
+    div.campos.sala.textContent = c.sala;
+    div.campos.cor.style.backgroundColor = c.cor;
+}
+
+function medir(nome, eventos, renderizar) {
+    let fila = [];
+    for (let i = 0; i < 6; i++) fila.unshift(chamada(i));
+    renderizar(fila);
+    for (const chave of Object.keys(contagem)) contagem[chave] = 0;
+
+    const inicio = process.hrtime.bigint();
+    for (let i = 6; i < 6 + eventos; i++) {
+        fila.unshift(chamada(i));
+        fila = fila.slice(0, 6);
+        renderizar(fila);
+    }
+    const us = Number(process.hrtime.bigint() - inicio) / 1000 / eventos;
+    const por = (n) => (n / eventos).toFixed(1);
+    console.log(`${nome.padEnd(22)} ${us.toFixed(2).padStart(8)} us/evento  `
+        + `criados ${por(contagem.criados).padStart(5)}  inseridos ${por(contagem.inseridos).padStart(4)}  `
+        + `removidos ${por(contagem.removidos).padStart(4)}  textos ${por(contagem.textos).padStart(4)}  `
+        + `bytes de HTML ${por(contagem.parse).padStart(6)}`);
+}
+
+const eventos = Number(process.argv[2] || 20000);
+const containerAntes = new Elemento('div');
+medir('innerHTML (antes)', eventos, (fila) => renderizarAntes(containerAntes, fila));
+
+const lista = new ListaChaveada(new Elemento('div'), {
+    chave: (c) => c.id,
+    criar: criarDepois,
+    preencher: preencherDepois,
+    classeNovo: 'chamada-nova'
+});
+medir('ListaChaveada (depois)', eventos, (fila) => lista.renderizar(fila.slice(1, 6)));
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark do protocolo TCP - JSON x compacto
+Compara bytes na rede e tempo de codificação/decodificação de snapshots da fila
+"""
+
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import protocolo
+
+CORES = ['cinza', 'vermelho', 'laranja', 'amarelo', 'verde', 'azul']
+
+
+def gerar_fila(tamanho):
+    """Monta um queue_update igual ao enviado por HospitalServer"""
+    inicio = datetime(2025, 6, 12, 7, 0, 0)
+    fila = []
+    for i in range(tamanho):
+        horario = (inicio + timedelta(seconds=37 * i)).strftime('%H:%M:%S')
+        sala = 100 + i % 25
+        paciente = f"Paciente Exemplo da Silva {i}"
+        fila.append({
+            'id': i + 1,
+            'room': sala,
+            'sala': sala,
+            'patient': paciente,
+            'paciente': paciente,
+            'time': horario,
+            'timestamp': horario,
+            'status': 'chamado',
+            'cor': CORES[i % len(CORES)],
+        })
+    return {'type': 'queue_update', 'queue': fila}
+
+
+def medir(codec, mensagem, repeticoes):
+    dados = codec.codificar(mensagem)
+    leitor = protocolo.LeitorMensagens()
+
+    def decodificar():
+        leitor.alimentar(dados)
+        leitor.proxima()
+
+    codificar_s = min(timeit.repeat(lambda: codec.codificar(mensagem), number=repeticoes, repeat=3))
+    decodificar_s = min(timeit.repeat(decodificar, number=repeticoes, repeat=3))
+    return len(dados), codificar_s / repeticoes * 1e6, decodificar_s / repeticoes * 1e6
+
+
+def main():
+    print(f"{'entradas':>8} {'codec':>9} {'bytes':>9} {'cod (us)':>10} {'dec (us)':>10}")
+    for tamanho in (10, 100, 1000):
+        mensagem = gerar_fila(tamanho)
+        repeticoes = max(10, 20000 // tamanho)
+        base = None
+        for codec in (protocolo.JSON, protocolo.COMPACTO):
+            tamanho_bytes, cod_us, dec_us = medir(codec, mensagem, repeticoes)
+            base = base or tamanho_bytes
+            print(f"{tamanho:>8} {codec.nome:>9} {tamanho_bytes:>9} {cod_us:>10.1f} {dec_us:>10.1f}"
+                  f"  ({tamanho_bytes / base:.0%} dos bytes JSON)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark dos registros do servidor central
+Compara as chamadas como dicionários com os nomes duplicados (room/sala,
+patient/paciente, time/timestamp e dois strftime por chamada), como eram
+montadas antes, com registros.ChamadaFila: memória de N chamadas na fila e
+N no histórico, tempo para criá-las e para montar e codificar (JSON e
+compacto) a queue_update enviada à recepção.
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fila_prioridade import TEMPO_ALVO  # noqa: E402
+import protocolo  # noqa: E402
+from registros import ChamadaFila, para_mensagens  # noqa: E402
+
+CORES = list(TEMPO_ALVO)
+
+
+def chamada_dict(i, sala, paciente, cor):
+    """Formato anterior da entrada da fila"""
+    return {
+        'id': i,
+        'room': sala,
+        'sala': sala,
+        'patient': paciente,
+        'paciente': paciente,
+        'time': datetime.now().strftime('%H:%M:%S'),
+        'timestamp': datetime.now().strftime('%H:%M:%S'),
+        'status': 'chamado',
+        'cor': cor,
+        'trace_id': None,
+    }
+
+
+def atender_dict(chamada):
+    chamada['status'] = 'atendido'
+    chamada['fim_atendimento'] = datetime.now().strftime('%H:%M:%S')
+
+
+def atender_registro(chamada):
+    chamada.atender()
+
+
+def entradas(n, gerador):
+    return [(i, gerador.randrange(1, 21), f'Paciente {i}', gerador.choice(CORES)) for i in range(n)]
+
+
+def montar(criar, atender, dados, n):
+    fila = [criar(*item) for item in dados[:n]]
+    historico = [criar(*item) for item in dados[n:]]
+    for chamada in historico:
+        atender(chamada)
+    return fila, historico
+
+
+def medir(nome, criar, atender, serializar, dados, n):
+    # Memória numa passada com tracemalloc; tempos em outra, sem o custo dele
+    gc.collect()
+    tracemalloc.start()
+    fila, historico = montar(criar, atender, dados, n)
+    memoria, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del fila, historico
+    gc.collect()
+
+    comeco = time.perf_counter()
+    fila, historico = montar(criar, atender, dados, n)
+    duracao_criar = time.perf_counter() - comeco
+
+    envios = []
+    for codec in (protocolo.JSON, protocolo.COMPACTO):
+        comeco = time.perf_counter()
+        codec.codificar({'type': 'queue_update', 'queue': serializar(fila)})
+        envios.append(f'{codec.nome} {(time.perf_counter() - comeco) * 1e3:6.1f} ms')
+
+    total = len(fila) + len(historico)
+    print(f'{nome:<10} memória {memoria / 2 ** 20:6.1f} MiB ({memoria / total:4.0f} B/chamada)  '
+          f'criar {duracao_criar * 1e6 / total:5.2f} µs/chamada  '
+          f'queue_update: {"  ".join(envios)}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', type=int, default=100000, help='chamadas na fila e no histórico (cada)')
+    args = parser.parse_args()
+
+    dados = entradas(2 * args.n, random.Random(args.n))
+    print(f'{args.n:,d} chamadas na fila + {args.n:,d} no histórico')
+    # A lista de dicts já estava pronta; os registros montam os nomes de compatibilidade no envio
+    medir('dict', chamada_dict, atender_dict, list, dados, args.n)
+    medir('registro', ChamadaFila, atender_registro, para_mensagens, dados, args.n)
+
+
+if __name__ == '__main__':
+    main()
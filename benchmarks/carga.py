@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Teste de carga reprodutível dos dois servidores
+Sobe app.py (Flask-SocketIO) ou servidor.py (HospitalServer) em um processo
+separado, conecta N médicos e M recepções sem interface e mede vazão,
+latência de distribuição (médico chama -> recepção recebe), CPU e memória do
+servidor. O resultado vai para um JSON em benchmarks/resultados/ para comparar
+commits.
+
+Uso:
+    python benchmarks/carga.py web --medicos 10 --recepcoes 20 --taxa 2 --duracao 30
+    python benchmarks/carga.py tcp --medicos 10 --recepcoes 5 --codificacao compacto
+    python benchmarks/carga.py comparar resultados/antes.json resultados/depois.json
+
+Dependências só do teste: pip install -r benchmarks/requirements.txt
+"""
+
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, RAIZ)
+PASTA_RESULTADOS = os.path.join(RAIZ, 'benchmarks', 'resultados')
+
+import protocolo  # noqa: E402
+
+try:
+    import psutil
+except ImportError:  # sem psutil o resultado sai sem CPU/RSS
+    psutil = None
+
+# Inicia o app.py com banco temporário e os dados iniciais
+INICIAR_WEB = """
+import sys
+sys.path.insert(0, {raiz!r})
+import app
+app.criar_dados_iniciais()
+app.socketio.run(app.app, host='127.0.0.1', port={porta}, allow_unsafe_werkzeug=True, log_output=False)
+"""
+
+INICIAR_TCP = """
+import sys
+sys.path.insert(0, {raiz!r})
+import servidor
+s = servidor.HospitalServer(port={porta})
+s.host = '127.0.0.1'
+s.start()
+"""
+
+
+def percentil(ordenados, p):
+    if not ordenados:
+        return None
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def commit_atual():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short=10', 'HEAD'], cwd=RAIZ,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class ProcessoServidor:
+    """Servidor em subprocesso, com amostragem de CPU e memória"""
+
+    def __init__(self, codigo, porta, ambiente=None):
+        self.porta = porta
+        # Arquivo e não PIPE: um pipe cheio travaria o servidor no meio do teste
+        self.erros = tempfile.TemporaryFile()
+        self.processo = subprocess.Popen(
+            [sys.executable, '-c', codigo], cwd=RAIZ, env=dict(os.environ, **(ambiente or {})),
+            stdout=subprocess.DEVNULL, stderr=self.erros
+        )
+        self.amostras_rss = []
+        self._parar = threading.Event()
+        self._ps = psutil.Process(self.processo.pid) if psutil else None
+
+    def aguardar_porta(self, limite=30):
+        fim = time.monotonic() + limite
+        while time.monotonic() < fim:
+            if self.processo.poll() is not None:
+                self.erros.seek(0)
+                raise RuntimeError('Servidor encerrou ao iniciar:\n' + self.erros.read().decode(errors='replace'))
+            try:
+                socket.create_connection(('127.0.0.1', self.porta), timeout=0.5).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError(f'Servidor não abriu a porta {self.porta} em {limite} s')
+
+    def cpu_segundos(self):
+        if not self._ps:
+            return None
+        tempos = self._ps.cpu_times()
+        return tempos.user + tempos.system
+
+    def _amostrar(self):
+        while not self._parar.wait(0.25):
+            try:
+                self.amostras_rss.append(self._ps.memory_info().rss)
+            except psutil.Error:
+                return
+
+    def iniciar_amostragem(self):
+        if self._ps:
+            self.amostras_rss.append(self._ps.memory_info().rss)
+            threading.Thread(target=self._amostrar, daemon=True).start()
+
+    def encerrar(self):
+        self._parar.set()
+        self.processo.terminate()
+        try:
+            self.processo.wait(5)
+        except subprocess.TimeoutExpired:
+            self.processo.kill()
+
+
+class Coleta:
+    """Horário de envio de cada chamada e de cada entrega, no relógio deste processo"""
+
+    def __init__(self):
+        self.enviadas = {}  # {id: perf_counter do envio}
+        self.latencias = []
+        self.entregas = 0
+        self.lock = threading.Lock()
+
+    def enviada(self, chamada_id):
+        with self.lock:
+            self.enviadas[chamada_id] = time.perf_counter()
+
+    def recebida(self, chamada_id):
+        agora = time.perf_counter()
+        with self.lock:
+            inicio = self.enviadas.get(chamada_id)
+            if inicio is not None:
+                self.latencias.append((agora - inicio) * 1000)
+                self.entregas += 1
+
+
+def id_da_chamada(paciente):
+    # Pacientes têm o nome "carga-<id>"
+    if isinstance(paciente, str) and paciente.startswith('carga-'):
+        return paciente
+    return None
+
+
+def ritmo(taxa, duracao, parar, enviar):
+    """Chama enviar(i) `taxa` vezes por segundo durante `duracao` segundos"""
+    intervalo = 1 / taxa
+    inicio = time.perf_counter()
+    i = 0
+    while not parar.is_set():
+        proximo = inicio + i * intervalo
+        if proximo - inicio >= duracao:
+            break
+        espera = proximo - time.perf_counter()
+        if espera > 0:
+            time.sleep(espera)
+        enviar(i)
+        i += 1
+
+
+# --- app.py -----------------------------------------------------------------
+
+def conectar_web(url, unidade, role, coleta=None):
+    import requests
+    import socketio
+
+    sessao = requests.Session()
+    sessao.post(f'{url}/servidor', data={'servidor': unidade})
+    resposta = sessao.post(f'{url}/login', data={'role': role})
+    if '/dashboard' not in resposta.url:
+        raise RuntimeError(f'Login como {role} na unidade {unidade} falhou')
+    cliente = socketio.Client(http_session=sessao, reconnection=False)
+    if coleta is not None:
+        @cliente.on('nova_chamada')
+        def nova_chamada(chamada):
+            chamada_id = id_da_chamada(chamada.get('paciente'))
+            if chamada_id:
+                coleta.recebida(chamada_id)
+    cliente.connect(url, transports=['websocket'])
+    return cliente
+
+
+def executar_web(args, coleta):
+    porta = porta_livre()
+    pasta = tempfile.mkdtemp(prefix='carga_web_')
+    servidor = ProcessoServidor(INICIAR_WEB.format(raiz=RAIZ, porta=porta), porta, {
+        'DATABASE_URL': f"sqlite:///{os.path.join(pasta, 'hospital.db')}",
+        'ARQUIVO_PASTA': os.path.join(pasta, 'arquivo'),
+        'ARQUIVO_DIAS': '0',
+    })
+    url = f'http://127.0.0.1:{porta}'
+    clientes = []
+    try:
+        servidor.aguardar_porta()
+        for _ in range(args.recepcoes):
+            clientes.append(conectar_web(url, args.unidade, 'recepcao', coleta))
+        medicos = []
+        for _ in range(args.medicos):
+            medicos.append(conectar_web(url, args.unidade, 'medico'))
+            clientes.append(medicos[-1])
+
+        def medico(n, cliente):
+            def enviar(i):
+                chamada_id = f'carga-{n}-{i}'
+                coleta.enviada(chamada_id)
+                cliente.emit('chamar_paciente', {'paciente': chamada_id, 'sala': str(n + 1), 'cor': 'verde'})
+            return enviar
+
+        return servidor, [medico(n, c) for n, c in enumerate(medicos)], clientes
+    except Exception:
+        for cliente in clientes:
+            cliente.disconnect()
+        servidor.encerrar()
+        raise
+
+
+# --- servidor.py -------------------------------------------------------------
+
+class ClienteTCP:
+    def __init__(self, porta, tipo, codificacao, coleta=None):
+        self.socket = socket.create_connection(('127.0.0.1', porta))
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.codec = protocolo.JSON
+        self.coleta = coleta
+        self.registrado = threading.Event()
+        self.respostas = []
+        self.lock = threading.Lock()
+        threading.Thread(target=self._receber, daemon=True).start()
+        self.enviar({'type': 'register', 'client_type': tipo, 'codificacoes': [codificacao]})
+        if not self.registrado.wait(10):
+            raise RuntimeError('HospitalServer não confirmou o registro')
+
+    def enviar(self, mensagem):
+        with self.lock:
+            self.socket.sendall(self.codec.codificar(mensagem))
+
+    def _receber(self):
+        leitor = protocolo.LeitorMensagens()
+        while True:
+            try:
+                dados = self.socket.recv(65536)
+            except OSError:
+                return
+            if not dados:
+                return
+            leitor.alimentar(dados)
+            while True:
+                mensagem = leitor.proxima()
+                if mensagem is None:
+                    break
+                tipo = mensagem.get('type')
+                if tipo == 'register_success':
+                    self.codec = protocolo.CODECS.get(mensagem.get('codificacao'), protocolo.JSON)
+                    self.registrado.set()
+                elif tipo == 'new_call' and self.coleta is not None:
+                    chamada_id = id_da_chamada((mensagem.get('call') or {}).get('paciente'))
+                    if chamada_id:
+                        self.coleta.recebida(chamada_id)
+                else:
+                    self.respostas.append(tipo)
+
+    def disconnect(self):
+        self.socket.close()
+
+
+def executar_tcp(args, coleta):
+    porta = porta_livre()
+    servidor = ProcessoServidor(INICIAR_TCP.format(raiz=RAIZ, porta=porta), porta,
+                                {'METRICAS_PORTA': '0'})
+    clientes = []
+    try:
+        servidor.aguardar_porta()
+        for _ in range(args.recepcoes):
+            clientes.append(ClienteTCP(porta, 'recepcao', args.codificacao, coleta))
+        medicos = []
+        for n in range(args.medicos):
+            medicos.append(ClienteTCP(porta, 'medico', args.codificacao))
+            clientes.append(medicos[-1])
+            medicos[-1].enviar({'type': 'login_medico', 'sala': n + 1, 'nome': f'Carga {n + 1}'})
+        time.sleep(0.5)
+
+        def medico(n, cliente):
+            def enviar(i):
+                chamada_id = f'carga-{n}-{i}'
+                coleta.enviada(chamada_id)
+                cliente.enviar({'type': 'chamar_paciente', 'paciente': chamada_id, 'cor': 'verde'})
+            return enviar
+
+        return servidor, [medico(n, c) for n, c in enumerate(medicos)], clientes
+    except Exception:
+        for cliente in clientes:
+            cliente.disconnect()
+        servidor.encerrar()
+        raise
+
+
+# --- execução e resultado ----------------------------------------------------
+
+def executar(args):
+    coleta = Coleta()
+    parar = threading.Event()
+    iniciar = executar_web if args.stack == 'web' else executar_tcp
+    servidor, medicos, clientes = iniciar(args, coleta)
+    try:
+        servidor.iniciar_amostragem()
+        cpu_inicio = servidor.cpu_segundos()
+        inicio = time.perf_counter()
+        threads = [threading.Thread(target=ritmo, args=(args.taxa, args.duracao, parar, enviar), daemon=True)
+                   for enviar in medicos]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duracao_envio = time.perf_counter() - inicio
+
+        # Espera as entregas atrasadas
+        esperadas = len(coleta.enviadas) * args.recepcoes
+        fim_espera = time.monotonic() + args.espera
+        while coleta.entregas < esperadas and time.monotonic() < fim_espera:
+            time.sleep(0.05)
+        duracao_total = time.perf_counter() - inicio
+        cpu_fim = servidor.cpu_segundos()
+    finally:
+        parar.set()
+        for cliente in clientes:
+            cliente.disconnect()
+        servidor.encerrar()
+
+    latencias = sorted(coleta.latencias)
+    rss = servidor.amostras_rss
+    cpu = None if cpu_inicio is None else round(cpu_fim - cpu_inicio, 3)
+    return {
+        'stack': args.stack,
+        'commit': commit_atual(),
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'ambiente': {'python': platform.python_version(), 'sistema': platform.platform(),
+                     'cpus': os.cpu_count()},
+        'parametros': {
+            'medicos': args.medicos, 'recepcoes': args.recepcoes, 'taxa_por_medico': args.taxa,
+            'duracao': args.duracao, 'codificacao': args.codificacao if args.stack == 'tcp' else None,
+            'unidade': args.unidade if args.stack == 'web' else None,
+        },
+        'chamadas_enviadas': len(coleta.enviadas),
+        'entregas_esperadas': esperadas,
+        'entregas_recebidas': coleta.entregas,
+        'entregas_perdidas': esperadas - coleta.entregas,
+        'vazao_chamadas_s': round(len(coleta.enviadas) / duracao_envio, 1),
+        'vazao_entregas_s': round(coleta.entregas / duracao_total, 1),
+        'latencia_ms': {
+            'p50': percentil(latencias, 50), 'p95': percentil(latencias, 95), 'p99': percentil(latencias, 99),
+            'max': latencias[-1] if latencias else None,
+            'media': sum(latencias) / len(latencias) if latencias else None,
+        },
+        'cpu_servidor': {
+            'segundos': cpu,
+            'percentual_medio': None if cpu is None else round(100 * cpu / duracao_total, 1),
+        },
+        'rss_servidor_mb': {
+            'inicio': round(rss[0] / 2**20, 1) if rss else None,
+            'pico': round(max(rss) / 2**20, 1) if rss else None,
+            'fim': round(rss[-1] / 2**20, 1) if rss else None,
+        },
+    }
+
+
+def arredondar(valor):
+    return round(valor, 2) if isinstance(valor, float) else valor
+
+
+def gravar(resultado, saida):
+    if not saida:
+        os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+        nome = f"{resultado['stack']}_{resultado['commit'] or 'sem-git'}_{datetime.now():%Y%m%d-%H%M%S}.json"
+        saida = os.path.join(PASTA_RESULTADOS, nome)
+    resultado['latencia_ms'] = {k: arredondar(v) for k, v in resultado['latencia_ms'].items()}
+    with open(saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+    return saida
+
+
+# Métricas comparadas e se "maior é melhor"
+COMPARADAS = [
+    ('vazao_entregas_s', True),
+    ('entregas_perdidas', False),
+    ('latencia_ms.p50', False),
+    ('latencia_ms.p95', False),
+    ('latencia_ms.p99', False),
+    ('cpu_servidor.segundos', False),
+    ('rss_servidor_mb.pico', False),
+]
+
+
+def _valor(resultado, caminho):
+    for parte in caminho.split('.'):
+        resultado = (resultado or {}).get(parte)
+    return resultado
+
+
+def comparar(antes, depois, tolerancia):
+    """Imprime a variação de cada métrica; retorna True se alguma piorou além da tolerância"""
+    piorou = False
+    if antes['stack'] != depois['stack'] or antes['parametros'] != depois['parametros']:
+        print('Aviso: os resultados usam servidores ou parâmetros diferentes')
+    print(f"{'métrica':24s} {antes['commit'] or '?':>12s} {depois['commit'] or '?':>12s}  variação")
+    for caminho, maior_melhor in COMPARADAS:
+        a, d = _valor(antes, caminho), _valor(depois, caminho)
+        if a is None or d is None:
+            continue
+        variacao = (d - a) / a * 100 if a else (0.0 if d == a else float('inf'))
+        pior = variacao < -tolerancia if maior_melhor else variacao > tolerancia
+        piorou |= pior
+        print(f"{caminho:24s} {a:>12} {d:>12}  {variacao:+7.1f}%{'  <- pior' if pior else ''}")
+    return piorou
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='stack', required=True)
+    for stack, ajuda in (('web', 'app.py (Flask-SocketIO)'), ('tcp', 'servidor.py (HospitalServer)')):
+        p = sub.add_parser(stack, help=ajuda)
+        p.add_argument('--medicos', type=int, default=10, help='médicos chamando ao mesmo tempo')
+        p.add_argument('--recepcoes', type=int, default=10, help='telas de recepção conectadas')
+        p.add_argument('--taxa', type=float, default=1.0, help='chamadas por segundo de cada médico')
+        p.add_argument('--duracao', type=float, default=20.0, help='segundos de envio')
+        p.add_argument('--espera', type=float, default=10.0, help='tempo máximo (s) esperando entregas atrasadas')
+        p.add_argument('--saida', help='arquivo JSON (padrão: benchmarks/resultados/<stack>_<commit>_<data>.json)')
+        if stack == 'web':
+            p.add_argument('--unidade', default='UPA Noroeste', help='nome da unidade (ativa) usada no login')
+        else:
+            p.add_argument('--codificacao', choices=list(protocolo.CODECS), default='json')
+    p = sub.add_parser('comparar', help='compara dois resultados')
+    p.add_argument('antes')
+    p.add_argument('depois')
+    p.add_argument('--tolerancia', type=float, default=10.0, help='piora aceita (%%) antes de falhar')
+    args = parser.parse_args()
+
+    if args.stack == 'comparar':
+        with open(args.antes, encoding='utf-8') as a, open(args.depois, encoding='utf-8') as d:
+            sys.exit(1 if comparar(json.load(a), json.load(d), args.tolerancia) else 0)
+
+    if psutil is None:
+        print('Aviso: psutil não instalado; CPU e memória do servidor não serão medidas')
+    resultado = executar(args)
+    saida = gravar(resultado, args.saida)
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    print(f'Resultado gravado em {saida}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Teste de carga das doze unidades em app.py
+Um médico e uma recepção por unidade chamando ao mesmo tempo; uma unidade
+recebe um surto de chamadas e as demais devem manter a latência.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+
+# O banco precisa ser configurado antes de importar o app
+_banco = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ.setdefault('DATABASE_URL', f'sqlite:///{_banco.name}')
+
+from app import app, db, socketio, criar_dados_iniciais, Servidor  # noqa: E402
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def conectar(servidor_id, role):
+    cliente_http = app.test_client()
+    with cliente_http.session_transaction() as sessao:
+        sessao['servidor_id'] = servidor_id
+    cliente_http.post('/login', data={'role': role})
+    return socketio.test_client(app, flask_test_client=cliente_http)
+
+
+def simular_unidade(servidor_id, chamadas, intervalo, resultados):
+    medico = conectar(servidor_id, 'medico')
+    recepcao = conectar(servidor_id, 'recepcao')
+    latencias = []
+    for i in range(chamadas):
+        inicio = time.perf_counter()
+        medico.emit('chamar_paciente', {'paciente': f'Paciente {i}', 'sala': '1', 'cor': 'verde'})
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        if intervalo:
+            time.sleep(intervalo)
+    recebidas = sum(1 for m in recepcao.get_received() if m['name'] == 'nova_chamada')
+    resultados[servidor_id] = (latencias, recebidas)
+    medico.disconnect()
+    recepcao.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chamadas', type=int, default=50, help='chamadas por unidade')
+    parser.add_argument('--surto', type=int, default=10, help='multiplicador de chamadas na unidade em surto')
+    parser.add_argument('--intervalo', type=float, default=0.005, help='pausa entre chamadas (s)')
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        criar_dados_iniciais()
+        Servidor.query.update({'ativo': True})
+        db.session.commit()
+        unidades = [(s.id, s.nome) for s in Servidor.query.order_by(Servidor.id)]
+
+    surto_id = unidades[0][0]
+    resultados = {}
+    threads = [
+        threading.Thread(target=simular_unidade, args=(
+            servidor_id,
+            args.chamadas * (args.surto if servidor_id == surto_id else 1),
+            0 if servidor_id == surto_id else args.intervalo,
+            resultados
+        ))
+        for servidor_id, _ in unidades
+    ]
+    inicio = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total = time.perf_counter() - inicio
+
+    print(f"{'unidade':<30} {'chamadas':>8} {'recebidas':>9} {'p50 ms':>8} {'p95 ms':>8} {'máx ms':>8}")
+    for servidor_id, nome in unidades:
+        latencias, recebidas = resultados[servidor_id]
+        marca = ' (surto)' if servidor_id == surto_id else ''
+        print(f"{(nome + marca)[:30]:<30} {len(latencias):>8} {recebidas:>9} "
+              f"{statistics.median(latencias):>8.2f} {percentil(latencias, 95):>8.2f} {max(latencias):>8.2f}")
+    print(f"Tempo total: {total:.2f}s")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        os.unlink(_banco.name)
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sistema de Chamada Hospitalar - Caches em memória
+Estruturas pequenas e thread-safe usadas pelo servidor web
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class CacheLRU:
+    """Dicionário limitado que descarta o item usado há mais tempo"""
+
+    def __init__(self, tamanho_maximo):
+        self.tamanho_maximo = tamanho_maximo
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave, padrao=None):
+        with self._lock:
+            try:
+                self._itens.move_to_end(chave)
+            except KeyError:
+                return padrao
+            return self._itens[chave]
+
+    def set(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho_maximo:
+                self._itens.popitem(last=False)
+
+    def __contains__(self, chave):
+        with self._lock:
+            return chave in self._itens
+
+    def __len__(self):
+        with self._lock:
+            return len(self._itens)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sistema de Chamada Hospitalar - Cache HTTP e compressão
+URLs estáticas com impressão digital, arquivos pré-comprimidos e ETag nas páginas
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional; sem ele só gzip é oferecido
+    brotli = None
+
+# Tipos que valem a pena comprimir (mp3, png etc. já são comprimidos)
+TIPOS_COMPRIMIVEIS = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+# Respostas menores que isso não compensam a compressão
+TAMANHO_MINIMO_COMPRESSAO = 1024
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+CACHE_REVALIDAR = 'public, max-age=3600'
+
+
+class ArquivoEstatico:
+    """Conteúdo de um arquivo estático carregado na inicialização"""
+
+    def __init__(self, caminho):
+        with open(caminho, 'rb') as arquivo:
+            self.conteudo = arquivo.read()
+        self.mimetype = mimetypes.guess_type(caminho)[0] or 'application/octet-stream'
+        self.impressao = hashlib.md5(self.conteudo).hexdigest()[:12]
+        self.versoes = {'identity': self.conteudo}
+        if self.mimetype.startswith(TIPOS_COMPRIMIVEIS) and len(self.conteudo) >= TAMANHO_MINIMO_COMPRESSAO:
+            self.versoes['gzip'] = gzip.compress(self.conteudo, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.versoes['br'] = brotli.compress(self.conteudo)
+
+    def escolher_codificacao(self, aceitas):
+        for codificacao in ('br', 'gzip'):
+            if codificacao in self.versoes and aceitas[codificacao]:
+                return codificacao
+        return 'identity'
+
+
+def carregar_estaticos(pasta):
+    """Lê e pré-comprime todos os arquivos da pasta static"""
+    arquivos = {}
+    for raiz, _, nomes in os.walk(pasta):
+        for nome in nomes:
+            caminho = os.path.join(raiz, nome)
+            relativo = os.path.relpath(caminho, pasta).replace(os.sep, '/')
+            arquivos[relativo] = ArquivoEstatico(caminho)
+    return arquivos
+
+
+def carregar_manifesto(pasta):
+    """Assets gerados por empacotar_assets.py, ou None para usar as CDNs"""
+    try:
+        with open(os.path.join(pasta, 'dist', 'manifesto.json'), encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+
+def configurar_cache_http(app):
+    """Instala o servidor de estáticos com cache e o ETag das páginas renderizadas"""
+    estaticos = carregar_estaticos(app.static_folder)
+    assets_locais = carregar_manifesto(app.static_folder)
+    servir_original = app.view_functions['static']
+
+    @app.url_defaults
+    def adicionar_impressao(endpoint, values):
+        # url_for('static', ...) ganha ?v=<hash>, que muda junto com o conteúdo
+        if endpoint == 'static' and 'v' not in values:
+            arquivo = estaticos.get(values.get('filename'))
+            if arquivo is not None:
+                values['v'] = arquivo.impressao
+
+    def servir_estatico(filename):
+        arquivo = estaticos.get(filename)
+        if arquivo is None:
+            # Arquivo criado depois da inicialização: caminho padrão do Flask
+            return servir_original(filename=filename)
+
+        codificacao = arquivo.escolher_codificacao(request.accept_encodings)
+        corpo = arquivo.versoes[codificacao]
+        resposta = Response(corpo, mimetype=arquivo.mimetype)
+        if codificacao != 'identity':
+            resposta.headers['Content-Encoding'] = codificacao
+        if len(arquivo.versoes) > 1:
+            resposta.vary.add('Accept-Encoding')
+        resposta.set_etag(f'{arquivo.impressao}-{codificacao}')
+        # Arquivos de dist/ já têm o hash no nome
+        if request.args.get('v') == arquivo.impressao or filename.startswith('dist/'):
+            resposta.headers['Cache-Control'] = CACHE_IMUTAVEL
+        else:
+            resposta.headers['Cache-Control'] = CACHE_REVALIDAR
+        # Range só faz sentido sobre o arquivo original (o <audio> usa Range)
+        return resposta.make_conditional(request, accept_ranges=codificacao == 'identity',
+                                         complete_length=len(corpo))
+
+    app.view_functions['static'] = servir_estatico
+
+    @app.context_processor
+    def injetar_assets():
+        return {'assets_locais': assets_locais}
+
+    @app.after_request
+    def etag_e_compressao(resposta):
+        if (request.method != 'GET' or resposta.status_code != 200
+                or resposta.mimetype != 'text/html' or resposta.direct_passthrough):
+            return resposta
+
+        # Páginas dependem do usuário: o navegador guarda, mas sempre revalida
+        resposta.headers['Cache-Control'] = 'private, no-cache'
+        resposta.vary.add('Accept-Encoding')
+        corpo = resposta.get_data()
+        comprimir = len(corpo) >= TAMANHO_MINIMO_COMPRESSAO and request.accept_encodings['gzip']
+        etag = hashlib.sha1(corpo).hexdigest()
+        # Mesma página em outra codificação não pode compartilhar o ETag
+        resposta.set_etag(f'{etag}-gzip' if comprimir else etag)
+        resposta.make_conditional(request)
+        if comprimir and resposta.status_code == 200:
+            resposta.set_data(gzip.compress(corpo, compresslevel=6))
+            resposta.headers['Content-Encoding'] = 'gzip'
+        return resposta
+
+    return estaticos
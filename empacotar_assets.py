@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sistema de Chamada Hospitalar - Empacotamento dos assets do navegador
+Gera em static/dist um CSS e um JS com nome por hash contendo só o que os
+templates e os scripts de static/js usam de Bootstrap, Font Awesome e do cliente socket.io.
+
+Uso:
+    python empacotar_assets.py                 # baixa as bibliotecas uma vez
+    python empacotar_assets.py --origem pasta  # usa cópias já baixadas (offline)
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import urllib.request
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+PASTA_TEMPLATES = os.path.join(RAIZ, 'templates')
+PASTA_JS = os.path.join(RAIZ, 'static', 'js')
+PASTA_DESTINO = os.path.join(RAIZ, 'static', 'dist')
+MANIFESTO = os.path.join(PASTA_DESTINO, 'manifesto.json')
+
+# Mesmas versões que base.html carregava das CDNs: {arquivo local: URL}
+BIBLIOTECAS = {
+    'bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'bootstrap.bundle.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'fontawesome.min.css': 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css',
+    'fa-solid-900.woff2': 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/webfonts/fa-solid-900.woff2',
+    'fa-regular-400.woff2': 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/webfonts/fa-regular-400.woff2',
+    'fa-brands-400.woff2': 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/webfonts/fa-brands-400.woff2',
+    'socket.io.min.js': 'https://cdnjs.cloudflare.com/ajax/libs/socket.io/4.0.1/socket.io.min.js',
+}
+
+# Fonte do Font Awesome necessária para cada classe de estilo
+FONTES_FA = {
+    'fas': 'fa-solid-900.woff2',
+    'fa-solid': 'fa-solid-900.woff2',
+    'far': 'fa-regular-400.woff2',
+    'fa-regular': 'fa-regular-400.woff2',
+    'fab': 'fa-brands-400.woff2',
+    'fa-brands': 'fa-brands-400.woff2',
+}
+
+# Único plugin JS do Bootstrap usado hoje (data-bs-dismiss="alert").
+# Se os templates passarem a usar outro, o bundle completo é incluído.
+ALERTA_JS = (
+    "document.addEventListener('click',function(e){"
+    "var b=e.target.closest('[data-bs-dismiss=\"alert\"]');"
+    "if(b){var a=b.closest('.alert');if(a){a.remove();}}});"
+)
+
+
+def obter_bibliotecas(origem):
+    """Garante uma cópia local de cada biblioteca em `origem`"""
+    os.makedirs(origem, exist_ok=True)
+    for nome, url in BIBLIOTECAS.items():
+        caminho = os.path.join(origem, nome)
+        if not os.path.exists(caminho):
+            print(f"Baixando {url}")
+            with urllib.request.urlopen(url, timeout=30) as resposta, open(caminho, 'wb') as arquivo:
+                shutil.copyfileobj(resposta, arquivo)
+
+
+def fontes_das_paginas():
+    """Templates e scripts próprios: onde as classes e os data-bs-* aparecem"""
+    return (glob.glob(os.path.join(PASTA_TEMPLATES, '*.html'))
+            + glob.glob(os.path.join(PASTA_JS, '**', '*.js'), recursive=True))
+
+
+def termos_usados():
+    """Todas as palavras dos templates e de static/js: classes no HTML e nas strings do JS"""
+    termos = set()
+    for caminho in fontes_das_paginas():
+        with open(caminho, encoding='utf-8') as arquivo:
+            termos.update(re.findall(r'[A-Za-z_][\w-]*', arquivo.read()))
+    return termos
+
+
+def plugins_bootstrap():
+    """Atributos data-bs-* usados nos templates e em static/js, como pares (atributo, valor)"""
+    plugins = set()
+    for caminho in fontes_das_paginas():
+        with open(caminho, encoding='utf-8') as arquivo:
+            plugins.update(re.findall(r'data-bs-([a-z-]+)="([^"]*)"', arquivo.read()))
+    return plugins
+
+
+def _dividir_topo(texto, separador):
+    """Divide em `separador` fora de parênteses"""
+    partes, profundidade, inicio = [], 0, 0
+    for i, c in enumerate(texto):
+        if c == '(':
+            profundidade += 1
+        elif c == ')':
+            profundidade -= 1
+        elif c == separador and profundidade == 0:
+            partes.append(texto[inicio:i])
+            inicio = i + 1
+    partes.append(texto[inicio:])
+    return partes
+
+
+def _blocos(css):
+    """Gera (prelúdio, corpo) de cada regra de nível superior; corpo None em @charset/@import"""
+    i, n = 0, len(css)
+    while i < n:
+        while i < n and css[i].isspace():
+            i += 1
+        if i >= n:
+            break
+        abre = css.find('{', i)
+        fim_instrucao = css.find(';', i)
+        if css[i] == '@' and fim_instrucao != -1 and (abre == -1 or fim_instrucao < abre):
+            yield css[i:fim_instrucao + 1].strip(), None
+            i = fim_instrucao + 1
+            continue
+        if abre == -1:
+            break
+        profundidade, j = 1, abre + 1
+        while j < n and profundidade:
+            if css[j] == '{':
+                profundidade += 1
+            elif css[j] == '}':
+                profundidade -= 1
+            j += 1
+        yield css[i:abre].strip(), css[abre + 1:j - 1]
+        i = j
+
+
+def _seletor_usado(seletor, termos):
+    # Classes dentro de :not(...) não precisam existir na página
+    sem_negacao = re.sub(r':not\([^)]*\)', '', seletor)
+    classes = re.findall(r'\.(-?[_a-zA-Z][\w-]*)', sem_negacao)
+    return all(classe in termos for classe in classes)
+
+
+def podar_css(css, termos, fontes):
+    """Remove as regras cujos seletores citam classes que nenhum template usa"""
+    saida = []
+    for preludio, corpo in _blocos(css):
+        if corpo is None:
+            if not preludio.startswith('@import'):
+                saida.append(preludio)
+        elif preludio.startswith(('@media', '@supports', '@layer', '@container')):
+            interno = podar_css(corpo, termos, fontes)
+            if interno:
+                saida.append(f'{preludio}{{{interno}}}')
+        elif preludio.startswith('@font-face'):
+            fonte = next((f for f in fontes if f in corpo), None)
+            if fonte:
+                # Só woff2: todos os navegadores das TVs suportam
+                corpo = re.sub(r'src:[^;}]*', f'src:url({fontes[fonte]}) format("woff2")', corpo)
+                saida.append(f'{preludio}{{{corpo}}}')
+        elif preludio.startswith('@'):
+            saida.append(f'{preludio}{{{corpo}}}')
+        else:
+            seletores = [s for s in _dividir_topo(preludio, ',') if _seletor_usado(s, termos)]
+            if seletores:
+                saida.append(f"{','.join(s.strip() for s in seletores)}{{{corpo.strip()}}}")
+    return ''.join(saida)
+
+
+def minificar_css(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    return re.sub(r'\s*([{};,>])\s*', r'\1', css).strip()
+
+
+def gravar_com_hash(nome, extensao, conteudo):
+    impressao = hashlib.sha256(conteudo).hexdigest()[:12]
+    arquivo = f'{nome}.{impressao}.{extensao}'
+    with open(os.path.join(PASTA_DESTINO, arquivo), 'wb') as destino:
+        destino.write(conteudo)
+    return f'dist/{arquivo}'
+
+
+def ler(origem, nome, modo='r'):
+    with open(os.path.join(origem, nome), modo, **({} if 'b' in modo else {'encoding': 'utf-8'})) as arquivo:
+        return arquivo.read()
+
+
+def empacotar(origem):
+    termos = termos_usados()
+    if os.path.isdir(PASTA_DESTINO):
+        shutil.rmtree(PASTA_DESTINO)
+    os.makedirs(PASTA_DESTINO)
+
+    # Fontes do Font Awesome realmente usadas, gravadas com hash no nome
+    fontes = {}
+    for classe, fonte in FONTES_FA.items():
+        if classe in termos and fonte not in fontes:
+            caminho = gravar_com_hash(fonte.rsplit('.', 1)[0], 'woff2', ler(origem, fonte, 'rb'))
+            fontes[fonte] = os.path.basename(caminho)
+
+    css = minificar_css(
+        podar_css(minificar_css(ler(origem, 'bootstrap.min.css')), termos, fontes)
+        + podar_css(minificar_css(ler(origem, 'fontawesome.min.css')), termos, fontes)
+    )
+
+    if plugins_bootstrap() <= {('dismiss', 'alert')}:
+        js_bootstrap = ALERTA_JS
+    else:
+        js_bootstrap = ler(origem, 'bootstrap.bundle.min.js')
+    js = ler(origem, 'socket.io.min.js') + '\n;' + js_bootstrap + '\n'
+
+    manifesto = {
+        'app.css': gravar_com_hash('app', 'css', css.encode('utf-8')),
+        'app.js': gravar_com_hash('app', 'js', js.encode('utf-8')),
+    }
+    with open(MANIFESTO, 'w', encoding='utf-8') as arquivo:
+        json.dump(manifesto, arquivo, indent=2)
+
+    originais = sum(os.path.getsize(os.path.join(origem, n)) for n in BIBLIOTECAS if not n.endswith('.woff2'))
+    gerados = sum(os.path.getsize(os.path.join(PASTA_DESTINO, a)) for a in os.listdir(PASTA_DESTINO))
+    print(f"Assets gerados em {PASTA_DESTINO}: {gerados} bytes (bibliotecas completas: {originais} bytes + fontes)")
+    return manifesto
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Empacota os assets do navegador em static/dist')
+    parser.add_argument('--origem', default=os.path.join(RAIZ, 'build', 'vendor'),
+                        help='pasta com as bibliotecas (baixadas aqui se faltarem)')
+    args = parser.parse_args()
+    obter_bibliotecas(args.origem)
+    empacotar(args.origem)
+
+
+if __name__ == '__main__':
+    main()
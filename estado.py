@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sistema de Chamada Hospitalar - Estado por unidade
+Cada Servidor (CAIS, UPA...) tem seu próprio shard de estado em memória
+"""
+
+import json
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter, deque
+
+# Quantidade de chamadas mantidas em memória por unidade
+LIMITE_CHAMADAS_RECENTES = 50
+# Mensagens de chat guardadas por unidade
+LIMITE_CHAT = 100
+# Eventos guardados por sala de socket para reenviar após reconexão
+LIMITE_REPLAY = 200
+# Eventos mais antigos que isso (s) não são reenviados: a tela recebe um snapshot
+IDADE_MAXIMA_REPLAY = 120
+# Identifica esta execução do servidor; números de sequência só valem dentro dela
+EPOCA = uuid.uuid4().hex[:12]
+# Tamanho máximo de uma mensagem de chat (caracteres)
+TAMANHO_MAXIMO_CHAT = 500
+# Mensagens que chegam dentro desta janela (s) são entregues juntas
+JANELA_LOTE_CHAT = 0.2
+# Balde de tokens do chat por conexão: rajada máxima e reposição por segundo
+CAPACIDADE_CHAT = 5
+TAXA_CHAT = 0.5
+# Chamadas mostradas no painel da sala de espera (destaque + lista)
+CHAMADAS_PAINEL = 6
+# Campos de cada chamada enviados ao painel público (sem trace_id nem áudio, que exige login)
+CAMPOS_PAINEL = ('id', 'paciente', 'sala', 'medico', 'cor', 'timestamp', 'rechamadas', 'tocar_em')
+
+
+def worker_da_unidade(servidor_id, total_workers):
+    """Índice do processo responsável pela unidade (hash estável entre processos)"""
+    if total_workers <= 1:
+        return 0
+    return zlib.crc32(str(servidor_id).encode('utf-8')) % total_workers
+
+
+class BaldeTokens:
+    """Limitador de taxa: cada ação consome um token; tokens voltam com o tempo"""
+
+    def __init__(self, capacidade, taxa):
+        self.capacidade = capacidade
+        self.taxa = taxa
+        self.tokens = float(capacidade)
+        self.atualizado = None
+
+    def consumir(self, agora):
+        if self.atualizado is not None:
+            self.tokens = min(self.capacidade, self.tokens + (agora - self.atualizado) * self.taxa)
+        self.atualizado = agora
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class EstadoUnidade:
+    """Shard de estado de uma unidade: chamadas recentes, salas, chat e contadores"""
+
+    def __init__(self, servidor_id):
+        self.servidor_id = servidor_id
+        # Lock próprio: uma unidade movimentada não bloqueia as outras
+        self.lock = threading.RLock()
+        self.chamadas_recentes = deque(maxlen=LIMITE_CHAMADAS_RECENTES)  # (usuario, chamada), mais recente primeiro
+        self.chamadas_carregadas = False
+        self.salas_conectadas = Counter()  # {sala: médicos conectados}
+        self.chat = deque(maxlen=LIMITE_CHAT)
+        self.chat_pendente = []
+        self.chat_lote_agendado = False
+        self.chat_ultimo_envio = None
+        self.limitadores_chat = {}  # {remetente (sid do socket): BaldeTokens}
+        self.sequencias = Counter()  # {sala_socket: último número de sequência}
+        self.eventos = {}  # {sala_socket: deque[(seq, instante, evento, dados)]}
+        self.contadores = Counter()
+        # Muda a cada alteração das chamadas recentes (painel, snapshots da fila)
+        self.versao_chamadas = 0
+        # Painel da sala de espera: JSON pronto e quem espera a próxima versão
+        self._painel = None  # (etag, corpo)
+        self.painel_mudou = threading.Condition(self.lock)
+
+    def _painel_alterado(self):
+        """Nova versão do painel: descarta o JSON pronto e acorda todos os que esperam"""
+        self.versao_chamadas += 1
+        self._painel = None
+        self.painel_mudou.notify_all()
+
+    def carregar_chamadas(self, chamadas):
+        """Preenche o cache com pares (usuario, chamada) vindos do banco, mais recente primeiro"""
+        with self.lock:
+            self.chamadas_recentes.clear()
+            self.chamadas_recentes.extend(chamadas)
+            self.chamadas_carregadas = True
+            self._painel_alterado()
+
+    def registrar_chamada(self, usuario, chamada):
+        with self.lock:
+            self.chamadas_recentes.appendleft((usuario, chamada))
+            self.contadores['chamadas'] += 1
+            self._painel_alterado()
+
+    def rechamar(self, chamada_id, ultima_chamada):
+        """Conta a nova chamada e leva-a ao topo; None se ela já saiu do cache"""
+        with self.lock:
+            for i, (dono, chamada) in enumerate(self.chamadas_recentes):
+                if chamada.get('id') == chamada_id:
+                    del self.chamadas_recentes[i]
+                    chamada['rechamadas'] = chamada.get('rechamadas', 0) + 1
+                    chamada['ultima_chamada'] = ultima_chamada
+                    self.chamadas_recentes.appendleft((dono, chamada))
+                    self.contadores['rechamadas'] += 1
+                    self._painel_alterado()
+                    return chamada
+            return None
+
+    def ultimas_chamadas(self, limite, usuario=None, salas=None):
+        """Chamadas mais recentes, opcionalmente só de um médico ou de um conjunto de salas (texto)"""
+        with self.lock:
+            chamadas = []
+            for dono, chamada in self.chamadas_recentes:
+                if ((usuario is None or dono == usuario)
+                        and (salas is None or str(chamada.get('sala')) in salas)):
+                    chamadas.append(chamada)
+                    if len(chamadas) == limite:
+                        break
+            return chamadas
+
+    def painel(self):
+        """(etag, corpo JSON) do painel; o JSON é montado uma vez por versão"""
+        with self.lock:
+            if self._painel is None:
+                chamadas = [{campo: chamada.get(campo) for campo in CAMPOS_PAINEL}
+                            for chamada in self.ultimas_chamadas(CHAMADAS_PAINEL)]
+                corpo = json.dumps({'versao': self.versao_chamadas, 'epoca': EPOCA, 'chamadas': chamadas},
+                                   ensure_ascii=False).encode('utf-8')
+                self._painel = (self.etag_painel(), corpo)
+            return self._painel
+
+    def esperar_painel(self, etag, timeout):
+        """Espera até `timeout` s por uma versão diferente de `etag`; retorna a atual (etag, corpo)"""
+        with self.lock:
+            self.painel_mudou.wait_for(lambda: self.etag_painel() != etag, timeout)
+            return self.painel()
+
+    def etag_painel(self):
+        return f'{EPOCA}-{self.versao_chamadas}'
+
+    def conectar_sala(self, sala):
+        with self.lock:
+            self.salas_conectadas[sala] += 1
+            self.contadores['conexoes'] += 1
+
+    def desconectar_sala(self, sala):
+        with self.lock:
+            self.salas_conectadas[sala] -= 1
+            if self.salas_conectadas[sala] <= 0:
+                del self.salas_conectadas[sala]
+
+    def registrar_evento(self, sala_socket, evento, dados, agora=None):
+        """Numera o evento e guarda no log de replay da sala; retorna os dados numerados"""
+        with self.lock:
+            self.sequencias[sala_socket] += 1
+            seq = self.sequencias[sala_socket]
+            dados = dict(dados, seq=seq, epoca=EPOCA)
+            log = self.eventos.get(sala_socket)
+            if log is None:
+                log = self.eventos[sala_socket] = deque(maxlen=LIMITE_REPLAY)
+            log.append((seq, time.monotonic() if agora is None else agora, evento, dados))
+            return dados
+
+    def sequencia_atual(self, sala_socket):
+        with self.lock:
+            return {'seq': self.sequencias[sala_socket], 'epoca': EPOCA}
+
+    def eventos_desde(self, sala_socket, ultimo_seq, epoca, agora=None):
+        """Eventos perdidos depois de `ultimo_seq`, ou None se for preciso um snapshot"""
+        agora = time.monotonic() if agora is None else agora
+        if ultimo_seq is None:
+            return None
+        try:
+            ultimo_seq = int(ultimo_seq)  # Vem do auth do cliente: pode ser qualquer coisa
+        except (TypeError, ValueError, OverflowError):
+            return None
+        with self.lock:
+            if epoca != EPOCA or ultimo_seq > self.sequencias[sala_socket]:
+                return None
+            log = self.eventos.get(sala_socket, ())
+            perdidos = [(evento, dados) for seq, instante, evento, dados in log if seq > ultimo_seq]
+            primeiro_guardado = log[0][0] if log else self.sequencias[sala_socket] + 1
+            if ultimo_seq + 1 < primeiro_guardado:
+                return None  # Parte dos eventos já saiu do log
+            if any(agora - instante > IDADE_MAXIMA_REPLAY
+                   for seq, instante, _, _ in log if seq > ultimo_seq):
+                return None
+            return perdidos
+
+    def pode_enviar_chat(self, remetente, agora):
+        with self.lock:
+            balde = self.limitadores_chat.get(remetente)
+            if balde is None:
+                balde = self.limitadores_chat[remetente] = BaldeTokens(CAPACIDADE_CHAT, TAXA_CHAT)
+            if balde.consumir(agora):
+                return True
+            self.contadores['chat_limitadas'] += 1
+            return False
+
+    def esquecer_remetente(self, remetente):
+        """Descarta o balde de uma conexão encerrada"""
+        with self.lock:
+            self.limitadores_chat.pop(remetente, None)
+
+    def publicar_chat(self, mensagem, agora):
+        """Guarda a mensagem no histórico e decide como entregá-la.
+
+        Retorna 'imediato' se a janela de agrupamento está livre, 'agendar'
+        se a mensagem abre um novo lote e None se entrou em um lote já agendado.
+        """
+        with self.lock:
+            self.chat.append(mensagem)
+            self.contadores['chat_mensagens'] += 1
+            if self.chat_lote_agendado:
+                self.chat_pendente.append(mensagem)
+                return None
+            if self.chat_ultimo_envio is None or agora - self.chat_ultimo_envio >= JANELA_LOTE_CHAT:
+                self.chat_ultimo_envio = agora
+                return 'imediato'
+            self.chat_pendente.append(mensagem)
+            self.chat_lote_agendado = True
+            return 'agendar'
+
+    def retirar_lote_chat(self, agora):
+        with self.lock:
+            lote = self.chat_pendente
+            self.chat_pendente = []
+            self.chat_lote_agendado = False
+            self.chat_ultimo_envio = agora
+            if lote:
+                self.contadores['chat_lotes'] += 1
+            return lote
+
+    def historico_chat(self):
+        with self.lock:
+            return list(self.chat)
+
+    def incrementar(self, contador, valor=1):
+        with self.lock:
+            self.contadores[contador] += valor
+
+    def resumo(self):
+        with self.lock:
+            return {
+                'servidor_id': self.servidor_id,
+                'chamadas_em_cache': len(self.chamadas_recentes),
+                'salas_conectadas': dict(self.salas_conectadas),
+                'mensagens_chat': len(self.chat),
+                'contadores': dict(self.contadores),
+            }
+
+
+class GerenciadorEstado:
+    """Cria e guarda os shards; sabe quais unidades pertencem a este processo"""
+
+    def __init__(self, total_workers=1, worker_id=0):
+        self.total_workers = max(1, total_workers)
+        self.worker_id = worker_id
+        self._unidades = {}
+        self._lock = threading.Lock()
+
+    def unidade(self, servidor_id):
+        estado = self._unidades.get(servidor_id)
+        if estado is None:
+            with self._lock:
+                estado = self._unidades.setdefault(servidor_id, EstadoUnidade(servidor_id))
+        return estado
+
+    def worker_da_unidade(self, servidor_id):
+        return worker_da_unidade(servidor_id, self.total_workers)
+
+    def atende(self, servidor_id):
+        """True se a unidade está fixada neste processo"""
+        return self.worker_da_unidade(servidor_id) == self.worker_id
+
+    def unidades(self):
+        with self._lock:
+            return list(self._unidades.values())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sistema de Chamada Hospitalar - Exportação do histórico de chamadas
+Gera CSV ou Parquet em pedaços, a partir de um iterador de chamadas, sem
+guardar o período inteiro em memória.
+"""
+
+import csv
+import io
+from datetime import datetime
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pyarrow é opcional; sem ele só CSV é oferecido
+    pyarrow = None
+
+# Ordem das colunas nos arquivos exportados
+COLUNAS = ['id', 'servidor_id', 'timestamp', 'paciente', 'sala', 'medico',
+           'nome_medico', 'cor', 'classificacao']
+# Linhas por pedaço de CSV enviado e por row group do Parquet
+LINHAS_POR_PEDACO = 5000
+LINHAS_POR_GRUPO = 100000
+
+FORMATOS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def formatos_disponiveis():
+    return [formato for formato in FORMATOS if formato != 'parquet' or pyarrow is not None]
+
+
+def gerar_csv(chamadas, linhas_por_pedaco=LINHAS_POR_PEDACO):
+    """Pedaços de CSV (bytes, UTF-8 com BOM para abrir direto no Excel)"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    buffer.write('\ufeff')
+    escritor.writerow(COLUNAS)
+    linhas = 0
+    for chamada in chamadas:
+        escritor.writerow([chamada[coluna] for coluna in COLUNAS])
+        linhas += 1
+        if linhas == linhas_por_pedaco:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            linhas = 0
+    yield buffer.getvalue().encode('utf-8')
+
+
+class _SaidaEmPedacos:
+    """Arquivo só de escrita que acumula bytes até alguém retirá-los"""
+
+    def __init__(self):
+        self.dados = bytearray()
+        self.posicao = 0
+        self.closed = False
+
+    def write(self, dados):
+        self.dados += dados
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self.posicao
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def retirar(self):
+        pedaco = bytes(self.dados)
+        self.dados.clear()
+        return pedaco
+
+
+def _esquema_parquet():
+    return pyarrow.schema([
+        ('id', pyarrow.int64()),
+        ('servidor_id', pyarrow.int32()),
+        ('timestamp', pyarrow.timestamp('us')),
+        ('paciente', pyarrow.string()),
+        ('sala', pyarrow.string()),
+        ('medico', pyarrow.string()),
+        ('nome_medico', pyarrow.string()),
+        # Parquet já grava colunas repetitivas (cor, médico) com dicionário
+        ('cor', pyarrow.string()),
+        ('classificacao', pyarrow.string()),
+    ])
+
+
+def _datetime(valor):
+    return datetime.fromisoformat(valor) if isinstance(valor, str) else valor
+
+
+def gerar_parquet(chamadas, linhas_por_grupo=LINHAS_POR_GRUPO):
+    """Pedaços de um arquivo Parquet; cada row group é enviado assim que fica pronto"""
+    if pyarrow is None:
+        raise RuntimeError('Exportação em Parquet requer o pacote pyarrow')
+    esquema = _esquema_parquet()
+    saida = _SaidaEmPedacos()
+    escritor = pyarrow.parquet.ParquetWriter(saida, esquema, compression='zstd')
+
+    def gravar(colunas):
+        colunas['timestamp'] = [_datetime(t) for t in colunas['timestamp']]
+        escritor.write_table(pyarrow.Table.from_pydict(colunas, schema=esquema))
+
+    colunas = {coluna: [] for coluna in COLUNAS}
+    linhas = 0
+    for chamada in chamadas:
+        for coluna in COLUNAS:
+            colunas[coluna].append(chamada[coluna])
+        linhas += 1
+        if linhas == linhas_por_grupo:
+            gravar(colunas)
+            colunas = {coluna: [] for coluna in COLUNAS}
+            linhas = 0
+            yield saida.retirar()
+    if linhas:
+        gravar(colunas)
+    escritor.close()
+    yield saida.retirar()
+
+
+def exportar(chamadas, formato):
+    """Iterador de bytes do arquivo no formato pedido ('csv' ou 'parquet')"""
+    if formato == 'csv':
+        return gerar_csv(chamadas)
+    if formato == 'parquet':
+        return gerar_parquet(chamadas)
+    raise ValueError(f'Formato de exportação desconhecido: {formato}')
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sistema de Chamada Hospitalar - Fila de atendimento por prioridade
+Heap ordenado pelo prazo de cada chamada: chegada + tempo-alvo da cor da
+triagem (Manchester). O prazo já embute o envelhecimento: quem espera sobe
+sozinho, e um azul que chegou 4 horas antes passa à frente de um vermelho
+novo. Inserir e remover custam O(log n); a remoção por id é preguiçosa
+(a entrada é descartada quando chega ao topo). O heap é a única estrutura
+ordenada: a lista enviada à recepção sai dele, ordenada uma vez por versão
+da fila e reaproveitada até a próxima mudança.
+"""
+
+import heapq
+import itertools
+import time
+
+# Tempo-alvo de atendimento por cor (s); cor desconhecida vale como 'cinza'
+TEMPO_ALVO = {
+    'vermelho': 0,
+    'laranja': 10 * 60,
+    'amarelo': 60 * 60,
+    'verde': 120 * 60,
+    'azul': 240 * 60,
+    'cinza': 240 * 60,
+}
+
+
+class FilaPrioridade:
+    def __init__(self, tempo_alvo=None):
+        self.tempo_alvo = dict(TEMPO_ALVO, **(tempo_alvo or {}))
+        self._heap = []  # [(prazo, ordem de chegada, id)]
+        self._chamadas = {}  # {id: chamada}, em ordem de chegada
+        self._por_sala = {}  # {sala: {id: None}}, em ordem de chegada
+        self._ordem = itertools.count()
+        self._chaves = {}  # {id: (prazo, ordem de chegada)}
+        self._ordenada = (None, [])  # (versao, chamadas da mais urgente à menos urgente)
+        self.versao = 0  # Muda a cada inserção ou remoção (snapshots da fila)
+
+    def cor(self, cor):
+        return cor if cor in self.tempo_alvo else 'cinza'
+
+    def inserir(self, chamada, agora=None):
+        """Enfileira a chamada (objeto com id, sala e cor, como registros.ChamadaFila)"""
+        agora = time.monotonic() if agora is None else agora
+        chave = (agora + self.tempo_alvo[self.cor(chamada.cor)], next(self._ordem))
+        heapq.heappush(self._heap, chave + (chamada.id,))
+        self._chamadas[chamada.id] = chamada
+        self._chaves[chamada.id] = chave
+        self._por_sala.setdefault(chamada.sala, {})[chamada.id] = None
+        self.versao += 1
+        return chamada
+
+    def remover(self, chamada_id):
+        """Tira a chamada da fila pelo id; None se ela não está na fila"""
+        chamada = self._chamadas.pop(chamada_id, None)
+        if chamada is None:
+            return None
+        sala = self._por_sala[chamada.sala]
+        del sala[chamada_id]
+        if not sala:
+            del self._por_sala[chamada.sala]
+        del self._chaves[chamada_id]
+        self.versao += 1
+        self._limpar_topo()
+        # Muitas entradas mortas no heap: reconstrói
+        if len(self._heap) > 2 * len(self._chamadas) + 64:
+            self._heap = [item for item in self._heap if self._viva(item)]
+            heapq.heapify(self._heap)
+        return chamada
+
+    def remover_da_sala(self, sala):
+        """Tira a chamada mais antiga de uma sala; None se a sala não tem chamadas"""
+        ids = self._por_sala.get(sala)
+        if not ids:
+            return None
+        return self.remover(next(iter(ids)))
+
+    def _viva(self, item):
+        return self._chaves.get(item[2]) == item[:2]
+
+    def _limpar_topo(self):
+        while self._heap and not self._viva(self._heap[0]):
+            heapq.heappop(self._heap)
+
+    def proxima(self):
+        """Chamada de maior prioridade, sem retirá-la"""
+        return self._chamadas[self._heap[0][2]] if self._heap else None
+
+    def retirar(self):
+        """Retira e retorna a chamada de maior prioridade"""
+        if not self._heap:
+            return None
+        return self.remover(self._heap[0][2])
+
+    def ordenada(self, salas=None):
+        """Chamadas da mais urgente para a menos urgente, como vão para a recepção.
+
+        Com `salas` (conjunto de salas como texto), só as dessas salas: pega os
+        ids pelo índice por sala e ordena só eles, sem varrer a fila inteira.
+        """
+        if salas is None:
+            versao, chamadas = self._ordenada
+            if versao != self.versao:
+                # Entradas vivas do heap; sem entradas mortas, todas estão vivas
+                itens = sorted(self._heap)
+                if len(itens) != len(self._chamadas):
+                    itens = [item for item in itens if self._viva(item)]
+                chamadas = [self._chamadas[item[2]] for item in itens]
+                self._ordenada = (self.versao, chamadas)
+            return list(chamadas)
+        ids = [chamada_id for sala, por_id in self._por_sala.items() if str(sala) in salas
+               for chamada_id in por_id]
+        ids.sort(key=self._chaves.__getitem__)
+        return [self._chamadas[chamada_id] for chamada_id in ids]
+
+    def get(self, chamada_id):
+        return self._chamadas.get(chamada_id)
+
+    def __len__(self):
+        return len(self._chamadas)
+
+    def __bool__(self):
+        return bool(self._chamadas)
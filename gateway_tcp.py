@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sistema de Chamada Hospitalar - Gateway TCP para os clientes de desktop
+Fala o protocolo do servidor central (JSON por linha ou compacto, com
+request_id) e liga médico.py e recepcao.py ao mesmo estado por unidade do
+sistema web: as chamadas feitas no Tk são gravadas e anunciadas pelo mesmo
+caminho de chamar_paciente, e as recepções Tk recebem as chamadas da web.
+"""
+
+import queue
+import socket
+import threading
+from collections import OrderedDict
+
+import assinaturas
+import idempotencia
+import protocolo
+import voo_unico
+
+# Chamadas mostradas na fila das recepções Tk
+LIMITE_FILA = 20
+# Chamadas marcadas como atendidas/removidas guardadas por unidade
+LIMITE_ATENDIDAS = 1000
+# Prazo (s) para enviar a um cliente antes de desconectá-lo
+TIMEOUT_ENVIO = 5
+# Mensagens aguardando envio por cliente; um cliente que não esvazia a fila é desconectado
+LIMITE_SAIDA = 500
+
+
+def para_protocolo(chamada):
+    """Chamada do sistema web no formato do servidor central"""
+    horario = str(chamada.get('timestamp') or '')[11:19]
+    return {
+        'id': chamada.get('id'),
+        'room': chamada.get('sala'),  # Para compatibilidade com cliente
+        'sala': chamada.get('sala'),
+        'patient': chamada.get('paciente'),  # Para compatibilidade com cliente
+        'paciente': chamada.get('paciente'),
+        'time': horario,  # Para compatibilidade
+        'timestamp': horario,
+        'status': 'chamado',
+        'cor': chamada.get('cor') or 'cinza',
+        'medico': chamada.get('medico'),
+        'trace_id': chamada.get('trace_id'),
+    }
+
+
+class _ClienteTCP:
+    def __init__(self, conexao, endereco):
+        self.conexao = conexao
+        self.id = f'{endereco[0]}:{endereco[1]}'
+        self.codec = protocolo.JSON
+        self.tipo = None
+        self.servidor_id = None
+        self.sala = None
+        self.nome = None
+        self.salas = None  # Salas acompanhadas pela recepção (None = todas)
+        # Bytes a enviar, esvaziados pela thread de escrita do cliente: quem publica nunca espera a rede
+        self.saida = queue.Queue(LIMITE_SAIDA)
+
+
+class GatewayTCP:
+    def __init__(self, porta, unidade_padrao, *, publicar_chamada, estado_da_unidade, atende,
+                 rastreador, contexto, areas=None, host='0.0.0.0'):
+        """publicar_chamada(servidor_id, medico, nome_medico, dados) grava e anuncia uma chamada;
+        estado_da_unidade(servidor_id) e atende(servidor_id) vêm do sistema web;
+        contexto() abre o contexto da aplicação para cada mensagem;
+        areas são as áreas de espera que as recepções podem assinar pelo nome."""
+        self.porta = porta
+        self.host = host
+        self.unidade_padrao = unidade_padrao
+        self.publicar_chamada = publicar_chamada
+        self.estado_da_unidade = estado_da_unidade
+        self.atende = atende
+        self.rastreador = rastreador
+        self.contexto = contexto
+        self.areas = areas or {}
+        self.chamadas_idempotentes = idempotencia.CacheIdempotencia()
+        self.clientes = {}  # {id: _ClienteTCP}
+        self.salas = {}  # {(servidor_id, sala): id do médico}
+        self.atendidas = {}  # {servidor_id: OrderedDict de ids}
+        self.versao_atendidas = 0  # Muda a cada chamada marcada ou desmarcada como atendida
+        # Fila já codificada por (unidade, salas, codec), reaproveitada enquanto não muda
+        self.filas_compartilhadas = voo_unico.VooUnico()
+        self.assinaturas = {}  # {servidor_id: Assinaturas das recepções}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._iniciado = False  # Só uma tentativa de abrir a porta
+
+    def iniciar(self):
+        """Abre a porta uma única vez por processo; se ela estiver ocupada, segue sem o gateway"""
+        if self._iniciado:
+            return self._thread is not None
+        with self._lock:
+            if self._iniciado:
+                return self._thread is not None
+            self._iniciado = True
+            servidor = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            try:
+                servidor.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                servidor.bind((self.host, self.porta))
+                servidor.listen(50)
+            except OSError as e:
+                servidor.close()
+                print(f"Gateway TCP desativado: não foi possível abrir a porta {self.porta}: {e}")
+                return False
+            self._thread = threading.Thread(target=self._aceitar, args=(servidor,),
+                                            name='gateway-tcp', daemon=True)
+            self._thread.start()
+            return True
+
+    def _aceitar(self, servidor):
+        while True:
+            conexao, endereco = servidor.accept()
+            conexao.settimeout(TIMEOUT_ENVIO)
+            cliente = _ClienteTCP(conexao, endereco)
+            threading.Thread(target=self._escrever, args=(cliente,), daemon=True).start()
+            threading.Thread(target=self._atender, args=(cliente,), daemon=True).start()
+
+    def _escrever(self, cliente):
+        while True:
+            dados = cliente.saida.get()
+            if dados is None:
+                return
+            try:
+                cliente.conexao.sendall(dados)
+            except OSError:
+                self._derrubar(cliente)
+                return
+
+    def _atender(self, cliente):
+        leitor = protocolo.LeitorMensagens()
+        try:
+            while True:
+                try:
+                    dados = cliente.conexao.recv(65536)
+                except socket.timeout:
+                    continue
+                if not dados:
+                    break
+                leitor.alimentar(dados)
+                while True:
+                    try:
+                        mensagem = leitor.proxima()
+                    except ValueError as e:
+                        print(f"Gateway TCP: mensagem inválida de {cliente.id}: {e}")
+                        self._erro(cliente, {}, 'Formato de mensagem inválido')
+                        continue
+                    if mensagem is None:
+                        break
+                    try:
+                        with self.contexto():
+                            self._processar(cliente, mensagem)
+                    except Exception as e:
+                        # Uma mensagem com problema (dados inesperados, banco fora do ar) não derruba o cliente
+                        print(f"Gateway TCP: erro ao processar {mensagem.get('type')} de {cliente.id}: {e!r}")
+                        self._erro(cliente, mensagem, 'Erro ao processar a mensagem')
+        except OSError:
+            pass
+        finally:
+            with self.contexto():
+                self._desconectar(cliente)
+
+    def _desconectar(self, cliente):
+        try:
+            cliente.saida.put_nowait(None)  # Encerra a thread de escrita
+        except queue.Full:
+            pass
+        try:
+            cliente.conexao.close()
+        except OSError:
+            pass
+        with self._lock:
+            if self.clientes.pop(cliente.id, None) is None:
+                return
+            if cliente.servidor_id in self.assinaturas:
+                self.assinaturas[cliente.servidor_id].cancelar(cliente.id)
+            if cliente.sala is not None and self.salas.get((cliente.servidor_id, cliente.sala)) == cliente.id:
+                del self.salas[(cliente.servidor_id, cliente.sala)]
+            else:
+                cliente.sala = None
+        if cliente.sala is not None:
+            self.estado_da_unidade(cliente.servidor_id).desconectar_sala(cliente.sala)
+            self._enviar_recepcoes(cliente.servidor_id, self._mensagem_salas(cliente.servidor_id))
+
+    def enviar(self, cliente, mensagem, prontos=None):
+        """Põe a mensagem na fila de saída do cliente, sem bloquear (pode ser chamado sob o lock da unidade).
+
+        prontos: campos já codificados no codec do cliente, acrescentados à mensagem.
+        """
+        try:
+            cliente.saida.put_nowait(cliente.codec.codificar(mensagem, prontos))
+            return True
+        except queue.Full:
+            self._derrubar(cliente)
+            return False
+
+    def _derrubar(self, cliente):
+        try:
+            cliente.conexao.shutdown(socket.SHUT_RDWR)  # A thread do cliente encerra e limpa
+        except OSError:
+            pass
+
+    def _responder(self, cliente, pedido, mensagem):
+        if pedido.get('request_id') is not None:
+            mensagem = dict(mensagem, request_id=pedido['request_id'])
+        self.enviar(cliente, mensagem)
+
+    def _erro(self, cliente, pedido, texto):
+        self._responder(cliente, pedido, {'type': 'error', 'message': texto})
+
+    def _recepcoes(self, servidor_id):
+        with self._lock:
+            return [c for c in self.clientes.values() if c.tipo == 'recepcao' and c.servidor_id == servidor_id]
+
+    def _enviar_recepcoes(self, servidor_id, mensagem):
+        for cliente in self._recepcoes(servidor_id):
+            self.enviar(cliente, mensagem)
+
+    # Estado da unidade no formato do protocolo
+
+    def fila(self, servidor_id, salas=None):
+        atendidas = self.atendidas.get(servidor_id, {})
+        chamadas = self.estado_da_unidade(servidor_id).ultimas_chamadas(LIMITE_FILA, salas=salas)
+        return [para_protocolo(c) for c in chamadas if c.get('id') not in atendidas]
+
+    def _enviar_fila(self, cliente, salas, pedido=None):
+        """queue_update com a fila montada e codificada uma vez por unidade, salas, codec e versão"""
+        servidor_id, codec = cliente.servidor_id, cliente.codec
+        versao = (self.estado_da_unidade(servidor_id).versao_chamadas, self.versao_atendidas)
+        fila, _ = self.filas_compartilhadas.obter(
+            (servidor_id, salas, codec.nome), versao,
+            lambda: codec.codificar_valor(self.fila(servidor_id, salas)))
+        mensagem = {'type': 'queue_update'}
+        if pedido is not None and pedido.get('request_id') is not None:
+            mensagem['request_id'] = pedido['request_id']
+        self.enviar(cliente, mensagem, {'queue': fila})
+
+    def _enviar_filas(self, servidor_id, sala):
+        """Fila para cada recepção Tk que acompanha `sala`, montada uma vez por conjunto de salas"""
+        with self._lock:
+            indice = self.assinaturas.get(servidor_id)
+            grupos = [(salas, [self.clientes[cid] for cid in ids if cid in self.clientes])
+                      for salas, ids in (indice.grupos().items() if indice else ())
+                      if assinaturas.na_assinatura(salas, sala)]
+        for salas, clientes in grupos:
+            for cliente in clientes:
+                self._enviar_fila(cliente, salas)
+
+    def _mensagem_salas(self, servidor_id):
+        salas = self.estado_da_unidade(servidor_id).resumo()['salas_conectadas']
+        with self._lock:
+            nomes = {sala: self.clientes[cid].nome for (sid, sala), cid in self.salas.items()
+                     if sid == servidor_id and cid in self.clientes}
+        return {'type': 'rooms_update', 'rooms': [
+            {'number': sala, 'connected': True, 'ip': 'N/A', 'medico': nomes.get(sala) or 'N/A'}
+            for sala in sorted(salas)]}
+
+    def _marcar_atendida(self, servidor_id, chamada_id):
+        with self._lock:
+            atendidas = self.atendidas.setdefault(servidor_id, OrderedDict())
+            atendidas[chamada_id] = None
+            self.versao_atendidas += 1
+            while len(atendidas) > LIMITE_ATENDIDAS:
+                atendidas.popitem(last=False)
+
+    # Eventos do sistema web
+
+    def publicar(self, servidor_id, evento, dados, sala_socket):
+        """Repassa às recepções Tk as chamadas emitidas para a recepção da unidade"""
+        if evento not in ('nova_chamada', 'rechamada') or sala_socket != f'recepcao_{servidor_id}':
+            return
+        with self._lock:
+            indice = self.assinaturas.get(servidor_id)
+            if not indice:
+                return
+            atendidas = self.atendidas.get(servidor_id, {})
+            if dados.get('id') in atendidas:
+                del atendidas[dados.get('id')]
+                self.versao_atendidas += 1
+            # Só as recepções que acompanham a sala da chamada recebem o aviso
+            destinatarios = [self.clientes[cid] for cid in indice.destinatarios(dados.get('sala'))
+                             if cid in self.clientes]
+        mensagem = {'type': 'new_call', 'call': para_protocolo(dados)}
+        for cliente in destinatarios:
+            self.enviar(cliente, mensagem)
+        self._enviar_filas(servidor_id, dados.get('sala'))
+
+    # Mensagens dos clientes
+
+    def _processar(self, cliente, mensagem):
+        tipo = mensagem.get('type')
+        if tipo == 'register':
+            self._registrar(cliente, mensagem)
+        elif cliente.servidor_id is None:
+            self._erro(cliente, mensagem, 'Cliente não registrado')
+        elif tipo == 'login_medico':
+            self._login_medico(cliente, mensagem)
+        elif tipo == 'chamar_paciente':
+            self._chamar_paciente(cliente, mensagem)
+        elif tipo in ('get_fila', 'get_queue'):
+            self._enviar_fila(cliente, cliente.salas, mensagem)
+        elif tipo == 'subscribe':
+            self._assinar(cliente, mensagem)
+        elif tipo in ('get_salas', 'get_rooms'):
+            self._responder(cliente, mensagem, self._mensagem_salas(cliente.servidor_id))
+        elif tipo in ('confirm_call', 'remove_call', 'confirmar_atendimento'):
+            self._atender_chamada(cliente, mensagem, tipo)
+        elif tipo == 'call_ack':
+            self.rastreador.confirmar(mensagem.get('trace_id'), cliente.id, mensagem.get('estagio', 'entregue'))
+        else:
+            self._erro(cliente, mensagem, f'Tipo de mensagem desconhecido: {tipo}')
+
+    def _registrar(self, cliente, mensagem):
+        tipo = mensagem.get('client_type')
+        if tipo == 'reception':
+            tipo = 'recepcao'
+        try:
+            servidor_id = int(mensagem.get('servidor_id') or self.unidade_padrao)
+        except (TypeError, ValueError):
+            self._erro(cliente, mensagem, 'Unidade inválida')
+            return
+        if tipo not in ('medico', 'recepcao') or not self.atende(servidor_id):
+            self._erro(cliente, mensagem, 'Unidade ou tipo de cliente não atendido por este servidor')
+            return
+        salas = None
+        if tipo == 'recepcao':
+            try:
+                salas = assinaturas.normalizar_salas(mensagem.get('salas'), self.areas)
+            except ValueError as e:
+                self._erro(cliente, mensagem, str(e))
+                return
+        cliente.tipo = tipo
+        cliente.servidor_id = servidor_id
+        cliente.salas = salas
+        with self._lock:
+            self.clientes[cliente.id] = cliente
+            if tipo == 'recepcao':
+                self.assinaturas.setdefault(servidor_id, assinaturas.Assinaturas()).assinar(cliente.id, salas)
+        if tipo == 'recepcao':
+            self._enviar_fila(cliente, salas)
+            self.enviar(cliente, self._mensagem_salas(servidor_id))
+        # A confirmação ainda vai em JSON; as mensagens seguintes usam o codec escolhido
+        codec = protocolo.negociar(mensagem.get('codificacoes'))
+        self._responder(cliente, mensagem, {'type': 'register_success', 'client_type': tipo,
+                                            'codificacao': codec.nome})
+        cliente.codec = codec
+
+    def _assinar(self, cliente, mensagem):
+        if cliente.tipo != 'recepcao':
+            self._erro(cliente, mensagem, 'Apenas a recepção assina salas')
+            return
+        try:
+            salas = assinaturas.normalizar_salas(mensagem.get('salas'), self.areas)
+        except ValueError as e:
+            self._erro(cliente, mensagem, str(e))
+            return
+        with self._lock:
+            cliente.salas = salas
+            self.assinaturas[cliente.servidor_id].assinar(cliente.id, salas)
+        self._responder(cliente, mensagem, {'type': 'subscribed',
+                                            'salas': sorted(salas) if salas is not None else None})
+        self._enviar_fila(cliente, salas)
+
+    def _login_medico(self, cliente, mensagem):
+        sala = str(mensagem.get('sala') or '').strip()
+        if not sala:
+            self._responder(cliente, mensagem, {'type': 'login_response', 'success': False,
+                                                'message': 'Informe a sala'})
+            return
+        chave = (cliente.servidor_id, sala)
+        with self._lock:
+            dono = self.salas.get(chave)
+            ocupada = dono is not None and dono != cliente.id
+            if not ocupada:
+                anterior = cliente.sala if dono is None else None
+                if anterior is not None:
+                    self.salas.pop((cliente.servidor_id, anterior), None)
+                self.salas[chave] = cliente.id
+                cliente.sala = sala
+                cliente.nome = mensagem.get('nome') or cliente.nome
+        if ocupada:
+            self._responder(cliente, mensagem, {'type': 'login_response', 'success': False,
+                                                'message': f'Sala {sala} já está conectada'})
+            return
+        if dono is None:
+            estado = self.estado_da_unidade(cliente.servidor_id)
+            if anterior is not None:
+                estado.desconectar_sala(anterior)
+            estado.conectar_sala(sala)
+            self._enviar_recepcoes(cliente.servidor_id, {
+                'type': 'medico_connected', 'medico': {'sala': sala, 'nome': cliente.nome or 'N/A'}})
+            self._enviar_recepcoes(cliente.servidor_id, self._mensagem_salas(cliente.servidor_id))
+        self._responder(cliente, mensagem, {'type': 'login_response', 'success': True, 'sala': sala,
+                                            'message': f'Login realizado com sucesso na sala {sala}'})
+
+    def _chamar_paciente(self, cliente, mensagem):
+        if cliente.tipo != 'medico' or cliente.sala is None:
+            self._erro(cliente, mensagem, 'Médico não está logado em nenhuma sala')
+            return
+        paciente = str(mensagem.get('paciente') or '').strip()
+        if not paciente:
+            self._erro(cliente, mensagem, 'Nome do paciente não pode estar vazio')
+            return
+        dados = {
+            'paciente': paciente,
+            'sala': cliente.sala,
+            'cor': mensagem.get('cor') or 'cinza',
+            'classificacao': mensagem.get('classificacao', ''),
+            'trace_id': mensagem.get('trace_id'),
+            'enviado_em': mensagem.get('enviado_em'),
+        }
+        nome = cliente.nome or f'Sala {cliente.sala}'
+
+        def chamar():
+            chamada = self.publicar_chamada(cliente.servidor_id, nome, nome, dados)
+            return {'type': 'chamada_confirmada', 'paciente': paciente, 'id': chamada['id']}
+
+        chave = mensagem.get('idempotency_key')
+        if idempotencia.chave_valida(chave):
+            # Reenvio do mesmo clique: repete a confirmação sem gravar nem anunciar
+            confirmacao, _ = self.chamadas_idempotentes.executar(
+                (cliente.servidor_id, cliente.sala, chave), chamar)
+        else:
+            confirmacao = chamar()
+        self._responder(cliente, mensagem, confirmacao)
+
+    def _atender_chamada(self, cliente, mensagem, tipo):
+        servidor_id = cliente.servidor_id
+        fila = self.fila(servidor_id)
+        if tipo == 'confirmar_atendimento':
+            sala = str(mensagem.get('sala'))
+            chamada = next((c for c in reversed(fila) if str(c['sala']) == sala), None)
+        else:
+            try:
+                chamada_id = int(mensagem.get('call_id'))
+            except (TypeError, ValueError):
+                self._erro(cliente, mensagem, 'ID da chamada inválido')
+                return
+            chamada = next((c for c in fila if c['id'] == chamada_id), None)
+        if chamada is None:
+            self._erro(cliente, mensagem, 'Chamada não encontrada ou já processada')
+            return
+        self._marcar_atendida(servidor_id, chamada['id'])
+
+        if tipo != 'remove_call':
+            # Avisa o médico Tk da sala que pode chamar o próximo
+            with self._lock:
+                medico = self.clientes.get(self.salas.get((servidor_id, str(chamada['sala']))))
+            if medico is not None:
+                self.enviar(medico, {
+                    'type': 'atendimento_confirmado', 'call_id': chamada['id'],
+                    'paciente': chamada['paciente'], 'sala': chamada['sala'],
+                    'message': f'Atendimento do paciente {chamada["paciente"]} confirmado'})
+        resposta = {'remove_call': 'call_removed', 'confirm_call': 'call_confirmed'}.get(tipo, 'atendimento_confirmado')
+        self._responder(cliente, mensagem, {'type': resposta, 'call_id': chamada['id'], 'sala': chamada['sala']})
+        self._enviar_filas(servidor_id, chamada['sala'])
+
+    def contar_clientes(self):
+        contagem = {}
+        with self._lock:
+            for cliente in self.clientes.values():
+                contagem[(cliente.tipo,)] = contagem.get((cliente.tipo,), 0) + 1
+        return contagem
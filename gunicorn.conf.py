@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""
+Sistema de Chamada Hospitalar - Configuração do gunicorn (Procfile)
+Sobe o arquivador e o gateway TCP assim que o worker carrega a aplicação,
+sem esperar o primeiro acesso ao sistema web.
+"""
+
+
+def post_worker_init(worker):
+    from app import iniciar_servicos
+    iniciar_servicos()
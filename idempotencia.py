@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sistema de Chamada Hospitalar - Supressão de chamadas repetidas
+O cliente gera uma chave por clique (idempotency_key) e a repete nas novas
+tentativas. O servidor executa a chamada uma vez por chave e, enquanto a
+chave vale, responde às repetições com o resultado guardado, sem gravar nem
+anunciar de novo.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+# Tempo (s) em que uma chave continua valendo e quantidade máxima guardada
+VALIDADE_PADRAO = 300
+LIMITE_PADRAO = 10000
+# Tamanho máximo aceito para a chave enviada pelo cliente
+TAMANHO_MAXIMO_CHAVE = 64
+
+
+def chave_valida(chave):
+    return isinstance(chave, str) and 0 < len(chave) <= TAMANHO_MAXIMO_CHAVE and chave.isprintable()
+
+
+class _EmAndamento:
+    """Marca a chave cuja primeira execução ainda não terminou"""
+    __slots__ = ('pronto',)
+
+    def __init__(self):
+        self.pronto = threading.Event()
+
+
+class CacheIdempotencia:
+    def __init__(self, validade=VALIDADE_PADRAO, limite=LIMITE_PADRAO):
+        self.validade = validade
+        self.limite = limite
+        self.repetidas = 0
+        self._entradas = OrderedDict()  # {chave: (expira_em, resultado ou _EmAndamento)}
+        self._lock = threading.Lock()
+
+    def _expirar(self, agora):
+        while self._entradas:
+            chave, (expira_em, _) = next(iter(self._entradas.items()))
+            if expira_em > agora and len(self._entradas) <= self.limite:
+                break
+            self._entradas.popitem(last=False)
+
+    def executar(self, chave, funcao):
+        """Executa funcao() uma vez por chave; retorna (resultado, repetida).
+
+        Uma repetição que chega durante a primeira execução espera por ela.
+        Se a função falhar, a chave é liberada para a próxima tentativa.
+        """
+        while True:
+            agora = time.monotonic()
+            with self._lock:
+                self._expirar(agora)
+                entrada = self._entradas.get(chave)
+                if entrada is None:
+                    andamento = _EmAndamento()
+                    self._entradas[chave] = (agora + self.validade, andamento)
+                    break
+                resultado = entrada[1]
+                if not isinstance(resultado, _EmAndamento):
+                    self.repetidas += 1
+                    return resultado, True
+            resultado.pronto.wait(self.validade)
+
+        try:
+            resultado = funcao()
+        except BaseException:
+            with self._lock:
+                self._entradas.pop(chave, None)
+            andamento.pronto.set()
+            raise
+        with self._lock:
+            if chave in self._entradas:
+                self._entradas[chave] = (time.monotonic() + self.validade, resultado)
+        andamento.pronto.set()
+        return resultado, False
+
+    def __len__(self):
+        return len(self._entradas)
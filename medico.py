@@ -8,10 +8,14 @@ Interface para médicos nas salas de atendimento
 import tkinter as tk
 from tkinter import ttk, messagebox
 import socket
-import json
 import threading
 from datetime import datetime
 import time
+import uuid
+
+import protocolo
+import rastreio
+from pedidos import ErroServidor, Pedidos
 
 
 def get_local_ip():
@@ -39,6 +43,10 @@ class MedicoClient:
         self.pode_chamar = True
         self.receive_thread = None
         self.running = True
+        self.codec = protocolo.JSON  # trocado pelo codec negociado no register
+        # Pedidos em voo, casados com as respostas pelo request_id
+        self.pedidos = Pedidos(self.send_message,
+                               agendar=lambda segundos, funcao: self.root.after(int(segundos * 1000), funcao))
 
         # Variáveis da interface
         self.server_ip = tk.StringVar(value=get_local_ip())  # Usa IP local por padrão
@@ -155,29 +163,29 @@ class MedicoClient:
             self.socket.settimeout(None)  # Remove timeout após conectar
 
             self.add_info("Conexão TCP estabelecida. Registrando cliente...")
+            self.connected = True
+            self.codec = protocolo.JSON
 
-            # Registra como cliente médico
-            self.send_message({
-                'type': 'register',
-                'client_type': 'medico'
-            })
+            # Inicia thread para receber mensagens antes do primeiro pedido
+            self.receive_thread = threading.Thread(target=self.receive_messages)
+            self.receive_thread.daemon = True
+            self.receive_thread.start()
 
-            # Aguarda um pouco para o servidor processar o registro
-            time.sleep(0.1)
+            # Registra como cliente médico; com sala e nome já preenchidos o
+            # login segue junto, sem esperar a resposta do registro
+            self.pedidos.enviar({
+                'type': 'register',
+                'client_type': 'medico',
+                'codificacoes': list(protocolo.CODECS)
+            }).add_done_callback(self.na_interface(self.registro_respondido))
+            if self.sala_var.get().strip() and self.nome_var.get().strip():
+                self.fazer_login()
 
-            self.connected = True
             self.status_var.set("Conectado")
             self.status_label.configure(foreground="green")
             self.connect_btn.configure(text="Desconectar")
             self.login_btn.configure(state='normal')
 
-            # Inicia thread para receber mensagens
-            self.receive_thread = threading.Thread(target=self.receive_messages)
-            self.receive_thread.daemon = True
-            self.receive_thread.start()
-
-            self.add_info(f"Conectado ao servidor {ip}:{port} como cliente médico")
-
         except socket.timeout:
             messagebox.showerror("Erro de Conexão", "Timeout na conexão com o servidor")
             self.add_info("Erro: Timeout na conexão")
@@ -193,6 +201,7 @@ class MedicoClient:
         self.add_info("Desconectando do servidor...")
 
         self.connected = False
+        self.pedidos.cancelar_todos()
 
         if self.socket:
             try:
@@ -236,11 +245,47 @@ class MedicoClient:
                 'timestamp': time.time()
             }
             self.add_info(f"Enviando mensagem de login: {login_msg}")
-            self.send_message(login_msg)
+            self.pedidos.enviar(login_msg).add_done_callback(self.na_interface(self.login_respondido))
 
         except ValueError as e:
             messagebox.showerror("Erro", str(e))
 
+    def na_interface(self, funcao):
+        """Callback de Future que roda `funcao(futuro)` na thread do Tk"""
+        def agendar(futuro):
+            if self.running:
+                self.root.after(0, funcao, futuro)
+        return agendar
+
+    def registro_respondido(self, futuro):
+        try:
+            resposta = futuro.result()
+        except Exception as e:
+            self.add_info(f"Erro no registro: {e}")
+            if self.connected:
+                self.disconnect()
+            return
+        # A partir daqui o servidor espera o formato negociado
+        self.codec = protocolo.CODECS.get(resposta.get('codificacao'), protocolo.JSON)
+        self.add_info(f"Conectado ao servidor como cliente médico (codificação {self.codec.nome})")
+
+    def login_respondido(self, futuro):
+        try:
+            resposta = futuro.result()
+        except Exception as e:
+            if self.connected:
+                self.add_info(f"Erro no login: {e}")
+                messagebox.showerror("Erro", str(e))
+            return
+        if not resposta.get('success'):
+            error_msg = resposta.get('message', 'Erro desconhecido')
+            self.add_info(f"Erro no login: {error_msg}")
+            messagebox.showerror("Erro", error_msg)
+            return
+        self.sala = resposta.get('sala')
+        self.add_info(f"Login realizado com sucesso na sala {self.sala}")
+        self.chamar_btn.configure(state='normal')
+
     def chamar_paciente(self):
         """Chama próximo paciente"""
         if not self.connected:
@@ -261,11 +306,30 @@ class MedicoClient:
             'sala': self.sala,
             'paciente': paciente,
             'cor': self.cor_var.get(),
-            'timestamp': time.time()
+            'timestamp': time.time(),
+            # Rastreio: o servidor mede do clique até a exibição na recepção
+            'trace_id': rastreio.novo_trace_id(),
+            'enviado_em': time.time(),
+            # Repetida em qualquer reenvio deste clique: o servidor chama uma vez só
+            'idempotency_key': uuid.uuid4().hex
         }
-        self.send_message(chamada_msg)
+        self.pedidos.enviar(chamada_msg).add_done_callback(self.na_interface(self.chamada_respondida))
         self.add_info(f"Chamando paciente: {paciente}")
 
+    def chamada_respondida(self, futuro):
+        self.chamar_btn.configure(state='normal', text="Chamar Paciente")
+        try:
+            resposta = futuro.result()
+        except ErroServidor as e:
+            self.add_info(f"Erro: {e}")
+            messagebox.showerror("Erro", str(e))
+            return
+        except Exception as e:
+            self.add_info(f"Chamada não confirmada: {e}")
+            return
+        self.add_info(f"Chamada de {resposta.get('paciente')} confirmada pelo servidor")
+        self.paciente_var.set("")  # Limpa o campo do paciente
+
     def send_message(self, message):
         """Envia mensagem para o servidor"""
         if not self.socket or not self.connected:
@@ -273,9 +337,9 @@ class MedicoClient:
             return False
 
         try:
-            data = json.dumps(message, ensure_ascii=False).encode('utf-8')
+            data = self.codec.codificar(message)
             self.add_info(f"Enviando: {message}")
-            self.socket.send(data + b'\n')  # Adiciona quebra de linha
+            self.socket.sendall(data)
             return True
         except Exception as e:
             self.add_info(f"Erro ao enviar mensagem: {e}")
@@ -284,27 +348,31 @@ class MedicoClient:
 
     def receive_messages(self):
         """Recebe mensagens do servidor"""
-        buffer = b''
+        leitor = protocolo.LeitorMensagens(protocolo.TAMANHO_MAXIMO_RESPOSTA)
 
         while self.connected and self.running:
             try:
                 # Recebe dados
-                data = self.socket.recv(1024)
+                data = self.socket.recv(4096)
                 if not data:
                     self.add_info("Servidor fechou a conexão")
                     break
 
-                buffer += data
-                self.add_info(f"Dados recebidos: {data.decode('utf-8', errors='ignore')}")  # Log para debug
+                leitor.alimentar(data)
+                self.add_info(f"Dados recebidos: {len(data)} bytes")  # Log para debug
 
                 # Processa mensagens completas
-                while b'\n' in buffer:
-                    message, buffer = buffer.split(b'\n', 1)
+                while True:
                     try:
-                        msg = json.loads(message.decode('utf-8'))
+                        msg = leitor.proxima()
+                    except ValueError as e:
+                        self.add_info(f"Erro ao decodificar mensagem: {e}")
+                        continue
+                    if msg is None:
+                        break
+                    # Respostas vão para o Future do pedido; o resto é aviso do servidor
+                    if not self.pedidos.resolver(msg):
                         self.root.after(0, lambda m=msg: self.process_message(m))
-                    except json.JSONDecodeError:
-                        self.add_info(f"Erro ao decodificar mensagem: {message}")
 
             except socket.timeout:
                 continue
@@ -317,37 +385,27 @@ class MedicoClient:
             self.root.after(0, self.disconnect)
 
     def process_message(self, message):
-        """Processa mensagens recebidas do servidor"""
+        """Processa avisos do servidor (mensagens que não respondem a um pedido)"""
         try:
             msg_type = message.get('type')
-            
-            if msg_type == 'login_success':
-                self.sala = message.get('sala')
-                self.add_info(f"Login realizado com sucesso na sala {self.sala}")
-                self.chamar_btn.configure(state='normal')
-                
-            elif msg_type == 'login_error':
-                error_msg = message.get('message', 'Erro desconhecido')
-                self.add_info(f"Erro no login: {error_msg}")
-                messagebox.showerror("Erro", error_msg)
-                
-            elif msg_type == 'call_confirmed':
-                self.add_info("Chamada confirmada pela recepção")
-                self.chamar_btn.configure(state='normal', text="Chamar Paciente")
-                self.paciente_var.set("")  # Limpa o campo do paciente
-                
+
+            if msg_type == 'atendimento_confirmado':
+                self.add_info(message.get('message') or "Atendimento confirmado pela recepção")
+
             elif msg_type == 'error':
                 error_msg = message.get('message', 'Erro desconhecido')
                 self.add_info(f"Erro: {error_msg}")
                 messagebox.showerror("Erro", error_msg)
-                self.chamar_btn.configure(state='normal', text="Chamar Paciente")
-                
+
         except Exception as e:
             self.add_info(f"Erro ao processar mensagem: {e}")
-            self.chamar_btn.configure(state='normal', text="Chamar Paciente")
 
     def add_info(self, text):
-        """Adiciona informação ao log"""
+        """Adiciona informação ao log (de outra thread, é repassada à thread do Tk)"""
+        if threading.current_thread() is not threading.main_thread():
+            if self.running:
+                self.root.after(0, self.add_info, text)
+            return
         timestamp = datetime.now().strftime('%H:%M:%S')
         self.info_text.configure(state='normal')
         self.info_text.insert(tk.END, f"[{timestamp}] {text}\n")
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sistema de Chamada Hospitalar - Métricas de operação
+Contadores, medidores e histogramas de latência exportados no formato texto
+do Prometheus. Cada thread grava na sua própria cópia dos números, sem lock;
+as cópias só são somadas quando alguém lê as métricas.
+"""
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Histograma no estilo HDR: valores em microssegundos, 16 faixas por potência
+# de 2 (erro máximo de ~6%), de 1 µs até ~2^40 µs (12 dias)
+SUBFAIXAS = 16
+_BITS_SUBFAIXA = SUBFAIXAS.bit_length() - 1
+MAIOR_EXPOENTE = 36
+TOTAL_FAIXAS = (MAIOR_EXPOENTE + 2) * SUBFAIXAS
+
+# Limites `le` (segundos) publicados para o Prometheus
+LIMITES_EXPOSICAO = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                     0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def faixa_do_valor(microssegundos):
+    if microssegundos < SUBFAIXAS:
+        return max(0, microssegundos)
+    expoente = microssegundos.bit_length() - 1 - _BITS_SUBFAIXA
+    if expoente > MAIOR_EXPOENTE:
+        return TOTAL_FAIXAS - 1
+    return (expoente + 1) * SUBFAIXAS + (microssegundos >> expoente) - SUBFAIXAS
+
+
+def limites_da_faixa(faixa):
+    """(início, fim) da faixa em microssegundos, fim exclusivo"""
+    if faixa < SUBFAIXAS:
+        return faixa, faixa + 1
+    expoente = faixa // SUBFAIXAS - 1
+    mantissa = faixa % SUBFAIXAS + SUBFAIXAS
+    return mantissa << expoente, (mantissa + 1) << expoente
+
+
+class _PorThread:
+    """Uma cópia do valor por thread; cópias de threads encerradas são somadas a uma base"""
+
+    def __init__(self, criar, somar):
+        self._criar = criar
+        self._somar = somar
+        self._local = threading.local()
+        self._copias = []  # [(thread, valor)]
+        self._base = criar()
+        self._lock = threading.Lock()  # só na criação de cópias e na leitura
+
+    def minha(self):
+        try:
+            return self._local.valor
+        except AttributeError:
+            valor = self._local.valor = self._criar()
+            with self._lock:
+                self._copias.append((threading.current_thread(), valor))
+            return valor
+
+    def valores(self):
+        with self._lock:
+            vivas = []
+            for thread, valor in self._copias:
+                if thread.is_alive():
+                    vivas.append((thread, valor))
+                else:
+                    self._somar(self._base, valor)
+            self._copias = vivas
+            return [self._base] + [valor for _, valor in vivas]
+
+
+def _somar_listas(destino, origem):
+    for i, valor in enumerate(origem):
+        destino[i] += valor
+
+
+class Contador:
+    def __init__(self):
+        self._valores = _PorThread(lambda: [0.0], _somar_listas)
+
+    def inc(self, valor=1):
+        self._valores.minha()[0] += valor
+
+    def valor(self):
+        return sum(v[0] for v in self._valores.valores())
+
+
+class Medidor:
+    """Valor que sobe e desce (conexões abertas, tamanho de fila)"""
+
+    def __init__(self):
+        self._valores = _PorThread(lambda: [0.0], _somar_listas)
+
+    def inc(self, valor=1):
+        self._valores.minha()[0] += valor
+
+    def dec(self, valor=1):
+        self._valores.minha()[0] -= valor
+
+    def valor(self):
+        return sum(v[0] for v in self._valores.valores())
+
+
+class Histograma:
+    """Distribuição de durações em segundos"""
+
+    def __init__(self):
+        # [faixa 0, ..., faixa N-1, soma em segundos]
+        self._valores = _PorThread(lambda: [0] * TOTAL_FAIXAS + [0.0], _somar_listas)
+
+    def observar(self, segundos):
+        faixas = self._valores.minha()
+        faixas[faixa_do_valor(int(segundos * 1e6))] += 1
+        faixas[-1] += segundos
+
+    @contextmanager
+    def medir(self):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio)
+
+    def cronometrar(self, funcao):
+        """Decorador que observa a duração de cada chamada da função"""
+        @functools.wraps(funcao)
+        def cronometrada(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                self.observar(time.perf_counter() - inicio)
+        return cronometrada
+
+    def instantaneo(self):
+        """Faixas somadas de todas as threads: (contagens, soma)"""
+        total = [0] * TOTAL_FAIXAS + [0.0]
+        for valores in self._valores.valores():
+            _somar_listas(total, valores)
+        return total[:-1], total[-1]
+
+    def percentis(self, percentis=(50, 90, 95, 99, 99.9)):
+        """{percentil: segundos}, usando o meio da faixa; vazio se não houve observações"""
+        contagens, _ = self.instantaneo()
+        total = sum(contagens)
+        if not total:
+            return {}
+        resultado = {}
+        pendentes = sorted(percentis)
+        acumulado = 0
+        for faixa, quantidade in enumerate(contagens):
+            acumulado += quantidade
+            while pendentes and acumulado >= total * pendentes[0] / 100:
+                inicio, fim = limites_da_faixa(faixa)
+                resultado[pendentes.pop(0)] = (inicio + fim) / 2 / 1e6
+            if not pendentes:
+                break
+        return resultado
+
+
+class Familia:
+    """Métrica com rótulos: uma série por combinação de valores"""
+
+    def __init__(self, tipo, nome, ajuda, rotulos, classe):
+        self.tipo = tipo
+        self.nome = nome
+        self.ajuda = ajuda
+        self.nomes_rotulos = tuple(rotulos)
+        self._classe = classe
+        self._series = {}
+        self._lock = threading.Lock()
+        if not self.nomes_rotulos:
+            self._sem_rotulos = self.rotulos()
+
+    def rotulos(self, *valores, **por_nome):
+        if por_nome:
+            valores = tuple(por_nome[nome] for nome in self.nomes_rotulos)
+        chave = tuple(str(v) for v in valores)
+        serie = self._series.get(chave)
+        if serie is None:
+            with self._lock:
+                serie = self._series.setdefault(chave, self._classe())
+        return serie
+
+    def series(self):
+        with self._lock:
+            return list(self._series.items())
+
+    # Atalhos para métricas sem rótulos
+    def inc(self, valor=1):
+        self._sem_rotulos.inc(valor)
+
+    def dec(self, valor=1):
+        self._sem_rotulos.dec(valor)
+
+    def observar(self, segundos):
+        self._sem_rotulos.observar(segundos)
+
+    def medir(self):
+        return self._sem_rotulos.medir()
+
+    def cronometrar(self, funcao):
+        return self._sem_rotulos.cronometrar(funcao)
+
+    def percentis(self, *args):
+        return self._sem_rotulos.percentis(*args)
+
+
+def _formatar_rotulos(nomes, valores, extra=None):
+    pares = list(zip(nomes, valores))
+    if extra:
+        pares.append(extra)
+    if not pares:
+        return ''
+    texto = ','.join(
+        '{}="{}"'.format(nome, str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for nome, valor in pares
+    )
+    return '{' + texto + '}'
+
+
+def _numero(valor):
+    if valor == int(valor):
+        return str(int(valor))
+    return repr(float(valor))
+
+
+class Registro:
+    """Conjunto de métricas de um processo"""
+
+    def __init__(self, prefixo='chamada_hospitalar'):
+        self.prefixo = prefixo
+        self._familias = {}
+        self._coletores = []  # [(tipo, nome, ajuda, rotulos, funcao)]
+        self._lock = threading.Lock()
+
+    def _familia(self, tipo, nome, ajuda, rotulos, classe):
+        nome = f'{self.prefixo}_{nome}'
+        with self._lock:
+            familia = self._familias.get(nome)
+            if familia is None:
+                familia = self._familias[nome] = Familia(tipo, nome, ajuda, rotulos, classe)
+            return familia
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._familia('counter', nome, ajuda, rotulos, Contador)
+
+    def medidor(self, nome, ajuda, rotulos=()):
+        return self._familia('gauge', nome, ajuda, rotulos, Medidor)
+
+    def histograma(self, nome, ajuda, rotulos=()):
+        return self._familia('histogram', nome, ajuda, rotulos, Histograma)
+
+    def coletar(self, nome, ajuda, rotulos, funcao, tipo='gauge'):
+        """Métrica lida só na exportação: funcao() -> {(valores dos rótulos): valor}"""
+        with self._lock:
+            self._coletores.append((tipo, f'{self.prefixo}_{nome}', ajuda, tuple(rotulos), funcao))
+
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)"""
+        linhas = []
+        with self._lock:
+            familias = sorted(self._familias.values(), key=lambda f: f.nome)
+            coletores = list(self._coletores)
+
+        for familia in familias:
+            linhas.append(f'# HELP {familia.nome} {familia.ajuda}')
+            linhas.append(f'# TYPE {familia.nome} {familia.tipo}')
+            for valores, serie in familia.series():
+                if familia.tipo != 'histogram':
+                    linhas.append(f'{familia.nome}{_formatar_rotulos(familia.nomes_rotulos, valores)} '
+                                  f'{_numero(serie.valor())}')
+                    continue
+                contagens, soma = serie.instantaneo()
+                acumulado, faixa = 0, 0
+                for limite in LIMITES_EXPOSICAO:
+                    # Faixas inteiramente abaixo do limite
+                    while faixa < TOTAL_FAIXAS and limites_da_faixa(faixa)[1] <= limite * 1e6:
+                        acumulado += contagens[faixa]
+                        faixa += 1
+                    rotulos = _formatar_rotulos(familia.nomes_rotulos, valores, ('le', repr(limite)))
+                    linhas.append(f'{familia.nome}_bucket{rotulos} {acumulado}')
+                total = sum(contagens)
+                rotulos = _formatar_rotulos(familia.nomes_rotulos, valores, ('le', '+Inf'))
+                linhas.append(f'{familia.nome}_bucket{rotulos} {total}')
+                rotulos = _formatar_rotulos(familia.nomes_rotulos, valores)
+                linhas.append(f'{familia.nome}_sum{rotulos} {_numero(soma)}')
+                linhas.append(f'{familia.nome}_count{rotulos} {total}')
+
+        for tipo, nome, ajuda, nomes_rotulos, funcao in coletores:
+            linhas.append(f'# HELP {nome} {ajuda}')
+            linhas.append(f'# TYPE {nome} {tipo}')
+            try:
+                valores = funcao()
+            except Exception as e:
+                print(f"Erro ao coletar a métrica {nome}: {e}")
+                continue
+            for rotulos, valor in valores.items():
+                linhas.append(f'{nome}{_formatar_rotulos(nomes_rotulos, rotulos)} {_numero(valor)}')
+
+        return '\n'.join(linhas) + '\n'
+
+
+TIPO_CONTEUDO = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def instrumentar_engine(engine, histograma):
+    """Mede cada comando SQL do engine, com o rótulo `operacao` (SELECT, INSERT...)"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('inicio_consultas', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _depois(conn, cursor, statement, parameters, context, executemany):
+        inicio = conn.info['inicio_consultas'].pop()
+        operacao = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OUTRA'
+        histograma.rotulos(operacao).observar(time.perf_counter() - inicio)
+
+    @event.listens_for(engine, 'handle_error')
+    def _erro(contexto):
+        pilha = contexto.connection.info.get('inicio_consultas') if contexto.connection is not None else None
+        if pilha:
+            pilha.pop()
+
+
+def servir_http(registro, porta, host='127.0.0.1', rotas=None, token=None):
+    """Publica /metrics numa thread própria (para processos sem servidor web).
+
+    Com `token`, /metrics exige 'Authorization: Bearer <token>', como no app.py.
+    `rotas` acrescenta caminhos: {caminho: funcao(metodo, parametros, cabecalhos)},
+    que retorna (status, tipo do conteúdo, corpo em bytes).
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlsplit
+
+    def exportar(metodo, parametros, cabecalhos):
+        if token and cabecalhos.get('Authorization') != f'Bearer {token}':
+            return 401, 'text/plain', b''
+        return 200, TIPO_CONTEUDO, registro.exportar().encode('utf-8')
+
+    todas = {'/metrics': exportar}
+    todas.update(rotas or {})
+
+    class Handler(BaseHTTPRequestHandler):
+        def _responder(self, metodo):
+            partes = urlsplit(self.path)
+            rota = todas.get(partes.path)
+            if rota is None or (metodo == 'POST' and partes.path == '/metrics'):
+                self.send_error(404)
+                return
+            parametros = {nome: valores[-1] for nome, valores in parse_qs(partes.query).items()}
+            status, tipo, corpo = rota(metodo, parametros, self.headers)
+            self.send_response(status)
+            self.send_header('Content-Type', tipo)
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def do_GET(self):
+            self._responder('GET')
+
+        def do_POST(self):
+            self._responder('POST')
+
+        def log_message(self, formato, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((host, porta), Handler)
+    threading.Thread(target=servidor.serve_forever, name='metricas', daemon=True).start()
+    return servidor
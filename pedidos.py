@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sistema de Chamada Hospitalar - Pedidos com resposta (clientes Tk)
+Cada pedido ao servidor central leva um request_id, que o servidor devolve
+na resposta. O cliente recebe um Future por pedido, pode ter vários em voo
+ao mesmo tempo e não depende do tipo da mensagem de resposta. Sem resposta
+no prazo, pedidos idempotentes são reenviados com o mesmo request_id (e a
+mesma chave de idempotência) e, esgotadas as tentativas, falham com
+TimeoutError; os demais (confirm_call, remove_call...) falham no primeiro
+prazo, porque um reenvio repetiria uma ação que pode já ter sido feita.
+"""
+
+import itertools
+import threading
+from concurrent.futures import Future
+
+# Prazo (s) para cada tentativa e número de tentativas por pedido
+TIMEOUT_PADRAO = 5.0
+TENTATIVAS_PADRAO = 3
+# Pedidos que podem ser reenviados sem efeito duplicado; chamar_paciente só com idempotency_key
+IDEMPOTENTES = {'register', 'login_medico', 'subscribe', 'get_fila', 'get_queue', 'get_salas', 'get_rooms'}
+
+
+class ErroServidor(Exception):
+    """O servidor respondeu ao pedido com uma mensagem de erro"""
+
+
+def idempotente(mensagem):
+    tipo = mensagem.get('type')
+    return tipo in IDEMPOTENTES or (tipo == 'chamar_paciente' and bool(mensagem.get('idempotency_key')))
+
+
+def _agendar_em_thread(segundos, funcao):
+    timer = threading.Timer(segundos, funcao)
+    timer.daemon = True
+    timer.start()
+
+
+class _Pendente:
+    __slots__ = ('mensagem', 'futuro', 'restantes', 'timeout')
+
+    def __init__(self, mensagem, futuro, restantes, timeout):
+        self.mensagem = mensagem
+        self.futuro = futuro
+        self.restantes = restantes
+        self.timeout = timeout
+
+
+class Pedidos:
+    def __init__(self, enviar, timeout=TIMEOUT_PADRAO, tentativas=TENTATIVAS_PADRAO, agendar=None):
+        """enviar(mensagem) -> bool transmite a mensagem pela conexão atual;
+        agendar(segundos, funcao) roda funcao() depois do prazo. Nos clientes Tk
+        é o root.after, para que os reenvios (e o log de send_message) fiquem
+        na thread da interface; sem ele, usa um threading.Timer."""
+        self._enviar = enviar
+        self._agendar = agendar or _agendar_em_thread
+        self.timeout = timeout
+        self.tentativas = tentativas
+        self._ids = itertools.count(1)
+        self._pendentes = {}  # {request_id: _Pendente}
+        self._lock = threading.Lock()
+
+    def enviar(self, mensagem, timeout=None, tentativas=None):
+        """Envia o pedido e retorna o Future da resposta, sem esperar por ela.
+
+        Só pedidos idempotentes têm mais de uma tentativa, a não ser que `tentativas` seja dado.
+        """
+        request_id = next(self._ids)
+        if tentativas is None:
+            tentativas = self.tentativas if idempotente(mensagem) else 1
+        pendente = _Pendente(dict(mensagem, request_id=request_id), Future(),
+                             tentativas, timeout or self.timeout)
+        with self._lock:
+            self._pendentes[request_id] = pendente
+        self._transmitir(request_id)
+        return pendente.futuro
+
+    def _transmitir(self, request_id):
+        with self._lock:
+            pendente = self._pendentes.get(request_id)
+            if pendente is None:
+                return
+            pendente.restantes -= 1
+        if not self._enviar(pendente.mensagem):
+            self._concluir(request_id, erro=ConnectionError('Não foi possível enviar o pedido'))
+            return
+        # Não é cancelado: se a resposta chegar antes, _expirou não encontra o pedido
+        self._agendar(pendente.timeout, lambda: self._expirou(request_id))
+
+    def _expirou(self, request_id):
+        with self._lock:
+            pendente = self._pendentes.get(request_id)
+            if pendente is None:
+                return
+            tentar_de_novo = pendente.restantes > 0
+        if tentar_de_novo:
+            self._transmitir(request_id)
+        else:
+            self._concluir(request_id, erro=TimeoutError(
+                f"Sem resposta do servidor para '{pendente.mensagem.get('type')}'"))
+
+    def _concluir(self, request_id, resposta=None, erro=None):
+        with self._lock:
+            pendente = self._pendentes.pop(request_id, None)
+        if pendente is None:
+            return False
+        if erro is not None:
+            pendente.futuro.set_exception(erro)
+        else:
+            pendente.futuro.set_result(resposta)
+        return True
+
+    def resolver(self, mensagem):
+        """Entrega a resposta ao pedido dela; False se não é resposta a um pedido pendente"""
+        request_id = mensagem.get('request_id')
+        if request_id is None:
+            return False
+        if mensagem.get('type') == 'error':
+            return self._concluir(request_id, erro=ErroServidor(mensagem.get('message', 'Erro desconhecido')))
+        return self._concluir(request_id, resposta=mensagem)
+
+    def cancelar_todos(self, erro=None):
+        """Falha todos os pedidos em voo (ao desconectar)"""
+        with self._lock:
+            ids = list(self._pendentes)
+        for request_id in ids:
+            self._concluir(request_id, erro=erro or ConnectionError('Desconectado do servidor'))
+
+    def __len__(self):
+        return len(self._pendentes)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sistema de Chamada Hospitalar - Perfilador por amostragem
+Ligado sob demanda no servidor em execução: uma thread lê as pilhas de todas
+as threads a cada poucos milissegundos e conta as pilhas no formato
+"collapsed" (flamegraph.pl, speedscope). Enquanto ligado também soma tempo
+de parede e de CPU de cada handler. Desligado, o custo é um teste de booleano.
+
+Com o gunicorn no worker eventlet (Procfile), as "threads" do servidor são
+greenlets que se revezam numa única thread do sistema; sys._current_frames só
+enxerga essa thread. Por isso a amostragem roda numa thread real do sistema
+(eventlet.patcher.original): cada amostra mostra a pilha do greenlet que está
+executando naquele instante, e greenlets parados no hub (esperando rede) não
+aparecem. O tempo de CPU por handler, no eventlet, inclui o de outros
+greenlets que rodaram enquanto o handler esperava.
+"""
+
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+
+# Intervalo entre amostras (s) e duração máxima de uma sessão (s)
+INTERVALO_PADRAO = 0.005
+DURACAO_MAXIMA = 300
+# Profundidade máxima de pilha registrada
+PROFUNDIDADE_MAXIMA = 64
+
+_NADA = nullcontext()
+
+
+def _threading_real():
+    """Módulo threading do sistema, mesmo depois do monkey_patch do eventlet"""
+    if 'eventlet' in sys.modules:
+        from eventlet import patcher
+        return patcher.original('threading')
+    return threading
+
+
+def _nome_do_quadro(quadro):
+    codigo = quadro.f_code
+    return f'{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})'
+
+
+class _Cronometro:
+    __slots__ = ('perfilador', 'nome', 'parede', 'cpu')
+
+    def __init__(self, perfilador, nome):
+        self.perfilador = perfilador
+        self.nome = nome
+
+    def __enter__(self):
+        self.parede = time.perf_counter()
+        self.cpu = time.thread_time()
+
+    def __exit__(self, *exc):
+        self.perfilador.registrar(self.nome, time.perf_counter() - self.parede, time.thread_time() - self.cpu)
+
+
+class Perfilador:
+    def __init__(self, intervalo=INTERVALO_PADRAO, duracao_maxima=DURACAO_MAXIMA):
+        self.intervalo = intervalo
+        self.intervalo_sessao = intervalo
+        self.duracao_maxima = duracao_maxima
+        self.ativo = False
+        self.pilhas = Counter()
+        self.amostras = 0
+        self.inicio = None
+        self.fim = None
+        self.handlers = {}  # {nome: [chamadas, parede (s), cpu (s)]}
+        # Primitivas reais: a thread de amostragem não pode depender do hub do eventlet
+        self._threading = _threading_real()
+        self._parar = self._threading.Event()
+        self._thread = None
+        self._lock = self._threading.Lock()
+
+    def iniciar(self, duracao=60, intervalo=None):
+        """Liga a amostragem por até `duracao` s; retorna False se já estava ligada"""
+        with self._lock:
+            if self.ativo:
+                return False
+            self.pilhas = Counter()
+            self.amostras = 0
+            self.handlers = {}
+            self.inicio = time.time()
+            self.fim = None
+            self._parar.clear()
+            duracao = min(max(float(duracao), 0.1), self.duracao_maxima)
+            self.intervalo_sessao = intervalo or self.intervalo
+            self._thread = self._threading.Thread(
+                target=self._amostrar, args=(duracao, self.intervalo_sessao),
+                name='perfilador', daemon=True)
+            self.ativo = True
+            self._thread.start()
+            return True
+
+    def parar(self):
+        """Desliga a amostragem e espera a última amostra"""
+        self._parar.set()
+        thread = self._thread
+        if thread is not None and thread is not self._threading.current_thread():
+            thread.join()
+
+    def _amostrar(self, duracao, intervalo):
+        proprio = self._threading.get_ident()
+        limite = time.monotonic() + duracao
+        try:
+            while not self._parar.wait(intervalo) and time.monotonic() < limite:
+                for ident, quadro in sys._current_frames().items():
+                    if ident == proprio:
+                        continue
+                    pilha = []
+                    while quadro is not None and len(pilha) < PROFUNDIDADE_MAXIMA:
+                        pilha.append(_nome_do_quadro(quadro))
+                        quadro = quadro.f_back
+                    pilha.reverse()
+                    self.pilhas[';'.join(pilha)] += 1
+                self.amostras += 1
+        finally:
+            with self._lock:
+                self.ativo = False
+                self.fim = time.time()
+
+    def cronometro(self, nome):
+        """Contexto que mede parede e CPU do bloco enquanto o perfilador está ligado"""
+        if not self.ativo:
+            return _NADA
+        return _Cronometro(self, nome)
+
+    def medir(self, nome):
+        """Decorador de handler; desligado chama a função direto"""
+        def decorador(funcao):
+            @functools.wraps(funcao)
+            def medida(*args, **kwargs):
+                if not self.ativo:
+                    return funcao(*args, **kwargs)
+                with _Cronometro(self, nome):
+                    return funcao(*args, **kwargs)
+            return medida
+        return decorador
+
+    def registrar(self, nome, parede, cpu):
+        with self._lock:
+            totais = self.handlers.setdefault(nome, [0, 0.0, 0.0])
+            totais[0] += 1
+            totais[1] += parede
+            totais[2] += cpu
+
+    def colapsado(self):
+        """Pilhas da sessão atual (ou da última) no formato 'a;b;c contagem'"""
+        pilhas = list(self.pilhas.items())
+        return ''.join(f'{pilha} {contagem}\n' for pilha, contagem in sorted(pilhas))
+
+    def resumo(self):
+        with self._lock:
+            handlers = {nome: list(totais) for nome, totais in self.handlers.items()}
+        return {
+            'ativo': self.ativo,
+            'inicio': self.inicio,
+            'fim': self.fim,
+            'amostras': self.amostras,
+            'intervalo_ms': self.intervalo_sessao * 1000,
+            'pilhas_distintas': len(self.pilhas),
+            'handlers': {
+                nome: {
+                    'chamadas': chamadas,
+                    'parede_ms': round(parede * 1000, 3),
+                    'cpu_ms': round(cpu * 1000, 3),
+                    'parede_media_ms': round(parede * 1000 / chamadas, 3),
+                    'cpu_media_ms': round(cpu * 1000 / chamadas, 3),
+                }
+                for nome, (chamadas, parede, cpu) in sorted(handlers.items())
+            },
+        }
+
+
+def executar_acao(perfilador, acao, duracao=None):
+    """'iniciar' ou 'parar' vindos da rota de administração; retorna (status HTTP, resumo)"""
+    if acao == 'iniciar':
+        try:
+            iniciado = perfilador.iniciar(duracao if duracao is not None else 60)
+        except ValueError:
+            return 400, {'erro': 'duracao inválida'}
+        return (200 if iniciado else 409), perfilador.resumo()
+    if acao == 'parar':
+        perfilador.parar()
+        return 200, perfilador.resumo()
+    return 400, {'erro': "acao deve ser 'iniciar' ou 'parar'"}
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sistema de Atendimento Hospitalar - Protocolo de Comunicação
+Codificação das mensagens trocadas entre o servidor central e os clientes Tk
+"""
+
+import json
+import struct
+
+# Byte que inicia um quadro compacto. Nunca aparece no início de uma
+# mensagem JSON (que sempre começa com '{'), então os dois formatos podem
+# conviver na mesma conexão durante a negociação.
+MARCADOR_COMPACTO = 0xC1
+
+# Campos mais frequentes nas mensagens, trocados por um identificador curto.
+# A ordem faz parte do protocolo: só acrescente itens no final da lista.
+CAMPOS = [
+    'type', 'client_type', 'sala', 'paciente', 'timestamp', 'status', 'id',
+    'queue', 'call', 'call_id', 'rooms', 'number', 'connected', 'ip',
+    'medico', 'nome', 'message', 'success', 'cor', 'classificacao',
+    'fim_atendimento', 'codificacao', 'codificacoes', 'trace_id', 'enviado_em',
+    'estagio', 'idempotency_key', 'request_id', 'salas',
+]
+
+# Valores de texto repetidos em quase todas as mensagens
+VALORES = [
+    'register', 'register_success', 'login_medico', 'login_response',
+    'chamar_paciente', 'chamada_confirmada', 'new_call', 'queue_update',
+    'rooms_update', 'get_queue', 'get_fila', 'get_rooms', 'get_salas',
+    'confirm_call', 'call_confirmed', 'remove_call', 'call_removed',
+    'atendimento_confirmado', 'medico_connected', 'error', 'medico',
+    'recepcao', 'reception', 'chamado', 'atendido', 'json', 'compacto',
+    'cinza', 'vermelho', 'laranja', 'amarelo', 'verde', 'azul', 'N/A',
+    'call_ack', 'entregue', 'anunciado', 'subscribe', 'subscribed',
+]
+
+# Campos duplicados mantidos por compatibilidade: {alias: campo canônico}.
+# No formato compacto o alias não vai para a rede e é refeito ao decodificar.
+ALIASES = {
+    'room': 'sala',
+    'patient': 'paciente',
+    'time': 'timestamp',
+}
+
+_ID_CAMPO = {nome: i for i, nome in enumerate(CAMPOS)}
+_ID_VALOR = {valor: i for i, valor in enumerate(VALORES)}
+_CANONICOS = {canonico: alias for alias, canonico in ALIASES.items()}
+
+# Tipos dos valores no formato compacto
+_NULO = 0x00
+_FALSO = 0x01
+_VERDADEIRO = 0x02
+_INTEIRO = 0x03
+_REAL = 0x04
+_TEXTO = 0x05
+_LISTA = 0x06
+_DICIONARIO = 0x07
+_VALOR_INTERNO = 0x08
+_INTEIRO_CURTO = 0x80  # 0x80..0xFF: inteiros de 0 a 127 num único byte
+
+_REAL_STRUCT = struct.Struct('>d')
+# Aninhamento máximo de listas/dicionários num quadro recebido; as mensagens
+# do sistema não passam de 4 níveis, e sem limite um quadro pequeno esgota a pilha
+PROFUNDIDADE_MAXIMA = 32
+
+# Maior quadro (ou linha JSON) aceito de um cliente pelos servidores; acima
+# disso a conexão é derrubada, para que um par não esgote a memória
+TAMANHO_MAXIMO_QUADRO = 1 << 20
+# Os clientes Tk aceitam mais: a fila inteira vem do servidor num quadro só
+TAMANHO_MAXIMO_RESPOSTA = 64 << 20
+
+
+class ErroProtocolo(ValueError):
+    """Quadro recebido em formato inválido"""
+
+
+class QuadroMuitoGrande(ConnectionError):
+    """Quadro maior que o limite do leitor: a conexão deve ser encerrada"""
+
+
+def _escrever_varint(saida, valor):
+    while valor >= 0x80:
+        saida.append((valor & 0x7F) | 0x80)
+        valor >>= 7
+    saida.append(valor)
+
+
+def _ler_varint(dados, pos):
+    resultado = 0
+    deslocamento = 0
+    while True:
+        if pos >= len(dados):
+            raise IndexError('varint incompleto')
+        byte = dados[pos]
+        pos += 1
+        resultado |= (byte & 0x7F) << deslocamento
+        if byte < 0x80:
+            return resultado, pos
+        deslocamento += 7
+
+
+def _escrever_texto(saida, texto):
+    dados = texto.encode('utf-8')
+    _escrever_varint(saida, len(dados))
+    saida += dados
+
+
+def _codificar_valor(saida, valor, prontos=None):
+    if valor is None:
+        saida.append(_NULO)
+    elif valor is True:
+        saida.append(_VERDADEIRO)
+    elif valor is False:
+        saida.append(_FALSO)
+    elif isinstance(valor, int):
+        if 0 <= valor < 0x80:
+            saida.append(_INTEIRO_CURTO | valor)
+        else:
+            saida.append(_INTEIRO)
+            # zigzag para representar negativos em poucos bytes
+            _escrever_varint(saida, (valor << 1) if valor >= 0 else ((-valor << 1) - 1))
+    elif isinstance(valor, float):
+        saida.append(_REAL)
+        saida += _REAL_STRUCT.pack(valor)
+    elif isinstance(valor, str):
+        indice = _ID_VALOR.get(valor)
+        if indice is not None:
+            saida.append(_VALOR_INTERNO)
+            saida.append(indice)
+        else:
+            saida.append(_TEXTO)
+            _escrever_texto(saida, valor)
+    elif isinstance(valor, dict):
+        itens = [
+            (chave, item) for chave, item in valor.items()
+            if not (chave in ALIASES and ALIASES[chave] in valor
+                    and valor[ALIASES[chave]] == item)
+        ]
+        prontos = prontos or {}
+        saida.append(_DICIONARIO)
+        _escrever_varint(saida, len(itens) + len(prontos))
+        for chave, item in itens + list(prontos.items()):
+            indice = _ID_CAMPO.get(chave)
+            if indice is not None:
+                # chave par: campo interno; chave ímpar: texto com o tamanho embutido
+                _escrever_varint(saida, indice << 1)
+            else:
+                dados = str(chave).encode('utf-8')
+                _escrever_varint(saida, (len(dados) << 1) | 1)
+                saida += dados
+            if chave in prontos:
+                saida += item  # Já codificado por codificar_valor
+            else:
+                _codificar_valor(saida, item)
+    elif isinstance(valor, (list, tuple)):
+        saida.append(_LISTA)
+        _escrever_varint(saida, len(valor))
+        for item in valor:
+            _codificar_valor(saida, item)
+    else:
+        raise TypeError(f"Tipo não suportado no protocolo compacto: {type(valor).__name__}")
+
+
+def _decodificar_valor(dados, pos, profundidade=0):
+    tipo = dados[pos]
+    pos += 1
+    if tipo >= _INTEIRO_CURTO:
+        return tipo & 0x7F, pos
+    if tipo == _VALOR_INTERNO:
+        return VALORES[dados[pos]], pos + 1
+    if tipo == _TEXTO:
+        tamanho, pos = _ler_varint(dados, pos)
+        return bytes(dados[pos:pos + tamanho]).decode('utf-8'), pos + tamanho
+    if tipo in (_DICIONARIO, _LISTA) and profundidade >= PROFUNDIDADE_MAXIMA:
+        raise ErroProtocolo(f"Quadro compacto com mais de {PROFUNDIDADE_MAXIMA} níveis")
+    if tipo == _DICIONARIO:
+        quantidade, pos = _ler_varint(dados, pos)
+        resultado = {}
+        for _ in range(quantidade):
+            chave, pos = _ler_varint(dados, pos)
+            if chave & 1:
+                tamanho = chave >> 1
+                nome = bytes(dados[pos:pos + tamanho]).decode('utf-8')
+                pos += tamanho
+            else:
+                nome = CAMPOS[chave >> 1]
+            resultado[nome], pos = _decodificar_valor(dados, pos, profundidade + 1)
+        for canonico, alias in _CANONICOS.items():
+            if canonico in resultado and alias not in resultado:
+                resultado[alias] = resultado[canonico]
+        return resultado, pos
+    if tipo == _LISTA:
+        quantidade, pos = _ler_varint(dados, pos)
+        resultado = []
+        for _ in range(quantidade):
+            item, pos = _decodificar_valor(dados, pos, profundidade + 1)
+            resultado.append(item)
+        return resultado, pos
+    if tipo == _INTEIRO:
+        bruto, pos = _ler_varint(dados, pos)
+        return (bruto >> 1) if not bruto & 1 else -((bruto + 1) >> 1), pos
+    if tipo == _REAL:
+        if pos + _REAL_STRUCT.size > len(dados):
+            raise ErroProtocolo("Quadro compacto com número real incompleto")
+        return _REAL_STRUCT.unpack_from(dados, pos)[0], pos + 8
+    if tipo == _NULO:
+        return None, pos
+    if tipo == _VERDADEIRO:
+        return True, pos
+    if tipo == _FALSO:
+        return False, pos
+    raise ErroProtocolo(f"Tipo desconhecido no quadro compacto: {tipo:#x}")
+
+
+class CodecJSON:
+    """Formato original: uma mensagem JSON por linha"""
+    nome = 'json'
+
+    def codificar(self, mensagem, prontos=None):
+        """prontos: {campo: valor já passado por codificar_valor}, acrescentados à mensagem"""
+        dados = json.dumps(mensagem, ensure_ascii=False).encode('utf-8')
+        if prontos:
+            partes = [dados[:-1]]
+            for campo, valor in prontos.items():
+                if len(partes) > 1 or mensagem:
+                    partes.append(b', ')
+                partes.append(json.dumps(campo, ensure_ascii=False).encode('utf-8') + b': ' + valor)
+            partes.append(b'}')
+            dados = b''.join(partes)
+        return dados + b'\n'
+
+    def codificar_valor(self, valor):
+        """Valor codificado uma vez para ir em várias mensagens (ver `prontos`)"""
+        return json.dumps(valor, ensure_ascii=False).encode('utf-8')
+
+    def decodificar(self, dados):
+        try:
+            return json.loads(bytes(dados).decode('utf-8'))
+        except RecursionError as e:
+            raise ErroProtocolo("Linha JSON aninhada demais") from e
+
+
+class CodecCompacto:
+    """Formato binário: marcador, tamanho (varint) e valores com campos internados"""
+    nome = 'compacto'
+
+    def codificar(self, mensagem, prontos=None):
+        """prontos: {campo: valor já passado por codificar_valor}, acrescentados à mensagem"""
+        corpo = bytearray()
+        _codificar_valor(corpo, mensagem, prontos)
+        quadro = bytearray([MARCADOR_COMPACTO])
+        _escrever_varint(quadro, len(corpo))
+        quadro += corpo
+        return bytes(quadro)
+
+    def decodificar(self, dados):
+        try:
+            valor, pos = _decodificar_valor(dados, 0)
+        except (IndexError, UnicodeDecodeError) as e:
+            raise ErroProtocolo(f"Quadro compacto inválido: {e}") from e
+        if pos != len(dados):
+            raise ErroProtocolo("Quadro compacto com bytes sobrando")
+        return valor
+
+    def codificar_valor(self, valor):
+        """Valor codificado uma vez para ir em várias mensagens (ver `prontos`)"""
+        saida = bytearray()
+        _codificar_valor(saida, valor)
+        return bytes(saida)
+
+
+JSON = CodecJSON()
+COMPACTO = CodecCompacto()
+
+# Em ordem de preferência do servidor
+CODECS = {codec.nome: codec for codec in (COMPACTO, JSON)}
+
+
+def negociar(codificacoes):
+    """Escolhe o codec para um cliente a partir da lista enviada no register"""
+    for nome in CODECS:
+        if nome in (codificacoes or []):
+            return CODECS[nome]
+    return JSON
+
+
+def _objeto(mensagem):
+    """Toda mensagem do protocolo é um objeto; os handlers fazem mensagem.get(...)"""
+    if not isinstance(mensagem, dict):
+        raise ErroProtocolo(f"Mensagem deveria ser um objeto, veio {type(mensagem).__name__}")
+    return mensagem
+
+
+class LeitorMensagens:
+    """Separa os quadros recebidos de um socket, aceitando os dois formatos"""
+
+    def __init__(self, limite=TAMANHO_MAXIMO_QUADRO):
+        self.buffer = bytearray()
+        self.limite = limite
+
+    def alimentar(self, dados):
+        self.buffer += dados
+
+    def proxima(self):
+        """Retorna a próxima mensagem completa ou None se ainda faltam bytes.
+
+        Um quadro inválido, ou que não seja um objeto, é descartado do buffer
+        antes de levantar ErroProtocolo/JSONDecodeError (ambos ValueError),
+        então a leitura pode continuar.
+        Um quadro incompleto acima do limite levanta QuadroMuitoGrande.
+        """
+        while self.buffer:
+            if self.buffer[0] == MARCADOR_COMPACTO:
+                try:
+                    tamanho, inicio = _ler_varint(self.buffer, 1)
+                except IndexError:
+                    return self._incompleto()
+                if tamanho > self.limite:
+                    raise QuadroMuitoGrande(f'Quadro de {tamanho} bytes (limite {self.limite})')
+                fim = inicio + tamanho
+                if len(self.buffer) < fim:
+                    return None
+                quadro = self.buffer[inicio:fim]
+                del self.buffer[:fim]
+                return _objeto(COMPACTO.decodificar(quadro))
+
+            fim = self.buffer.find(b'\n')
+            if fim < 0:
+                return self._incompleto()
+            linha = self.buffer[:fim]
+            del self.buffer[:fim + 1]
+            if linha.strip():
+                return _objeto(JSON.decodificar(linha))
+            # Linha em branco: segue para a próxima
+        return None
+
+    def _incompleto(self):
+        if len(self.buffer) > self.limite:
+            raise QuadroMuitoGrande(f'Mais de {self.limite} bytes sem fim de quadro')
+        return None
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sistema de Chamada Hospitalar - Rastreio das chamadas de ponta a ponta
+Cada chamada recebe um trace_id e o horário de cada estágio (recebida,
+gravada, enviada, entregue e anunciada em cada tela). O tempo de cada estágio
+vai para um histograma, de onde saem os percentis por estágio.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Estágios informados pelas telas (evento de confirmação)
+ESTAGIOS_CLIENTE = ('entregue', 'anunciado')
+# Rastros mantidos para confirmação e consulta
+LIMITE_RASTROS = 1000
+# Confirmações que chegam depois disso (s) são ignoradas
+VALIDADE_RASTRO = 300
+# Diferença máxima aceita entre o relógio do médico e o do servidor (s)
+ATRASO_MAXIMO_CLIQUE = 60
+
+
+def novo_trace_id(sugerido=None):
+    """Aceita o id enviado pelo cliente se for razoável; senão gera um"""
+    if isinstance(sugerido, str) and 0 < len(sugerido) <= 64 and sugerido.isprintable():
+        return sugerido
+    return uuid.uuid4().hex[:16]
+
+
+def _unidade(info):
+    """Rótulo da unidade do rastro ('' no servidor central, que atende uma só)"""
+    servidor_id = info.get('servidor_id')
+    return '' if servidor_id is None else str(servidor_id)
+
+
+class Rastro:
+    def __init__(self, trace_id, inicio, info):
+        self.trace_id = trace_id
+        self.inicio = inicio
+        self.info = info
+        self.estagios = [('recebido', inicio)]  # [(estágio, instante monotônico)]
+        self.confirmacoes = {}  # {cliente: [(estágio, instante)]}
+
+    def para_dict(self):
+        def ms(instante):
+            return round((instante - self.inicio) * 1000, 1)
+        return dict(
+            self.info,
+            trace_id=self.trace_id,
+            estagios={estagio: ms(instante) for estagio, instante in self.estagios},
+            clientes=[{estagio: ms(instante) for estagio, instante in confirmacoes}
+                      for confirmacoes in self.confirmacoes.values()],
+        )
+
+
+class Rastreador:
+    """Guarda os rastros recentes e mede o tempo entre estágios consecutivos"""
+
+    def __init__(self, registro, limite=LIMITE_RASTROS, validade=VALIDADE_RASTRO):
+        self.estagio = registro.histograma(
+            'rastreio_estagio_segundos',
+            'Tempo de cada estágio da chamada desde o estágio anterior', ['servidor_id', 'estagio'])
+        self.total = registro.histograma(
+            'rastreio_total_segundos',
+            'Tempo do recebimento da chamada até o estágio', ['servidor_id', 'estagio'])
+        self.limite = limite
+        self.validade = validade
+        self._rastros = OrderedDict()
+        self._lock = threading.Lock()
+
+    def iniciar(self, trace_id=None, enviado_em=None, **info):
+        """Abre o rastro no estágio 'recebido'; enviado_em é o clique (epoch, relógio do cliente)"""
+        trace_id = novo_trace_id(trace_id)
+        agora = time.monotonic()
+        if isinstance(enviado_em, (int, float)):
+            atraso = time.time() - enviado_em
+            # Relógios muito diferentes distorceriam o histograma
+            if 0 <= atraso < ATRASO_MAXIMO_CLIQUE:
+                self.estagio.rotulos(_unidade(info), 'recebido').observar(atraso)
+        with self._lock:
+            self._rastros[trace_id] = Rastro(trace_id, agora, info)
+            while len(self._rastros) > self.limite:
+                self._rastros.popitem(last=False)
+        return trace_id
+
+    def marcar(self, trace_id, estagio):
+        """Registra um estágio do lado do servidor"""
+        agora = time.monotonic()
+        with self._lock:
+            rastro = self._rastros.get(trace_id)
+            if rastro is None:
+                return
+            anterior = rastro.estagios[-1][1]
+            rastro.estagios.append((estagio, agora))
+        unidade = _unidade(rastro.info)
+        self.estagio.rotulos(unidade, estagio).observar(agora - anterior)
+        self.total.rotulos(unidade, estagio).observar(agora - rastro.inicio)
+
+    def confirmar(self, trace_id, cliente, estagio):
+        """Confirmação de uma tela; retorna False se o rastro ou o estágio não valem"""
+        if estagio not in ESTAGIOS_CLIENTE:
+            return False
+        agora = time.monotonic()
+        with self._lock:
+            rastro = self._rastros.get(trace_id)
+            if rastro is None or agora - rastro.inicio > self.validade:
+                return False
+            confirmacoes = rastro.confirmacoes.setdefault(cliente, [])
+            if any(nome == estagio for nome, _ in confirmacoes):
+                return False  # Tela repetiu a confirmação (replay)
+            anterior = confirmacoes[-1][1] if confirmacoes else rastro.estagios[-1][1]
+            confirmacoes.append((estagio, agora))
+        unidade = _unidade(rastro.info)
+        self.estagio.rotulos(unidade, estagio).observar(agora - anterior)
+        self.total.rotulos(unidade, estagio).observar(agora - rastro.inicio)
+        return True
+
+    def recentes(self, limite=20, **filtro):
+        """Rastros mais recentes (tempos em ms desde o recebimento)"""
+        with self._lock:
+            rastros = [r.para_dict() for r in reversed(self._rastros.values())
+                       if all(r.info.get(chave) == valor for chave, valor in filtro.items())]
+        return rastros[:limite]
+
+    def percentis(self, servidor_id=None):
+        """{estágio: {'p50': ms, 'p95': ms, 'p99': ms, 'total_p50': ms, ...}} das chamadas de uma unidade.
+
+        servidor_id None: rastros sem unidade, como os do servidor central.
+        """
+        unidade = _unidade({'servidor_id': servidor_id})
+        resultado = {}
+        for nome, familia in (('', self.estagio), ('total_', self.total)):
+            for (rotulo, estagio), serie in familia.series():
+                if rotulo != unidade:
+                    continue
+                for p, segundos in serie.percentis((50, 95, 99)).items():
+                    resultado.setdefault(estagio, {})[f'{nome}p{p}'] = round(segundos * 1000, 2)
+        return resultado
@@ -5,14 +5,17 @@ Sistema de Atendimento Hospitalar - Cliente Recepção
 Interface para gerenciar fila de atendimento e confirmar consultas
 """
 
+import os
 import tkinter as tk
 from tkinter import ttk, messagebox
 import socket
-import json
 import threading
 from datetime import datetime
 import time
 
+import protocolo
+from pedidos import ErroServidor, Pedidos
+
 
 def get_local_ip():
     """Obtém o endereço IP local da máquina na rede WiFi"""
@@ -38,6 +41,12 @@ class RecepcaoClient:
         self.connected = False
         self.receive_thread = None
         self.running = True
+        self.codec = protocolo.JSON  # trocado pelo codec negociado no register
+        # A thread de recepção também envia (call_ack): um sendall por vez no socket
+        self.envio_lock = threading.Lock()
+        # Pedidos em voo, casados com as respostas pelo request_id
+        self.pedidos = Pedidos(self.send_message,
+                               agendar=lambda segundos, funcao: self.root.after(int(segundos * 1000), funcao))
 
         # Dados
         self.fila_atendimento = []
@@ -48,6 +57,8 @@ class RecepcaoClient:
         self.server_ip = tk.StringVar(value=get_local_ip())  # Usa IP local por padrão
         self.server_port = tk.StringVar(value="8888")
         self.status_var = tk.StringVar(value="Desconectado")
+        # Salas ou áreas de espera acompanhadas por esta recepção (vazio = todas)
+        self.salas_assinadas = tk.StringVar(value=os.getenv('RECEPCAO_SALAS', ''))
 
         self.setup_ui()
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
@@ -91,6 +102,12 @@ class RecepcaoClient:
         ttk.Label(conn_frame, text="Dica: Use o IP do computador onde o servidor está rodando", 
                  font=('TkDefaultFont', 8)).grid(row=1, column=0, columnspan=7, sticky=tk.W, pady=(5,0))
 
+        ttk.Label(conn_frame, text="Salas/áreas:").grid(row=2, column=0, sticky=tk.W, pady=(5, 0))
+        ttk.Entry(conn_frame, textvariable=self.salas_assinadas, width=15).grid(row=2, column=1, padx=(5, 10), pady=(5, 0))
+        ttk.Button(conn_frame, text="Aplicar", command=self.assinar_salas).grid(row=2, column=2, pady=(5, 0))
+        ttk.Label(conn_frame, text="Ex.: 1,2,5 ou o nome de uma área; vazio recebe todas as salas",
+                 font=('TkDefaultFont', 8)).grid(row=2, column=3, columnspan=4, sticky=tk.W, padx=(10, 0), pady=(5, 0))
+
         # Frame esquerdo - Salas conectadas
         left_frame = ttk.LabelFrame(main_frame, text="Salas Conectadas", padding="10")
         left_frame.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=(0, 5))
@@ -192,30 +209,31 @@ class RecepcaoClient:
             self.socket.connect((self.server_ip.get(), int(self.server_port.get())))
             self.socket.settimeout(30.0)
 
-            # Registrar como recepção
+            # send_message só envia com a conexão marcada como ativa
+            self.connected = True
+            self.codec = protocolo.JSON
+
+            # Iniciar thread para receber mensagens antes do primeiro pedido
+            self.receive_thread = threading.Thread(target=self.receive_messages)
+            self.receive_thread.daemon = True
+            self.receive_thread.start()
+
+            # Registrar como recepção; o servidor já envia fila e salas antes
+            # da confirmação, sem pedidos extras
             register_msg = {
                 'type': 'register',
                 'client_type': 'reception',
+                'codificacoes': list(protocolo.CODECS),
                 'timestamp': time.time()
             }
-            self.send_message(register_msg)
+            if self.salas_assinadas.get().strip():
+                register_msg['salas'] = self.salas_assinadas.get()
+            self.pedidos.enviar(register_msg).add_done_callback(self.na_interface(self.registro_respondido))
 
-            self.connected = True
             self.status_var.set("Conectado")
             self.status_label.configure(foreground="green")
             self.connect_btn.configure(text="Desconectar")
 
-            # Iniciar thread para receber mensagens
-            self.receive_thread = threading.Thread(target=self.receive_messages)
-            self.receive_thread.daemon = True
-            self.receive_thread.start()
-
-            self.log_message("Conectado ao servidor com sucesso")
-
-            # Solicitar atualização inicial
-            self.request_rooms_update()
-            self.request_queue_update()
-
         except Exception as e:
             self.log_message(f"Erro ao conectar: {e}")
             messagebox.showerror("Erro", f"Não foi possível conectar ao servidor:\n{e}")
@@ -224,6 +242,7 @@ class RecepcaoClient:
     def disconnect_from_server(self):
         """Desconecta do servidor"""
         self.connected = False
+        self.pedidos.cancelar_todos()
         self.status_var.set("Desconectado")
         self.status_label.configure(foreground="red")
         self.connect_btn.configure(text="Conectar")
@@ -240,17 +259,54 @@ class RecepcaoClient:
         """Envia mensagem para o servidor"""
         if self.connected:
             try:
-                data = json.dumps(message, ensure_ascii=False).encode('utf-8')
-                data += b'\n'  # Adiciona newline para delimitar mensagens
-                self.socket.send(data)
+                data = self.codec.codificar(message)
+                with self.envio_lock:
+                    self.socket.sendall(data)
                 self.log_message(f"Mensagem enviada: {message}")
+                return True
             except Exception as e:
                 self.log_message(f"Erro ao enviar mensagem: {e}")
+                self.root.after(0, self.disconnect_from_server)
+        return False
+
+    def na_interface(self, funcao):
+        """Callback de Future que roda `funcao(futuro)` na thread do Tk"""
+        def agendar(futuro):
+            if self.running:
+                self.root.after(0, funcao, futuro)
+        return agendar
+
+    def registro_respondido(self, futuro):
+        try:
+            resposta = futuro.result()
+        except Exception as e:
+            self.log_message(f"Erro no registro: {e}")
+            if self.connected:
                 self.disconnect_from_server()
+            return
+        # A partir daqui o servidor espera o formato negociado
+        self.codec = protocolo.CODECS.get(resposta.get('codificacao'), protocolo.JSON)
+        self.log_message(f"Conectado ao servidor com sucesso (codificação {self.codec.nome})")
+
+    def resposta_recebida(self, futuro):
+        """Resposta a um pedido da recepção: tratada como as demais mensagens"""
+        try:
+            self.process_message(futuro.result())
+        except ErroServidor as e:
+            self.log_message(f"Erro: {e}")
+            messagebox.showerror("Erro", str(e))
+        except Exception as e:
+            if self.connected:
+                self.log_message(f"Pedido sem resposta: {e}")
+
+    def confirmar_chamada(self, chamada, estagio):
+        """Avisa o servidor que a chamada chegou ('entregue') ou foi exibida ('anunciado')"""
+        if chamada.get('trace_id'):
+            self.send_message({'type': 'call_ack', 'trace_id': chamada['trace_id'], 'estagio': estagio})
 
     def receive_messages(self):
         """Thread para receber mensagens do servidor"""
-        buffer = b''
+        leitor = protocolo.LeitorMensagens(protocolo.TAMANHO_MAXIMO_RESPOSTA)
 
         while self.running and self.connected:
             try:
@@ -259,17 +315,24 @@ class RecepcaoClient:
                     self.log_message("Servidor fechou a conexão")
                     break
 
-                buffer += data
-                self.log_message(f"Dados recebidos: {data.decode('utf-8', errors='ignore')}")
+                leitor.alimentar(data)
+                self.log_message(f"Dados recebidos: {len(data)} bytes")
 
                 # Processa mensagens completas
-                while b'\n' in buffer:
-                    message, buffer = buffer.split(b'\n', 1)
+                while True:
                     try:
-                        msg = json.loads(message.decode('utf-8'))
+                        msg = leitor.proxima()
+                    except ValueError as e:
+                        self.log_message(f"Erro ao decodificar mensagem: {e}")
+                        continue
+                    if msg is None:
+                        break
+                    if msg.get('type') == 'new_call':
+                        # Confirma já na recepção do socket, antes da fila da interface
+                        self.confirmar_chamada(msg.get('call') or {}, 'entregue')
+                    # Respostas vão para o Future do pedido; o resto é aviso do servidor
+                    if not self.pedidos.resolver(msg):
                         self.root.after(0, lambda m=msg: self.process_message(m))
-                    except json.JSONDecodeError:
-                        self.log_message(f"Erro ao decodificar mensagem: {message}")
 
             except socket.timeout:
                 continue
@@ -285,7 +348,7 @@ class RecepcaoClient:
         """Processa mensagens recebidas do servidor"""
         try:
             msg_type = message.get('type')
-            
+
             if msg_type == 'queue_update':
                 self.fila_atendimento = message.get('queue', [])
                 self.update_fila_display()
@@ -295,6 +358,19 @@ class RecepcaoClient:
                 self.medicos_conectados = message.get('doctors', {})
                 self.update_salas_display()
                 
+            elif msg_type == 'subscribed':
+                salas = message.get('salas')
+                self.log_message(f"Acompanhando as salas: {', '.join(map(str, salas)) if salas else 'todas'}")
+
+            elif msg_type in ('call_confirmed', 'call_removed'):
+                self.log_message(f"Servidor confirmou {msg_type} para ID {message.get('call_id')}")
+
+            elif msg_type == 'new_call':
+                chamada = message.get('call') or {}
+                self.log_message(f"Nova chamada: {chamada.get('paciente')} - sala {chamada.get('sala')}")
+                self.root.bell()
+                self.confirmar_chamada(chamada, 'anunciado')
+
             elif msg_type == 'patient_called':
                 # Atualiza a fila quando um paciente é chamado
                 self.request_queue_update()
@@ -339,7 +415,7 @@ class RecepcaoClient:
             'azul': '#0000FF'
         }
 
-        # Adiciona cada item da fila
+        # Adiciona cada item da fila (o servidor já envia da mais urgente para a menos)
         for item in self.fila_atendimento:
             # Cria um quadrado colorido para representar a cor
             cor = item.get('cor', 'cinza')
@@ -347,8 +423,12 @@ class RecepcaoClient:
             cor_tag = f"cor_{item['id']}"
             self.fila_tree.tag_configure(cor_tag, background=cor_hex)
             
-            # Formata o horário
-            horario = datetime.fromtimestamp(item['timestamp']).strftime('%H:%M')
+            # Formata o horário (o servidor central envia 'HH:MM:SS')
+            horario = item.get('timestamp', '')
+            if isinstance(horario, (int, float)):
+                horario = datetime.fromtimestamp(horario).strftime('%H:%M')
+            else:
+                horario = str(horario)[:5]
             
             # Insere o item na árvore
             self.fila_tree.insert('', 'end', values=(
@@ -395,7 +475,7 @@ class RecepcaoClient:
                 'timestamp': time.time()
             }
             self.log_message(f"Confirmando atendimento para ID {call_id}")
-            self.send_message(msg)
+            self.pedidos.enviar(msg).add_done_callback(self.na_interface(self.resposta_recebida))
         else:
             messagebox.showwarning("Aviso", "Não conectado ao servidor")
 
@@ -424,12 +504,9 @@ class RecepcaoClient:
                 'timestamp': datetime.now().isoformat()
             }
 
-            if self.send_message(remove_msg):
-                self.log_message(f"Removido da fila: {patient}")
-                # Atualizar fila
-                self.request_queue_update()
-            else:
-                messagebox.showerror("Erro", "Não foi possível remover da fila")
+            # A fila nova chega a todas as recepções no queue_update do servidor
+            self.log_message(f"Removendo da fila: {patient}")
+            self.pedidos.enviar(remove_msg).add_done_callback(self.na_interface(self.resposta_recebida))
 
     def request_rooms_update(self):
         """Solicita atualização da lista de salas"""
@@ -439,7 +516,17 @@ class RecepcaoClient:
                 'timestamp': time.time()
             }
             self.log_message("Solicitando atualização da lista de salas")
-            self.send_message(msg)
+            self.pedidos.enviar(msg).add_done_callback(self.na_interface(self.resposta_recebida))
+
+    def assinar_salas(self):
+        """Passa a receber só as chamadas e a fila das salas informadas"""
+        if self.connected:
+            msg = {
+                'type': 'subscribe',
+                'salas': self.salas_assinadas.get(),
+                'timestamp': time.time()
+            }
+            self.pedidos.enviar(msg).add_done_callback(self.na_interface(self.resposta_recebida))
 
     def request_queue_update(self):
         """Solicita atualização da fila"""
@@ -449,10 +536,14 @@ class RecepcaoClient:
                 'timestamp': time.time()
             }
             self.log_message("Solicitando atualização da fila de atendimento")
-            self.send_message(msg)
+            self.pedidos.enviar(msg).add_done_callback(self.na_interface(self.resposta_recebida))
 
     def log_message(self, message):
-        """Adiciona mensagem ao log"""
+        """Adiciona mensagem ao log (de outra thread, é repassada à thread do Tk)"""
+        if threading.current_thread() is not threading.main_thread():
+            if self.running:
+                self.root.after(0, self.log_message, message)
+            return
         timestamp = datetime.now().strftime("%H:%M:%S")
         log_entry = f"[{timestamp}] {message}\n"
 
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sistema de Chamada Hospitalar - Registros do servidor central
+Chamadas da fila e do histórico e clientes conectados como objetos com
+__slots__: cada campo é guardado uma vez, sem um dicionário por instância.
+Os nomes duplicados do protocolo (room/sala, patient/paciente, time/timestamp)
+só são montados na borda, em para_mensagem().
+"""
+
+import time
+from functools import lru_cache
+
+
+@lru_cache(maxsize=4096)
+def _horario(segundo):
+    return time.strftime('%H:%M:%S', time.localtime(segundo))
+
+
+def horario(instante):
+    """'HH:MM:SS' do instante (epoch); chamadas do mesmo segundo reaproveitam o texto"""
+    return _horario(int(instante))
+
+
+class ChamadaFila:
+    """Chamada na fila de atendimento (e, depois de atendida, no histórico)"""
+
+    __slots__ = ('id', 'sala', 'paciente', 'cor', 'trace_id', 'criado_em', 'status', 'atendido_em')
+
+    def __init__(self, id, sala, paciente, cor, trace_id=None, criado_em=None):
+        self.id = id
+        self.sala = sala
+        self.paciente = paciente
+        self.cor = cor
+        self.trace_id = trace_id
+        self.criado_em = time.time() if criado_em is None else criado_em
+        self.status = 'chamado'
+        self.atendido_em = None
+
+    def atender(self, instante=None):
+        self.status = 'atendido'
+        self.atendido_em = time.time() if instante is None else instante
+
+    def para_mensagem(self):
+        """Dicionário enviado aos clientes, com os nomes de compatibilidade"""
+        hora = horario(self.criado_em)
+        mensagem = {
+            'id': self.id,
+            'room': self.sala,  # Para compatibilidade com cliente
+            'sala': self.sala,
+            'patient': self.paciente,  # Para compatibilidade com cliente
+            'paciente': self.paciente,
+            'time': hora,  # Para compatibilidade
+            'timestamp': hora,
+            'status': self.status,
+            'cor': self.cor,
+            'trace_id': self.trace_id,
+        }
+        if self.atendido_em is not None:
+            mensagem['fim_atendimento'] = horario(self.atendido_em)
+        return mensagem
+
+    def __repr__(self):
+        return f'ChamadaFila(id={self.id!r}, sala={self.sala!r}, paciente={self.paciente!r}, status={self.status!r})'
+
+
+def para_mensagens(chamadas):
+    return [chamada.para_mensagem() for chamada in chamadas]
+
+
+class ClienteConectado:
+    """Conexão registrada no servidor central: médico (com sala) ou recepção"""
+
+    __slots__ = ('socket', 'tipo', 'sala', 'nome')
+
+    def __init__(self, socket, tipo, sala=None, nome=None):
+        self.socket = socket
+        self.tipo = tipo
+        self.sala = sala
+        self.nome = nome
+
+    def __repr__(self):
+        return f'ClienteConectado(tipo={self.tipo!r}, sala={self.sala!r}, nome={self.nome!r})'
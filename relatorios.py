@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sistema de Chamada Hospitalar - Relatórios
+Agregações de chamadas a partir dos resumos por hora (rollups)
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+# Chamadas lidas por lote ao reconstruir os resumos a partir do histórico
+TAMANHO_LOTE = 5000
+
+
+def agora_local():
+    """Horário de Brasília sem fuso, no mesmo formato gravado em Chamada.timestamp.
+
+    Brasília não tem horário de verão desde 2019, então UTC-3 fixo é exato;
+    todo cálculo de dia/mês local deve partir daqui.
+    """
+    return datetime.utcnow() - timedelta(hours=3)
+
+
+def truncar_hora(momento):
+    return momento.replace(minute=0, second=0, microsecond=0)
+
+
+def intervalo_de_datas(inicio, fim, dias_padrao=7):
+    """Converte 'AAAA-MM-DD' em [início, fim) com o dia final incluído"""
+    hoje = agora_local()
+    fim_data = datetime.strptime(fim, '%Y-%m-%d') if fim else hoje.replace(hour=0, minute=0, second=0, microsecond=0)
+    inicio_data = datetime.strptime(inicio, '%Y-%m-%d') if inicio else fim_data - timedelta(days=dias_padrao - 1)
+    return inicio_data, fim_data + timedelta(days=1)
+
+
+def somar_resumo(session, modelo, servidor_id, periodo, medico, nome_medico, cor, classificacao, quantidade=1):
+    """Soma `quantidade` ao resumo da hora (upsert atômico quando o banco permite)"""
+    valores = {
+        'servidor_id': servidor_id,
+        'periodo': periodo,
+        'medico': medico,
+        'nome_medico': nome_medico,
+        'cor': cor or 'cinza',
+        'classificacao': classificacao or '',
+        'total': quantidade,
+    }
+    dialeto = session.get_bind().dialect.name
+    if dialeto in ('sqlite', 'postgresql'):
+        if dialeto == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        comando = insert(modelo).values(**valores)
+        comando = comando.on_conflict_do_update(
+            index_elements=['servidor_id', 'periodo', 'medico', 'cor', 'classificacao'],
+            set_={'total': modelo.total + quantidade, 'nome_medico': nome_medico}
+        )
+        session.execute(comando)
+        return
+
+    # Outros bancos: atualiza e, se a linha não existir, insere
+    filtro = {k: valores[k] for k in ('servidor_id', 'periodo', 'medico', 'cor', 'classificacao')}
+    atualizadas = session.query(modelo).filter_by(**filtro).update(
+        {'total': modelo.total + quantidade, 'nome_medico': nome_medico})
+    if not atualizadas:
+        try:
+            with session.begin_nested():
+                session.add(modelo(**valores))
+        except IntegrityError:
+            session.query(modelo).filter_by(**filtro).update({'total': modelo.total + quantidade})
+
+
+def contar_chamadas(linhas):
+    """Agrupa em memória um lote de (timestamp, medico, nome_medico, cor, classificacao)"""
+    contagem = Counter()
+    nomes = {}
+    for timestamp, medico, nome_medico, cor, classificacao in linhas:
+        chave = (truncar_hora(timestamp), medico, cor or 'cinza', classificacao or '')
+        contagem[chave] += 1
+        nomes[medico] = nome_medico
+    return contagem, nomes
+
+
+def agrupar_periodos(linhas, agrupar):
+    """Linhas (periodo_hora, total) somadas por hora ou por dia"""
+    totais = Counter()
+    for periodo, total in linhas:
+        if agrupar == 'dia':
+            periodo = periodo.replace(hour=0)
+        totais[periodo] += total
+    formato = '%Y-%m-%d' if agrupar == 'dia' else '%Y-%m-%dT%H:00'
+    return [{'periodo': periodo.strftime(formato), 'total': total} for periodo, total in sorted(totais.items())]
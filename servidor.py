@@ -5,13 +5,29 @@ Sistema de Atendimento Hospitalar - Servidor Central
 Gerencia a comunicação entre salas médicas e recepção
 """
 
+import os
 import socket
 import threading
 import json
 import time
-from datetime import datetime
 from typing import Dict, List, Any
 
+import assinaturas
+from fila_prioridade import FilaPrioridade
+import idempotencia
+import metricas
+import perfil
+import protocolo
+from rastreio import Rastreador
+from registros import ChamadaFila, ClienteConectado, para_mensagens
+import voo_unico
+
+# Tipos aceitos em process_message; os demais aparecem como 'desconhecido' nas métricas
+TIPOS_MENSAGEM = {
+    'register', 'login_medico', 'chamar_paciente', 'confirmar_atendimento', 'get_fila',
+    'get_queue', 'get_salas', 'get_rooms', 'confirm_call', 'remove_call', 'call_ack', 'subscribe',
+}
+
 def get_local_ip():
     """Obtém o endereço IP local da máquina na rede WiFi"""
     try:
@@ -25,29 +41,107 @@ def get_local_ip():
         return '127.0.0.1'  # Fallback para localhost
 
 class HospitalServer:
-    def __init__(self, port=8888):
+    def __init__(self, port=8888, metricas_porta=None, metricas_host='127.0.0.1'):
         self.host = get_local_ip()  # Usa o IP local automaticamente
         self.port = port
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
         # Armazena conexões ativas
-        self.clients = {}  # {client_id: {'socket': socket, 'type': 'medico/recepcao', 'sala': num}}
+        self.clients = {}  # {client_id: ClienteConectado}
         self.salas_conectadas = {}  # {num_sala: client_id}
         self.recepcao_clients = []  # lista de client_ids da recepção
+        # Salas que cada recepção acompanha (índice sala -> recepções) e áreas de espera
+        self.assinaturas = assinaturas.Assinaturas()
+        self.areas = assinaturas.ler_areas(os.getenv('AREAS_ESPERA'))
+        self.codecs = {}  # {socket: codec negociado no register}
 
         # Dados do sistema
-        self.fila_atendimento = []  # [{'sala': int, 'paciente': str, 'timestamp': str, 'status': str}]
-        self.historico = []
+        # Chamadas aguardando, da mais urgente (cor da triagem + tempo de espera) para a menos
+        self.fila_atendimento = FilaPrioridade()
+        self.proximo_id = 1
+        self.historico = []  # ChamadaFila atendidas
 
         # Lock para thread safety
         self.lock = threading.Lock()
+        # request_id da mensagem em processamento (sob self.lock), devolvido nas respostas
+        self.pedido_atual = None
+
+        # Métricas de operação, publicadas em http://<host>:<metricas_porta>/metrics
+        self.metricas_porta = metricas_porta
+        self.metricas_host = metricas_host
+        self.metricas = metricas.Registro(prefixo='servidor_central')
+        self.metrica_conexoes = self.metricas.contador('conexoes_total', 'Conexões TCP aceitas')
+        self.metrica_recebidas = self.metricas.contador('mensagens_recebidas_total', 'Mensagens recebidas', ['tipo'])
+        self.metrica_enviadas = self.metricas.contador('mensagens_enviadas_total', 'Mensagens enviadas', ['tipo'])
+        self.metrica_bytes = self.metricas.contador('bytes_enviados_total', 'Bytes enviados', ['codificacao'])
+        self.metrica_erros_envio = self.metricas.contador('erros_envio_total', 'Falhas em send_message')
+        self.metrica_envio = self.metricas.histograma('send_message_segundos', 'Duração de send_message')
+        self.metrica_broadcast = self.metricas.histograma(
+            'broadcast_recepcao_segundos', 'Tempo para enviar uma mensagem a todas as recepções')
+        self.metrica_chamar = self.metricas.histograma('chamar_paciente_segundos', 'Duração de handle_chamar_paciente')
+        self.metrica_processar = self.metricas.histograma(
+            'processar_mensagem_segundos', 'Duração de process_message, incluindo a espera pelo lock', ['tipo'])
+        self.metrica_repetidas = self.metricas.contador(
+            'chamadas_repetidas_total', 'Chamadas descartadas por repetir a chave de idempotência')
+        self.rastreador = Rastreador(self.metricas)
+        # Chaves de idempotência já atendidas: {(sala, chave): confirmação enviada}
+        self.chamadas_idempotentes = idempotencia.CacheIdempotencia()
+        # Fila já codificada por (salas, codec), reaproveitada enquanto a fila não muda
+        self.filas_compartilhadas = voo_unico.VooUnico()
+        # Perfilador ligado sob demanda em /perfil na porta de métricas (PERFIL_TOKEN)
+        self.perfilador = perfil.Perfilador()
+        self.metricas.coletar('clientes_conectados', 'Clientes registrados', ['tipo'], self._contar_clientes)
+        self.metricas.coletar('fila_tamanho', 'Chamadas na fila de atendimento', (),
+                              lambda: {(): len(self.fila_atendimento)})
+        self.metricas.coletar('fila_pedidos_total',
+                              'Envios da fila: montados e codificados (calculados) ou reaproveitados (compartilhados)', ['resultado'],
+                              lambda: {(k,): v for k, v in self.filas_compartilhadas.resumo().items()},
+                              tipo='counter')
+        self.metricas.coletar('salas_conectadas', 'Salas com médico logado', (),
+                              lambda: {(): len(self.salas_conectadas)})
 
         print(f"Servidor iniciado em {self.host}:{port}")
         print("Para conectar os clientes, use este endereço IP na rede local")
 
+    def _contar_clientes(self):
+        contagem = {}
+        for info in list(self.clients.values()):
+            chave = (info.tipo or 'desconhecido',)
+            contagem[chave] = contagem.get(chave, 0) + 1
+        return contagem
+
+    def rotas_perfil(self):
+        """Rotas de administração do perfilador, só com PERFIL_TOKEN definido"""
+        token = os.getenv('PERFIL_TOKEN')
+        if not token:
+            return {}
+
+        def autorizado(cabecalhos):
+            return cabecalhos.get('Authorization') == f'Bearer {token}'
+
+        def estado(metodo, parametros, cabecalhos):
+            if not autorizado(cabecalhos):
+                return 401, 'application/json', b'{}'
+            if metodo == 'POST':
+                status, resumo = perfil.executar_acao(self.perfilador, parametros.get('acao'), parametros.get('duracao'))
+            else:
+                status, resumo = 200, self.perfilador.resumo()
+            return status, 'application/json', json.dumps(resumo).encode('utf-8')
+
+        def pilhas(metodo, parametros, cabecalhos):
+            if not autorizado(cabecalhos):
+                return 401, 'text/plain', b''
+            return 200, 'text/plain; charset=utf-8', self.perfilador.colapsado().encode('utf-8')
+
+        return {'/perfil': estado, '/perfil/pilhas.txt': pilhas}
+
     def start(self):
         """Inicia o servidor"""
+        if self.metricas_porta:
+            metricas.servir_http(self.metricas, self.metricas_porta, host=self.metricas_host,
+                                 rotas=self.rotas_perfil(), token=os.getenv('METRICAS_TOKEN'))
+            print(f"Métricas em http://{self.metricas_host}:{self.metricas_porta}/metrics")
         try:
             self.socket.bind((self.host, self.port))
             self.socket.listen(10)
@@ -55,6 +149,7 @@ class HospitalServer:
 
             while True:
                 client_socket, address = self.socket.accept()
+                self.metrica_conexoes.inc()
                 client_id = f"{address[0]}:{address[1]}_{int(time.time())}"
 
                 print(f"Nova conexão: {client_id} de {address}")
@@ -74,18 +169,19 @@ class HospitalServer:
 
     def handle_client(self, client_socket, client_id):
         """Gerencia comunicação com um cliente específico"""
+        leitor = protocolo.LeitorMensagens()
         try:
             while True:
                 # CORREÇÃO 1: Adicionar timeout para evitar bloqueio indefinido
                 client_socket.settimeout(30.0)
 
                 try:
-                    data = client_socket.recv(1024).decode('utf-8')
+                    data = client_socket.recv(4096)
                     if not data:
                         print(f"Cliente {client_id} enviou dados vazios - desconectando")
                         break
 
-                    print(f"Dados recebidos de {client_id}: {data}")  # Log para debug
+                    print(f"Dados recebidos de {client_id}: {len(data)} bytes")  # Log para debug
 
                 except socket.timeout:
                     print(f"Timeout na conexão com {client_id}")
@@ -94,21 +190,30 @@ class HospitalServer:
                     print(f"Erro de socket com {client_id}: {e}")
                     break
 
-                try:
-                    message = json.loads(data)
-                    print(f"Mensagem processada de {client_id}: {message}")  # Log para debug
-                    self.process_message(client_socket, client_id, message)
-                except json.JSONDecodeError as e:
-                    print(f"Erro JSON de {client_id}: {e}")
-                    self.send_error(client_socket, "Formato JSON inválido")
-                except Exception as e:
-                    print(f"Erro ao processar mensagem de {client_id}: {e}")
+                # Um recv pode trazer várias mensagens ou só parte de uma
+                leitor.alimentar(data)
+                while True:
+                    try:
+                        message = leitor.proxima()
+                    except ValueError as e:
+                        print(f"Erro de formato de {client_id}: {e}")
+                        self.send_error(client_socket, "Formato de mensagem inválido")
+                        continue
+                    if message is None:
+                        break
+
+                    try:
+                        print(f"Mensagem processada de {client_id}: {message}")  # Log para debug
+                        self.process_message(client_socket, client_id, message)
+                    except Exception as e:
+                        print(f"Erro ao processar mensagem de {client_id}: {e}")
 
         except Exception as e:
             print(f"Erro geral com cliente {client_id}: {e}")
         finally:
             print(f"Finalizando conexão com {client_id}")
             self.disconnect_client(client_id)
+            self.codecs.pop(client_socket, None)
             try:
                 client_socket.close()
             except:
@@ -116,37 +221,53 @@ class HospitalServer:
 
     def process_message(self, client_socket, client_id, message):
         """Processa mensagens recebidas dos clientes"""
-        with self.lock:
-            msg_type = message.get('type')
+        msg_type = message.get('type')
+        tipo_metrica = msg_type if msg_type in TIPOS_MENSAGEM else 'desconhecido'
+        self.metrica_recebidas.rotulos(tipo_metrica).inc()
+        with self.perfilador.cronometro(tipo_metrica), self.metrica_processar.rotulos(tipo_metrica).medir(), self.lock:
             print(f"Processando mensagem tipo '{msg_type}' de {client_id}")
+            self.pedido_atual = message.get('request_id')
+            try:
+                self._despachar(client_socket, client_id, message, msg_type)
+            finally:
+                self.pedido_atual = None
 
-            if msg_type == 'register':
-                self.register_client(client_socket, client_id, message)
+    def _despachar(self, client_socket, client_id, message, msg_type):
+        if msg_type == 'register':
+            self.register_client(client_socket, client_id, message)
 
-            elif msg_type == 'login_medico':
-                self.handle_medico_login(client_socket, client_id, message)
+        elif msg_type == 'login_medico':
+            self.handle_medico_login(client_socket, client_id, message)
 
-            elif msg_type == 'chamar_paciente':
-                self.handle_chamar_paciente(client_socket, client_id, message)
+        elif msg_type == 'chamar_paciente':
+            self.handle_chamar_paciente(client_socket, client_id, message)
 
-            elif msg_type == 'confirmar_atendimento':
-                self.handle_confirmar_atendimento(client_socket, client_id, message)
+        elif msg_type == 'confirmar_atendimento':
+            self.handle_confirmar_atendimento(client_socket, client_id, message)
 
-            elif msg_type == 'get_fila' or msg_type == 'get_queue':
-                self.send_fila_update_to_client(client_socket)
+        elif msg_type == 'get_fila' or msg_type == 'get_queue':
+            self.send_fila_update_to_client(client_socket, resposta=True,
+                                            salas=self.assinaturas.salas_de(client_id))
 
-            elif msg_type == 'get_salas' or msg_type == 'get_rooms':
-                self.send_salas_conectadas_to_client(client_socket)
+        elif msg_type == 'get_salas' or msg_type == 'get_rooms':
+            self.send_salas_conectadas_to_client(client_socket, resposta=True)
 
-            elif msg_type == 'confirm_call':
-                self.handle_confirmar_atendimento_by_id(client_socket, client_id, message)
+        elif msg_type == 'confirm_call':
+            self.handle_confirmar_atendimento_by_id(client_socket, client_id, message)
 
-            elif msg_type == 'remove_call':
-                self.handle_remover_da_fila(client_socket, client_id, message)
+        elif msg_type == 'remove_call':
+            self.handle_remover_da_fila(client_socket, client_id, message)
 
-            else:
-                print(f"Tipo de mensagem desconhecido: {msg_type}")
-                self.send_error(client_socket, f"Tipo de mensagem desconhecido: {msg_type}")
+        elif msg_type == 'subscribe':
+            self.handle_assinar_salas(client_socket, client_id, message)
+
+        elif msg_type == 'call_ack':
+            # Recepção confirma que recebeu/exibiu a chamada (rastreio de latência)
+            self.rastreador.confirmar(message.get('trace_id'), client_id, message.get('estagio', 'entregue'))
+
+        else:
+            print(f"Tipo de mensagem desconhecido: {msg_type}")
+            self.send_error(client_socket, f"Tipo de mensagem desconhecido: {msg_type}")
 
     def register_client(self, client_socket, client_id, message):
         """Registra um novo cliente"""
@@ -157,23 +278,34 @@ class HospitalServer:
         if client_type == 'reception':
             client_type = 'recepcao'
 
-        self.clients[client_id] = {
-            'socket': client_socket,
-            'type': client_type,
-            'sala': None
-        }
+        if client_type == 'recepcao':
+            try:
+                salas = assinaturas.normalizar_salas(message.get('salas'), self.areas)
+            except ValueError as e:
+                self.send_error(client_socket, str(e))
+                return
+
+        self.clients[client_id] = ClienteConectado(client_socket, client_type)
 
         if client_type == 'recepcao':
-            self.recepcao_clients.append(client_id)
+            if client_id not in self.recepcao_clients:
+                self.recepcao_clients.append(client_id)
+            self.assinaturas.assinar(client_id, salas)
             # Envia estado atual para recepção
-            self.send_fila_update_to_client(client_socket)
+            self.send_fila_update_to_client(client_socket, salas=salas)
             self.send_salas_conectadas_to_client(client_socket)
 
+        # Negocia a codificação: a confirmação ainda vai em JSON e só as
+        # mensagens seguintes usam o formato escolhido
+        codec = protocolo.negociar(message.get('codificacoes'))
+
         # CORREÇÃO 2: Enviar confirmação de registro
-        self.send_message(client_socket, {
+        self.responder(client_socket, {
             'type': 'register_success',
-            'client_type': client_type
+            'client_type': client_type,
+            'codificacao': codec.nome
         })
+        self.codecs[client_socket] = codec
 
         print(f"Cliente registrado: {client_id} como {client_type}")
 
@@ -187,16 +319,26 @@ class HospitalServer:
         try:
             sala = int(sala)
         except (ValueError, TypeError):
-            self.send_message(client_socket, {
+            self.responder(client_socket, {
                 'type': 'login_response',
                 'success': False,
                 'message': 'Número da sala deve ser um valor numérico válido'
             })
             return
 
+        if self.salas_conectadas.get(sala) == client_id and self.clients[client_id].sala == sala:
+            # Reenvio do mesmo login (resposta perdida ou atrasada): confirma de novo
+            self.responder(client_socket, {
+                'type': 'login_response',
+                'success': True,
+                'sala': sala,
+                'message': f'Login realizado com sucesso na sala {sala}'
+            })
+            return
+
         if sala in self.salas_conectadas:
             print(f"Sala {sala} já está ocupada por {self.salas_conectadas[sala]}")
-            self.send_message(client_socket, {
+            self.responder(client_socket, {
                 'type': 'login_response',
                 'success': False,
                 'message': f'Sala {sala} já está conectada'
@@ -206,19 +348,14 @@ class HospitalServer:
         # CORREÇÃO 4: Auto-registrar médico se não estiver registrado
         if client_id not in self.clients:
             print(f"Cliente {client_id} não estava registrado - registrando automaticamente como médico")
-            self.clients[client_id] = {
-                'socket': client_socket,
-                'type': 'medico',
-                'sala': None,
-                'nome': nome
-            }
+            self.clients[client_id] = ClienteConectado(client_socket, 'medico', nome=nome)
 
         # Registra a sala
-        self.clients[client_id]['sala'] = sala
-        self.clients[client_id]['nome'] = nome
+        self.clients[client_id].sala = sala
+        self.clients[client_id].nome = nome
         self.salas_conectadas[sala] = client_id
 
-        self.send_message(client_socket, {
+        self.responder(client_socket, {
             'type': 'login_response',
             'success': True,
             'sala': sala,
@@ -244,11 +381,15 @@ class HospitalServer:
 
     def handle_chamar_paciente(self, client_socket, client_id, message):
         """Processa chamada de paciente"""
+        with self.metrica_chamar.medir():
+            self._chamar_paciente(client_socket, client_id, message)
+
+    def _chamar_paciente(self, client_socket, client_id, message):
         if client_id not in self.clients:
             self.send_error(client_socket, "Cliente não registrado")
             return
 
-        sala = self.clients[client_id]['sala']
+        sala = self.clients[client_id].sala
         if not sala:
             self.send_error(client_socket, "Médico não está logado em nenhuma sala")
             return
@@ -259,102 +400,110 @@ class HospitalServer:
             self.send_error(client_socket, "Nome do paciente não pode estar vazio")
             return
 
-        # Adiciona à fila
-        chamada = {
-            'id': len(self.fila_atendimento) + 1,  # ID sequencial
-            'room': sala,  # Para compatibilidade com cliente
-            'sala': sala,
-            'patient': paciente,  # Para compatibilidade com cliente
-            'paciente': paciente,
-            'time': datetime.now().strftime('%H:%M:%S'),  # Para compatibilidade
-            'timestamp': datetime.now().strftime('%H:%M:%S'),
-            'status': 'chamado'
-        }
+        chave = message.get('idempotency_key')
+        if not idempotencia.chave_valida(chave):
+            self._registrar_chamada(client_socket, sala, paciente, message)
+            return
+        # Reenvio do mesmo clique: repete a confirmação sem enfileirar nem avisar a recepção
+        confirmacao, repetida = self.chamadas_idempotentes.executar(
+            (sala, chave), lambda: self._registrar_chamada(client_socket, sala, paciente, message))
+        if repetida:
+            self.metrica_repetidas.inc()
+            self.responder(client_socket, confirmacao)
+
+    def _registrar_chamada(self, client_socket, sala, paciente, message):
+        trace_id = self.rastreador.iniciar(message.get('trace_id'), message.get('enviado_em'), sala=sala)
 
-        self.fila_atendimento.append(chamada)
+        # Adiciona à fila (ID sequencial); os nomes de compatibilidade só vão na mensagem
+        chamada = ChamadaFila(self.proximo_id, sala, paciente,
+                              self.fila_atendimento.cor(message.get('cor')), trace_id)
+        self.proximo_id += 1
+
+        self.fila_atendimento.inserir(chamada)
+        self.rastreador.marcar(trace_id, 'enfileirado')
 
         # Confirma para o médico
-        self.send_message(client_socket, {
+        confirmacao = {
             'type': 'chamada_confirmada',
             'paciente': paciente
-        })
+        }
+        self.responder(client_socket, confirmacao)
 
-        # Notifica recepção sobre nova chamada
-        self.broadcast_to_recepcao({
-            'type': 'new_call',
-            'call': chamada
-        })
+        # Notifica só as recepções que acompanham a sala
+        self.enviar_chamada_recepcao(chamada)
+        self.rastreador.marcar(trace_id, 'emitido')
 
-        # Atualiza fila para todas as recepções
-        self.broadcast_to_recepcao({
-            'type': 'queue_update',
-            'queue': self.fila_atendimento
-        })
+        # Atualiza a fila de cada recepção
+        self.broadcast_fila(sala)
 
         print(f"Paciente {paciente} chamado na sala {sala}")
+        return confirmacao
 
     def handle_confirmar_atendimento(self, client_socket, client_id, message):
         """Processa confirmação de atendimento pela recepção"""
         sala = message.get('sala')
 
-        # Remove da fila
-        for i, chamada in enumerate(self.fila_atendimento):
-            if chamada['sala'] == sala and chamada['status'] == 'chamado':
-                chamada['status'] = 'atendido'
-                chamada['fim_atendimento'] = datetime.now().strftime('%H:%M:%S')
-
-                # Move para histórico
-                self.historico.append(chamada)
-                self.fila_atendimento.pop(i)
-
-                # Notifica médico que pode chamar próximo
-                if sala in self.salas_conectadas:
-                    medico_id = self.salas_conectadas[sala]
-                    if medico_id in self.clients:
-                        self.send_message(self.clients[medico_id]['socket'], {
-                            'type': 'atendimento_confirmado',
-                            'paciente': chamada['paciente'],
-                            'sala': sala,
-                            'message': f'Atendimento do paciente {chamada["paciente"]} confirmado'
-                        })
-                break
+        # Remove da fila a chamada mais antiga da sala
+        chamada = self.fila_atendimento.remover_da_sala(sala)
+        if chamada is not None:
+            chamada.atender()
+
+            # Move para histórico
+            self.historico.append(chamada)
+
+            # Notifica médico que pode chamar próximo
+            if sala in self.salas_conectadas:
+                medico_id = self.salas_conectadas[sala]
+                if medico_id in self.clients:
+                    self.send_message(self.clients[medico_id].socket, {
+                        'type': 'atendimento_confirmado',
+                        'paciente': chamada.paciente,
+                        'sala': sala,
+                        'message': f'Atendimento do paciente {chamada.paciente} confirmado'
+                    })
 
         # Atualiza recepção
-        self.send_message(client_socket, {
+        self.responder(client_socket, {
             'type': 'atendimento_confirmado',
             'sala': sala
         })
 
-        self.broadcast_to_recepcao({
-            'type': 'queue_update',
-            'queue': self.fila_atendimento
-        })
+        self.broadcast_fila(sala)
 
         print(f"Atendimento confirmado para sala {sala}")
 
-    def send_fila_update_to_client(self, client_socket):
-        """Envia atualização da fila para cliente específico"""
-        self.send_message(client_socket, {
-            'type': 'queue_update',
-            'queue': self.fila_atendimento
-        })
+    def send_fila_update_to_client(self, client_socket, resposta=False, salas=None):
+        """Envia atualização da fila (só das salas assinadas) para cliente específico"""
+        mensagem = {'type': 'queue_update'}
+        if resposta and self.pedido_atual is not None:
+            mensagem['request_id'] = self.pedido_atual
+        self.send_message(client_socket, mensagem, prontos={'queue': self.fila_codificada(client_socket, salas)})
+
+    def fila_codificada(self, client_socket, salas):
+        """Fila das salas no codec do cliente, montada e codificada uma vez por versão da fila"""
+        codec = self.codecs.get(client_socket, protocolo.JSON)
+        fila, _ = self.filas_compartilhadas.obter(
+            (salas, codec.nome), self.fila_atendimento.versao,
+            lambda: codec.codificar_valor(para_mensagens(self.fila_atendimento.ordenada(salas))))
+        return fila
 
     def get_salas_formatadas(self):
         """Retorna lista formatada de salas para envio aos clientes"""
         salas_formatadas = []
         for sala, client_id in self.salas_conectadas.items():
-            client_info = self.clients.get(client_id, {})
+            client_info = self.clients.get(client_id)
             salas_formatadas.append({
                 'number': sala,
                 'connected': True,
                 'ip': client_id.split(':')[0] if ':' in client_id else 'N/A',
-                'medico': client_info.get('nome', 'N/A')
+                'medico': (client_info.nome if client_info else None) or 'N/A'
             })
         return salas_formatadas
 
-    def send_salas_conectadas_to_client(self, client_socket):
+    def send_salas_conectadas_to_client(self, client_socket, resposta=False):
         """Envia lista de salas conectadas para cliente específico"""
-        self.send_message(client_socket, {
+        enviar = self.responder if resposta else self.send_message
+        enviar(client_socket, {
             'type': 'rooms_update',
             'rooms': self.get_salas_formatadas()
         })
@@ -370,47 +519,37 @@ class HospitalServer:
             return
 
         # Procura na fila pelo ID
-        chamada_encontrada = None
-        for i, chamada in enumerate(self.fila_atendimento):
-            if chamada.get('id') == call_id and chamada['status'] == 'chamado':
-                chamada_encontrada = chamada
-                chamada['status'] = 'atendido'
-                chamada['fim_atendimento'] = datetime.now().strftime('%H:%M:%S')
-
-                # Move para histórico
-                self.historico.append(chamada)
-                self.fila_atendimento.pop(i)
-                break
-
+        chamada_encontrada = self.fila_atendimento.remover(call_id)
         if not chamada_encontrada:
             self.send_error(client_socket, "Chamada não encontrada ou já processada")
             return
+        chamada_encontrada.atender()
 
-        sala = chamada_encontrada['sala']
+        # Move para histórico
+        self.historico.append(chamada_encontrada)
+
+        sala = chamada_encontrada.sala
 
         # Notifica médico que pode chamar próximo
         if sala in self.salas_conectadas:
             medico_id = self.salas_conectadas[sala]
             if medico_id in self.clients:
-                self.send_message(self.clients[medico_id]['socket'], {
+                self.send_message(self.clients[medico_id].socket, {
                     'type': 'atendimento_confirmado',
                     'call_id': call_id,
-                    'paciente': chamada_encontrada['paciente'],
+                    'paciente': chamada_encontrada.paciente,
                     'sala': sala,
-                    'message': f'Atendimento do paciente {chamada_encontrada["paciente"]} confirmado'
+                    'message': f'Atendimento do paciente {chamada_encontrada.paciente} confirmado'
                 })
 
         # Confirma para a recepção
-        self.send_message(client_socket, {
+        self.responder(client_socket, {
             'type': 'call_confirmed',
             'call_id': call_id
         })
 
         # Atualiza todas as recepções
-        self.broadcast_to_recepcao({
-            'type': 'queue_update',
-            'queue': self.fila_atendimento
-        })
+        self.broadcast_fila(sala)
 
         print(f"Atendimento confirmado para ID {call_id} - Sala {sala}")
 
@@ -425,53 +564,112 @@ class HospitalServer:
             return
 
         # Procura e remove da fila
-        for i, chamada in enumerate(self.fila_atendimento):
-            if chamada.get('id') == call_id:
-                self.fila_atendimento.pop(i)
-
-                # Confirma remoção
-                self.send_message(client_socket, {
-                    'type': 'call_removed',
-                    'call_id': call_id
-                })
+        chamada = self.fila_atendimento.remover(call_id)
+        if chamada is None:
+            self.send_error(client_socket, "Chamada não encontrada")
+            return
 
-                # Atualiza todas as recepções
-                self.broadcast_to_recepcao({
-                    'type': 'queue_update',
-                    'queue': self.fila_atendimento
-                })
+        # Confirma remoção
+        self.responder(client_socket, {
+            'type': 'call_removed',
+            'call_id': call_id
+        })
 
-                print(f"Chamada ID {call_id} removida da fila")
-                return
+        # Atualiza todas as recepções
+        self.broadcast_fila(chamada.sala)
 
-        self.send_error(client_socket, "Chamada não encontrada")
+        print(f"Chamada ID {call_id} removida da fila")
+
+    def handle_assinar_salas(self, client_socket, client_id, message):
+        """Recepção troca as salas que acompanha; lista vazia volta a receber todas"""
+        if client_id not in self.recepcao_clients:
+            self.send_error(client_socket, "Apenas a recepção assina salas")
+            return
+        try:
+            salas = assinaturas.normalizar_salas(message.get('salas'), self.areas)
+        except ValueError as e:
+            self.send_error(client_socket, str(e))
+            return
+        self.assinaturas.assinar(client_id, salas)
+        self.responder(client_socket, {
+            'type': 'subscribed',
+            'salas': sorted(salas) if salas is not None else None
+        })
+        self.send_fila_update_to_client(client_socket, salas=salas)
 
     def broadcast_to_recepcao(self, message):
         """Envia mensagem para todos os clientes da recepção"""
-        for client_id in self.recepcao_clients[:]:  # cópia da lista
+        with self.metrica_broadcast.medir():
+            self._enviar_recepcoes(self.recepcao_clients[:], message)  # cópia da lista
+
+    def enviar_chamada_recepcao(self, chamada):
+        """Envia a nova chamada só às recepções que acompanham a sala dela"""
+        with self.metrica_broadcast.medir():
+            self._enviar_recepcoes(self.assinaturas.destinatarios(chamada.sala),
+                                   {'type': 'new_call', 'call': chamada.para_mensagem()})
+
+    def broadcast_fila(self, sala=None):
+        """Envia a fila às recepções, filtrada uma vez por conjunto de salas assinado.
+
+        Com `sala`, só às recepções que acompanham a sala que mudou.
+        """
+        with self.metrica_broadcast.medir():
+            for salas, client_ids in self.assinaturas.grupos().items():
+                if sala is not None and not assinaturas.na_assinatura(salas, sala):
+                    continue
+                for client_id in client_ids:
+                    if client_id not in self.clients:
+                        continue
+                    try:
+                        self.send_fila_update_to_client(self.clients[client_id].socket, salas=salas)
+                    except Exception as e:
+                        print(f"Erro ao enviar fila para recepção {client_id}: {e}")
+                        if client_id in self.recepcao_clients:
+                            self.recepcao_clients.remove(client_id)
+                        self.assinaturas.cancelar(client_id)
+
+    def _enviar_recepcoes(self, client_ids, message):
+        for client_id in client_ids:
             if client_id in self.clients:
                 try:
-                    self.send_message(self.clients[client_id]['socket'], message)
+                    self.send_message(self.clients[client_id].socket, message)
                     print(f"Mensagem enviada para recepção {client_id}: {message}")
                 except Exception as e:
                     print(f"Erro ao enviar para recepção {client_id}: {e}")
-                    self.recepcao_clients.remove(client_id)
+                    if client_id in self.recepcao_clients:
+                        self.recepcao_clients.remove(client_id)
+                    self.assinaturas.cancelar(client_id)
+
+    def send_message(self, client_socket, message, prontos=None):
+        """Envia mensagem para cliente na codificação negociada (JSON por padrão).
 
-    def send_message(self, client_socket, message):
-        """Envia mensagem JSON para cliente"""
+        prontos: campos já codificados no codec do cliente, acrescentados à mensagem.
+        """
+        inicio = time.perf_counter()
         try:
-            data = json.dumps(message, ensure_ascii=False).encode('utf-8')
-            # CORREÇÃO 5: Adicionar newline para delimitar mensagens
-            data += b'\n'
-            client_socket.send(data)
+            # CORREÇÃO 5: o codec já delimita a mensagem (newline ou tamanho)
+            codec = self.codecs.get(client_socket, protocolo.JSON)
+            data = codec.codificar(message, prontos)
+            client_socket.sendall(data)
+            self.metrica_enviadas.rotulos(message.get('type')).inc()
+            self.metrica_bytes.rotulos(codec.nome).inc(len(data))
             print(f"Mensagem enviada: {message}")
         except Exception as e:
+            self.metrica_erros_envio.inc()
             print(f"Erro ao enviar mensagem: {e}")
             raise  # Re-raise para que o chamador saiba que houve erro
+        finally:
+            self.metrica_envio.observar(time.perf_counter() - inicio)
+
+    def responder(self, client_socket, message):
+        """Envia a resposta ao pedido em processamento, com o request_id dele"""
+        if self.pedido_atual is not None:
+            message = dict(message, request_id=self.pedido_atual)
+        self.send_message(client_socket, message)
 
     def send_error(self, client_socket, error_message):
         """Envia mensagem de erro para cliente"""
-        self.send_message(client_socket, {
+        self.responder(client_socket, {
             'type': 'error',
             'message': error_message
         })
@@ -485,10 +683,11 @@ class HospitalServer:
                 # Remove da lista de recepção se necessário
                 if client_id in self.recepcao_clients:
                     self.recepcao_clients.remove(client_id)
+                self.assinaturas.cancelar(client_id)
 
                 # Remove sala se for médico
-                if client_info['sala'] and client_info['sala'] in self.salas_conectadas:
-                    sala = client_info['sala']
+                if client_info.sala and client_info.sala in self.salas_conectadas:
+                    sala = client_info.sala
                     del self.salas_conectadas[sala]
 
                     # Notifica recepção
@@ -503,7 +702,9 @@ class HospitalServer:
 
 
 if __name__ == "__main__":
-    server = HospitalServer()
+    # Métricas desligadas por padrão; METRICAS_HOST=0.0.0.0 expõe na rede (use METRICAS_TOKEN)
+    server = HospitalServer(metricas_porta=int(os.getenv('METRICAS_PORTA', '0')) or None,
+                            metricas_host=os.getenv('METRICAS_HOST', '127.0.0.1'))
     try:
         server.start()
     except KeyboardInterrupt:
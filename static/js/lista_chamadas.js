@@ -0,0 +1,94 @@
+/*
+ * Sistema de Chamada Hospitalar - Lista com chave
+ * Renderização incremental das listas de chamadas: cada chamada mantém o seu
+ * nó pelo id, só os nós novos são criados/animados e os removidos são
+ * reaproveitados em vez de recriados.
+ */
+(function (global) {
+    'use strict';
+
+    class ListaChaveada {
+        /**
+         * container: elemento pai da lista
+         * opcoes.chave(item): identificador estável do item
+         * opcoes.criar(): cria um nó vazio (esqueleto)
+         * opcoes.preencher(no, item): escreve os dados do item no nó
+         * opcoes.classeNovo: classe aplicada só aos nós que entram na lista
+         */
+        constructor(container, opcoes) {
+            this.container = container;
+            this.chave = opcoes.chave;
+            this.criar = opcoes.criar;
+            this.preencher = opcoes.preencher;
+            this.classeNovo = opcoes.classeNovo || null;
+            this.limitePool = opcoes.limitePool || 20;
+            this.nos = new Map();     // {chave: nó}
+            this.versoes = new Map(); // {chave: item renderizado}
+            this.pool = [];
+        }
+
+        _obterNo() {
+            return this.pool.pop() || this.criar();
+        }
+
+        _liberar(chave, no) {
+            this.container.removeChild(no);
+            this.nos.delete(chave);
+            this.versoes.delete(chave);
+            if (this.classeNovo) {
+                no.classList.remove(this.classeNovo);
+            }
+            if (this.pool.length < this.limitePool) {
+                this.pool.push(no);
+            }
+        }
+
+        /** Deixa a lista igual a `itens`, mexendo só nos nós que mudaram */
+        renderizar(itens, animar = true) {
+            const chaves = new Set();
+            for (const item of itens) {
+                chaves.add(this.chave(item));
+            }
+            // Remove primeiro o que saiu, para que os nós voltem ao pool
+            for (const [chave, no] of Array.from(this.nos)) {
+                if (!chaves.has(chave)) {
+                    this._liberar(chave, no);
+                }
+            }
+
+            let referencia = this.container.firstChild;
+            for (const item of itens) {
+                const chave = this.chave(item);
+                let no = this.nos.get(chave);
+                if (!no) {
+                    no = this._obterNo();
+                    this.preencher(no, item);
+                    this.nos.set(chave, no);
+                    this.versoes.set(chave, item);
+                    if (animar && this.classeNovo) {
+                        no.classList.add(this.classeNovo);
+                    }
+                } else if (this.versoes.get(chave) !== item) {
+                    this.preencher(no, item);
+                    this.versoes.set(chave, item);
+                }
+                if (no !== referencia) {
+                    this.container.insertBefore(no, referencia);
+                } else {
+                    referencia = referencia.nextSibling;
+                }
+            }
+        }
+
+        limpar() {
+            for (const [chave, no] of Array.from(this.nos)) {
+                this._liberar(chave, no);
+            }
+        }
+    }
+
+    global.ListaChaveada = ListaChaveada;
+    if (typeof module !== 'undefined' && module.exports) {
+        module.exports = ListaChaveada;
+    }
+})(typeof window !== 'undefined' ? window : globalThis);
@@ -0,0 +1,84 @@
+/*
+ * Sistema de Chamada Hospitalar - Relógio do servidor
+ * Estima, no estilo NTP, a diferença entre o relógio da tela e o do servidor
+ * pelo evento 'sincronizar_relogio'. Com ela todas as telas de uma sala de
+ * espera tocam a chamada no mesmo instante ("tocar_em", relógio do servidor).
+ */
+(function (global) {
+    'use strict';
+
+    class RelogioServidor {
+        /**
+         * opcoes.amostras: trocas por sincronização (fica a de menor atraso)
+         * opcoes.intervalo: ms entre sincronizações
+         */
+        constructor(socket, opcoes = {}) {
+            this.socket = socket;
+            this.amostras = opcoes.amostras || 8;
+            this.intervalo = opcoes.intervalo || 60000;
+            this.diferenca = 0;  // relógio do servidor - relógio local (ms)
+            this.atraso = null;  // ida e volta da melhor amostra (ms)
+            this.sincronizado = false;
+            this._timer = null;
+            this._sincronizando = false;
+            socket.on('connect', () => this.sincronizar());
+        }
+
+        _trocar() {
+            return new Promise((resolve) => {
+                // Sem resposta em 5 s a amostra é descartada
+                const limite = setTimeout(() => resolve(null), 5000);
+                const t0 = Date.now();
+                this.socket.emit('sincronizar_relogio', {}, (resposta) => {
+                    const t3 = Date.now();
+                    clearTimeout(limite);
+                    if (!resposta) {
+                        resolve(null);
+                        return;
+                    }
+                    const t1 = resposta.recebido_em;
+                    const t2 = resposta.enviado_em;
+                    resolve({
+                        diferenca: ((t1 - t0) + (t2 - t3)) / 2,
+                        atraso: (t3 - t0) - (t2 - t1)
+                    });
+                });
+            });
+        }
+
+        async sincronizar() {
+            if (this._sincronizando) {
+                return;
+            }
+            this._sincronizando = true;
+            clearTimeout(this._timer);
+            let melhor = null;
+            for (let i = 0; i < this.amostras && this.socket.connected; i++) {
+                const amostra = await this._trocar();
+                if (amostra && (melhor === null || amostra.atraso < melhor.atraso)) {
+                    melhor = amostra;
+                }
+            }
+            if (melhor) {
+                // A amostra de menor ida e volta é a que menos sofreu com a rede
+                this.diferenca = melhor.diferenca;
+                this.atraso = melhor.atraso;
+                this.sincronizado = true;
+            }
+            this._sincronizando = false;
+            this._timer = setTimeout(() => this.sincronizar(), this.intervalo);
+        }
+
+        // Agora, no relógio do servidor (ms)
+        agora() {
+            return Date.now() + this.diferenca;
+        }
+
+        // ms que faltam até o instante `instante` do relógio do servidor
+        ate(instante) {
+            return instante - this.agora();
+        }
+    }
+
+    global.RelogioServidor = RelogioServidor;
+})(window);
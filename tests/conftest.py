@@ -0,0 +1,43 @@
+import os
+import sys
+
+# Os módulos ficam na raiz do repositório, sem pacote
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+# Unidade ativa criada por criar_dados_iniciais (UPA Noroeste)
+UNIDADE = 9
+
+
+@pytest.fixture(scope='session')
+def modulo_app(tmp_path_factory):
+    """app.py num banco temporário, sem arquivador nem gateway TCP"""
+    pasta = tmp_path_factory.mktemp('app')
+    os.environ['DATABASE_URL'] = f"sqlite:///{pasta / 'hospital.db'}"
+    os.environ['ARQUIVO_DIAS'] = '0'
+    os.environ.pop('GATEWAY_TCP_PORTA', None)
+    import app
+    app.criar_dados_iniciais()
+    return app
+
+
+@pytest.fixture
+def conectar(modulo_app):
+    """conectar(papel, auth=None) -> cliente Socket.IO logado na UNIDADE com esse papel"""
+    clientes = []
+
+    def conectar(papel, auth=None):
+        http = modulo_app.app.test_client()
+        with http.session_transaction() as sessao:
+            sessao['servidor_id'] = UNIDADE
+        http.post('/login', data={'role': papel})
+        cliente = modulo_app.socketio.test_client(modulo_app.app, flask_test_client=http, auth=auth)
+        clientes.append(cliente)
+        return cliente
+
+    yield conectar
+    for cliente in clientes:
+        if cliente.is_connected():
+            cliente.disconnect()
+
@@ -0,0 +1,173 @@
+import pytest
+
+from conftest import UNIDADE
+from estado import CAPACIDADE_CHAT
+
+
+def eventos(cliente, nome):
+    """Argumentos dos eventos `nome` recebidos desde a última leitura"""
+    return [recebido['args'] for recebido in cliente.get_received() if recebido['name'] == nome]
+
+
+def chamar(medico, sala, paciente='Paciente', **extra):
+    return medico.emit('chamar_paciente', dict(paciente=paciente, sala=sala, cor='verde', **extra), callback=True)
+
+
+def test_nova_chamada_vai_a_todos_os_medicos_da_unidade(conectar):
+    medico = conectar('medico')
+    outro = conectar('medico')
+    medico.get_received(), outro.get_received()
+    # Sala digitada sem "atualizar sala": nenhum médico está na sala de socket dela
+    resposta = chamar(medico, 'sala-x')
+    assert 'id' in resposta
+    for cliente in (medico, outro):
+        ids = [args[0]['id'] for args in eventos(cliente, 'nova_chamada')]
+        assert ids == [resposta['id']]
+
+
+def test_recepcao_recebe_so_as_salas_assinadas(conectar):
+    medico = conectar('medico')
+    filtrada = conectar('recepcao', auth={'salas': ['1']})
+    todas = conectar('recepcao')
+    filtrada.get_received(), todas.get_received()
+    chamar(medico, '1', 'Ana')
+    chamar(medico, '2', 'Bia')
+    assert [a[0]['paciente'] for a in eventos(filtrada, 'nova_chamada')] == ['Ana']
+    assert [a[0]['paciente'] for a in eventos(todas, 'nova_chamada')] == ['Ana', 'Bia']
+
+
+def test_salas_fora_das_areas_sao_recusadas(conectar, modulo_app, monkeypatch):
+    monkeypatch.setattr(modulo_app, 'AREAS_ESPERA', {'terreo': frozenset({'1', '2'})})
+    assert not conectar('recepcao', auth={'salas': ['99']}).is_connected()
+    recepcao = conectar('recepcao', auth={'salas': ['terreo']})
+    assert recepcao.is_connected()
+    assert recepcao.emit('assinar_salas', {'salas': 'x' * 1000}, callback=True)['erro']
+    assert recepcao.emit('assinar_salas', {'salas': ['2']}, callback=True) == {'salas': ['2']}
+
+
+def test_limite_do_chat_e_por_conexao(conectar):
+    primeiro = conectar('medico')
+    segundo = conectar('medico')
+    for i in range(CAPACIDADE_CHAT + 1):
+        primeiro.emit('chat_mensagem', {'mensagem': f'oi {i}'})
+    assert eventos(primeiro, 'chat_erro')
+    # O outro médico entrou com o mesmo usuário, mas tem o próprio balde
+    segundo.get_received()
+    segundo.emit('chat_mensagem', {'mensagem': 'tudo bem?'})
+    assert not eventos(segundo, 'chat_erro')
+
+
+@pytest.mark.parametrize('dados', [None, 'texto', ['lista'], {'mensagem': 5}, {'mensagem': None}, {}])
+def test_chat_ignora_dados_invalidos(conectar, dados):
+    medico = conectar('medico')
+    medico.get_received()
+    medico.emit('chat_mensagem', dados)
+    assert medico.is_connected()
+    assert not eventos(medico, 'chat_mensagem') and not eventos(medico, 'chat_erro')
+
+
+def test_get_fila_reaproveita_o_snapshot_da_versao(conectar, modulo_app):
+    medico = conectar('medico')
+    chamar(medico, '41', 'Eva')
+    telas = [conectar('recepcao', auth={'salas': ['41']}) for _ in range(3)]
+    antes = modulo_app.cache_filas.resumo()
+    for tela in telas:
+        tela.get_received()
+        tela.emit('get_fila')
+    filas = [eventos(tela, 'fila_atual')[0] for tela in telas]
+    depois = modulo_app.cache_filas.resumo()
+    assert depois['calculados'] == antes['calculados']
+    assert depois['compartilhados'] == antes['compartilhados'] + 3
+    assert all(f == filas[0] for f in filas)
+    chamadas, sequencia = filas[0]
+    assert [c['paciente'] for c in chamadas] == ['Eva']
+    assert sequencia['seq'] == modulo_app.estado_da_unidade(UNIDADE).sequencia_atual(f'recepcao_{UNIDADE}')['seq']
+
+
+def test_conexao_recusada_nao_conta_como_cliente(conectar, modulo_app):
+    clientes = modulo_app.metrica_clientes.rotulos('recepcao')
+    antes = clientes.valor()
+    assert not conectar('recepcao', auth={'salas': 12}).is_connected()
+    assert clientes.valor() == antes
+    tela = conectar('recepcao')
+    assert clientes.valor() == antes + 1
+    tela.disconnect()
+    assert clientes.valor() == antes
+
+
+@pytest.mark.parametrize('limite, status', [('abc', 400), ('5', 200), ('-3', 200)])
+def test_api_rastreio_valida_o_limite(modulo_app, limite, status):
+    http = modulo_app.app.test_client()
+    with http.session_transaction() as sessao:
+        sessao['servidor_id'] = UNIDADE
+    http.post('/login', data={'role': 'recepcao'})
+    resposta = http.get(f'/api/rastreio?limite={limite}')
+    assert resposta.status_code == status
+    if status == 200:
+        assert set(resposta.get_json()) == {'estagios', 'recentes'}
+
+
+def test_reconexao_recebe_so_os_eventos_perdidos(conectar):
+    medico = conectar('medico')
+    tela = conectar('recepcao')
+    _, sequencia = eventos(tela, 'fila_atual')[0]
+    tela.disconnect()
+    chamar(medico, '51', 'Perdida 1')
+    chamar(medico, '52', 'Perdida 2')
+    de_volta = conectar('recepcao', auth={'ultimo_seq': sequencia['seq'], 'epoca': sequencia['epoca']})
+    recebidos = de_volta.get_received()
+    assert [r['name'] for r in recebidos] == ['nova_chamada', 'nova_chamada']
+    assert [r['args'][0]['paciente'] for r in recebidos] == ['Perdida 1', 'Perdida 2']
+    assert [r['args'][0]['seq'] for r in recebidos] == [sequencia['seq'] + 1, sequencia['seq'] + 2]
+    # Com filtro de salas, o replay também é filtrado
+    filtrada = conectar('recepcao', auth={'ultimo_seq': sequencia['seq'], 'epoca': sequencia['epoca'],
+                                          'salas': ['52']})
+    assert [a[0]['paciente'] for a in eventos(filtrada, 'nova_chamada')] == ['Perdida 2']
+
+
+@pytest.mark.parametrize('auth', [
+    {'ultimo_seq': 'abc', 'epoca': 'x'},
+    {'ultimo_seq': 0, 'epoca': 'execucao-anterior'},
+    {'ultimo_seq': 10 ** 9},
+])
+def test_reconexao_sem_replay_possivel_recebe_snapshot(conectar, auth):
+    tela = conectar('recepcao', auth=auth)
+    assert tela.is_connected()
+    assert [r['name'] for r in tela.get_received()] == ['fila_atual']
+
+
+def test_chamar_paciente_repetido_grava_e_anuncia_uma_vez(conectar):
+    medico = conectar('medico')
+    tela = conectar('recepcao')
+    tela.get_received()
+    primeira = chamar(medico, '61', 'Gabi', idempotency_key='clique-61')
+    repetida = chamar(medico, '61', 'Gabi', idempotency_key='clique-61')
+    assert repetida == dict(primeira, repetida=True)
+    assert [a[0]['id'] for a in eventos(tela, 'nova_chamada')] == [primeira['id']]
+    # Outra chave (ou nenhuma) é outra chamada
+    assert chamar(medico, '61', 'Gabi', idempotency_key='clique-62')['id'] != primeira['id']
+    assert chamar(medico, '61', 'Gabi')['id'] != primeira['id']
+
+
+def test_assinar_salas_troca_as_salas_da_tela(conectar):
+    medico = conectar('medico')
+    tela = conectar('recepcao', auth={'salas': ['71']})
+    tela.get_received()
+    assert tela.emit('assinar_salas', {'salas': '72, 73'}, callback=True) == {'salas': ['72', '73']}
+    assert eventos(tela, 'fila_atual')
+    for sala in ('71', '72', '73'):
+        chamar(medico, sala, f'Sala {sala}')
+    assert [a[0]['sala'] for a in eventos(tela, 'nova_chamada')] == ['72', '73']
+    # Vazio volta a acompanhar todas as salas
+    assert tela.emit('assinar_salas', {'salas': ''}, callback=True) == {'salas': None}
+    tela.get_received()
+    chamar(medico, '71', 'De novo')
+    assert [a[0]['sala'] for a in eventos(tela, 'nova_chamada')] == ['71']
+
+
+@pytest.mark.parametrize('dados', [None, 'texto', {'salas': 5}])
+def test_assinar_salas_com_dados_invalidos(conectar, dados):
+    tela = conectar('recepcao')
+    resposta = tela.emit('assinar_salas', dados, callback=True)
+    assert not resposta or 'erro' in resposta
+    assert tela.is_connected()
@@ -0,0 +1,65 @@
+import pytest
+
+from assinaturas import MAXIMO_SALAS, TAMANHO_MAXIMO_SALA, Assinaturas, ler_areas, na_assinatura, normalizar_salas
+
+
+def test_ler_areas():
+    assert ler_areas('Terreo=1, 2;ortopedia=7;;vazia=') == {
+        'terreo': frozenset({'1', '2'}), 'ortopedia': frozenset({'7'})}
+    assert ler_areas(None) == {}
+
+
+def test_normalizar_salas():
+    areas = {'terreo': frozenset({'1', '2'})}
+    assert normalizar_salas('terreo, 2', areas) == frozenset({'1', '2'})
+    assert normalizar_salas([3, '4']) == frozenset({'3', '4'})
+    assert normalizar_salas('', areas) is None
+    assert normalizar_salas(None, areas) is None
+    with pytest.raises(ValueError):
+        normalizar_salas(12, areas)
+
+
+def test_salas_fora_das_areas_configuradas():
+    areas = {'terreo': frozenset({'1', '2'}), 'ortopedia': frozenset({'7'})}
+    assert normalizar_salas('1, ortopedia', areas) == frozenset({'1', '7'})
+    with pytest.raises(ValueError, match='área'):
+        normalizar_salas('1, 9', areas)
+
+
+def test_limites_da_assinatura():
+    with pytest.raises(ValueError):
+        normalizar_salas('x' * (TAMANHO_MAXIMO_SALA + 1))
+    assert len(normalizar_salas([str(i) for i in range(MAXIMO_SALAS)])) == MAXIMO_SALAS
+    with pytest.raises(ValueError):
+        normalizar_salas([str(i) for i in range(MAXIMO_SALAS + 1)])
+
+
+def test_na_assinatura():
+    assert na_assinatura(None, 3)
+    assert na_assinatura(frozenset({'3'}), 3)
+    assert not na_assinatura(frozenset({'3'}), 4)
+
+
+def test_destinatarios_e_grupos():
+    indice = Assinaturas()
+    indice.assinar('todas')
+    indice.assinar('a', frozenset({'1', '2'}))
+    indice.assinar('b', frozenset({'1', '2'}))
+    indice.assinar('c', frozenset({'7'}))
+    assert indice.destinatarios(1) == {'todas', 'a', 'b'}
+    assert indice.destinatarios('7') == {'todas', 'c'}
+    assert indice.destinatarios(9) == {'todas'}
+    assert sorted(indice.grupos()[frozenset({'1', '2'})]) == ['a', 'b']
+
+
+def test_trocar_e_cancelar():
+    indice = Assinaturas()
+    indice.assinar('a', frozenset({'1'}))
+    indice.assinar('a', frozenset({'2'}))
+    assert indice.destinatarios(1) == set()
+    assert indice.salas_de('a') == frozenset({'2'})
+    indice.cancelar('a')
+    indice.cancelar('a')
+    assert 'a' not in indice
+    assert len(indice) == 0
+    assert indice.destinatarios(2) == set()
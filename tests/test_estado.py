@@ -0,0 +1,80 @@
+import pytest
+
+from estado import (CAPACIDADE_CHAT, EPOCA, IDADE_MAXIMA_REPLAY, JANELA_LOTE_CHAT, LIMITE_REPLAY, TAXA_CHAT,
+                    BaldeTokens, EstadoUnidade)
+
+
+def test_balde_de_tokens():
+    balde = BaldeTokens(capacidade=2, taxa=1)
+    assert balde.consumir(0) and balde.consumir(0)
+    assert not balde.consumir(0.5)
+    assert balde.consumir(1.0)
+    # A reposição não passa da capacidade
+    assert balde.consumir(100) and balde.consumir(100)
+    assert not balde.consumir(100)
+
+
+def test_limite_de_chat_por_remetente():
+    estado = EstadoUnidade(1)
+    for _ in range(CAPACIDADE_CHAT):
+        assert estado.pode_enviar_chat('a', 0)
+    assert not estado.pode_enviar_chat('a', 0)
+    assert estado.pode_enviar_chat('b', 0)
+    assert estado.pode_enviar_chat('a', 1 / TAXA_CHAT)
+    assert estado.resumo()['contadores']['chat_limitadas'] == 1
+    estado.esquecer_remetente('a')
+    estado.esquecer_remetente('a')
+    assert 'a' not in estado.limitadores_chat
+
+
+def test_chat_agrupado_dentro_da_janela():
+    estado = EstadoUnidade(1)
+    assert estado.publicar_chat({'m': 1}, 0) == 'imediato'
+    assert estado.publicar_chat({'m': 2}, JANELA_LOTE_CHAT / 4) == 'agendar'
+    assert estado.publicar_chat({'m': 3}, JANELA_LOTE_CHAT / 2) is None
+    assert estado.retirar_lote_chat(JANELA_LOTE_CHAT) == [{'m': 2}, {'m': 3}]
+    assert estado.retirar_lote_chat(JANELA_LOTE_CHAT) == []
+    assert estado.publicar_chat({'m': 4}, 3 * JANELA_LOTE_CHAT) == 'imediato'
+    assert [m['m'] for m in estado.historico_chat()] == [1, 2, 3, 4]
+
+
+def registrar(estado, quantidade, agora=0):
+    return [estado.registrar_evento('recepcao_1', 'nova_chamada', {'id': i}, agora=agora)
+            for i in range(quantidade)]
+
+
+def test_eventos_numerados_por_sala_de_socket():
+    estado = EstadoUnidade(1)
+    dados = registrar(estado, 3)
+    assert [d['seq'] for d in dados] == [1, 2, 3]
+    assert {d['epoca'] for d in dados} == {EPOCA}
+    assert estado.registrar_evento('medico_1', 'nova_chamada', {})['seq'] == 1
+    assert estado.sequencia_atual('recepcao_1') == {'seq': 3, 'epoca': EPOCA}
+
+
+def test_eventos_desde_devolve_so_os_perdidos():
+    estado = EstadoUnidade(1)
+    registrar(estado, 5)
+    perdidos = estado.eventos_desde('recepcao_1', 3, EPOCA, agora=1)
+    assert [(evento, dados['seq']) for evento, dados in perdidos] == [('nova_chamada', 4), ('nova_chamada', 5)]
+    assert estado.eventos_desde('recepcao_1', 5, EPOCA, agora=1) == []
+
+
+@pytest.mark.parametrize('ultimo_seq, epoca', [
+    (None, EPOCA),  # Primeira conexão
+    (2, 'outra-execucao'),  # Servidor reiniciou: números de outra época
+    (9, EPOCA),  # Número à frente do servidor
+    ('abc', EPOCA), ([1], EPOCA), (float('inf'), EPOCA),  # Lixo vindo do auth
+])
+def test_eventos_desde_pede_snapshot(ultimo_seq, epoca):
+    estado = EstadoUnidade(1)
+    registrar(estado, 5)
+    assert estado.eventos_desde('recepcao_1', ultimo_seq, epoca, agora=1) is None
+
+
+def test_eventos_que_sairam_do_log_ou_velhos_pedem_snapshot():
+    estado = EstadoUnidade(1)
+    registrar(estado, LIMITE_REPLAY + 5)
+    assert estado.eventos_desde('recepcao_1', 2, EPOCA, agora=1) is None
+    assert len(estado.eventos_desde('recepcao_1', 10, EPOCA, agora=1)) == LIMITE_REPLAY - 5
+    assert estado.eventos_desde('recepcao_1', 10, EPOCA, agora=IDADE_MAXIMA_REPLAY + 1) is None
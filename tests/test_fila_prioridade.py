@@ -0,0 +1,149 @@
+import random
+
+from fila_prioridade import TEMPO_ALVO, FilaPrioridade
+from registros import ChamadaFila
+
+
+def nova(fila, id, cor, agora, sala=1):
+    return fila.inserir(ChamadaFila(id, sala, f'Paciente {id}', cor), agora=agora)
+
+
+def ids(chamadas):
+    return [c.id for c in chamadas]
+
+
+def test_ordem_pela_cor():
+    fila = FilaPrioridade()
+    for i, cor in enumerate(['azul', 'verde', 'vermelho', 'amarelo', 'laranja']):
+        nova(fila, i, cor, agora=0)
+    assert ids(fila.ordenada()) == [2, 4, 3, 1, 0]
+    assert fila.proxima().id == 2
+
+
+def test_mesma_cor_por_ordem_de_chegada():
+    fila = FilaPrioridade()
+    for i in range(5):
+        nova(fila, i, 'verde', agora=0)
+    assert ids(fila.ordenada()) == [0, 1, 2, 3, 4]
+
+
+def test_envelhecimento_azul_antigo_passa_o_vermelho_novo():
+    fila = FilaPrioridade()
+    nova(fila, 'azul', 'azul', agora=0)
+    nova(fila, 'vermelho', 'vermelho', agora=TEMPO_ALVO['azul'] + 1)
+    assert ids(fila.ordenada()) == ['azul', 'vermelho']
+    assert fila.retirar().id == 'azul'
+
+
+def test_cor_desconhecida_vale_como_cinza():
+    fila = FilaPrioridade()
+    nova(fila, 1, 'roxo', agora=0)
+    nova(fila, 2, 'verde', agora=0)
+    assert ids(fila.ordenada()) == [2, 1]
+
+
+def test_remover_por_id():
+    fila = FilaPrioridade()
+    for i, cor in enumerate(['vermelho', 'laranja', 'verde']):
+        nova(fila, i, cor, agora=0)
+    assert fila.remover(1).id == 1
+    assert fila.remover(1) is None
+    assert ids(fila.ordenada()) == [0, 2]
+    assert fila.get(1) is None
+    assert len(fila) == 2
+
+
+def test_remover_o_topo_limpa_o_heap():
+    fila = FilaPrioridade()
+    nova(fila, 1, 'vermelho', agora=0)
+    nova(fila, 2, 'verde', agora=0)
+    fila.remover(1)
+    assert fila.proxima().id == 2
+    assert fila.retirar().id == 2
+    assert fila.retirar() is None
+    assert not fila
+
+
+def test_remover_da_sala_tira_a_mais_antiga():
+    fila = FilaPrioridade()
+    nova(fila, 1, 'verde', agora=0, sala=5)
+    nova(fila, 2, 'vermelho', agora=1, sala=5)
+    nova(fila, 3, 'verde', agora=2, sala=6)
+    assert fila.remover_da_sala(5).id == 1
+    assert fila.remover_da_sala(5).id == 2
+    assert fila.remover_da_sala(5) is None
+    assert ids(fila.ordenada()) == [3]
+
+
+def test_ordenada_por_salas():
+    fila = FilaPrioridade()
+    nova(fila, 1, 'verde', agora=0, sala=1)
+    nova(fila, 2, 'vermelho', agora=0, sala=2)
+    nova(fila, 3, 'laranja', agora=0, sala=1)
+    nova(fila, 4, 'amarelo', agora=0, sala=3)
+    assert ids(fila.ordenada(frozenset({'1', '3'}))) == [3, 4, 1]
+    assert ids(fila.ordenada(frozenset({'9'}))) == []
+
+
+def test_versao_muda_com_insercao_e_remocao():
+    fila = FilaPrioridade()
+    versao = fila.versao
+    nova(fila, 1, 'verde', agora=0)
+    assert fila.versao != versao
+    versao = fila.versao
+    fila.remover(2)
+    assert fila.versao == versao
+    fila.remover(1)
+    assert fila.versao != versao
+
+
+def test_compacta_o_heap_depois_de_muitas_remocoes():
+    fila = FilaPrioridade()
+    for i in range(500):
+        nova(fila, i, 'verde', agora=i)
+    # Remove do fim: as entradas mortas não chegam ao topo e ficam no heap
+    for i in range(499, 9, -1):
+        fila.remover(i)
+    assert len(fila._heap) <= 2 * len(fila) + 64
+    assert ids(fila.ordenada()) == list(range(10))
+    assert ids(fila.retirar() for _ in range(10)) == list(range(10))
+
+
+def test_ordenada_igual_a_ordenar_do_zero():
+    gerador = random.Random(44)
+    fila = FilaPrioridade()
+    vivas = {}
+    for i in range(2000):
+        if vivas and gerador.random() < 0.4:
+            chamada_id = gerador.choice(list(vivas))
+            fila.remover(chamada_id)
+            del vivas[chamada_id]
+        else:
+            cor = gerador.choice(list(TEMPO_ALVO))
+            agora = i * 30
+            nova(fila, i, cor, agora=agora, sala=gerador.randrange(5))
+            vivas[i] = (agora + TEMPO_ALVO[cor], i)
+    assert ids(fila.ordenada()) == sorted(vivas, key=vivas.__getitem__)
+    assert fila.proxima().id == min(vivas, key=vivas.__getitem__)
+
+
+def test_ordenada_acompanha_cada_versao():
+    fila = FilaPrioridade()
+    nova(fila, 1, 'verde', agora=0)
+    assert ids(fila.ordenada()) == [1]
+    nova(fila, 2, 'vermelho', agora=0)
+    assert ids(fila.ordenada()) == [2, 1]
+    fila.ordenada().clear()  # A cópia devolvida não mexe na fila
+    fila.remover(2)
+    assert ids(fila.ordenada()) == [1]
+
+
+def test_id_reinserido_depois_de_removido():
+    fila = FilaPrioridade()
+    nova(fila, 1, 'vermelho', agora=0)
+    nova(fila, 2, 'verde', agora=0)
+    fila.remover(1)
+    # A entrada antiga do id 1 ainda está no heap, com o prazo de vermelho
+    nova(fila, 1, 'azul', agora=0)
+    assert ids(fila.ordenada()) == [2, 1]
+    assert fila.retirar().id == 2
@@ -0,0 +1,103 @@
+import itertools
+import socket
+import threading
+
+import pytest
+
+import protocolo
+from gateway_tcp import TIMEOUT_ENVIO, _ClienteTCP
+from conftest import UNIDADE
+
+_portas = itertools.count(1)
+
+
+class ClienteTk:
+    """Ponta de um cliente Tk ligada ao gateway por um socketpair, sem abrir porta"""
+
+    def __init__(self, gateway):
+        self.socket, conexao = socket.socketpair()
+        self.socket.settimeout(5)
+        conexao.settimeout(TIMEOUT_ENVIO)
+        cliente = _ClienteTCP(conexao, ('teste', next(_portas)))
+        threading.Thread(target=gateway._escrever, args=(cliente,), daemon=True).start()
+        threading.Thread(target=gateway._atender, args=(cliente,), daemon=True).start()
+        self.leitor = protocolo.LeitorMensagens(protocolo.TAMANHO_MAXIMO_RESPOSTA)
+        self.pedidos = itertools.count(1)
+
+    def enviar_bytes(self, dados):
+        self.socket.sendall(dados)
+
+    def pedir(self, mensagem):
+        """Envia com request_id e espera a resposta a esse pedido"""
+        request_id = next(self.pedidos)
+        self.enviar_bytes(protocolo.JSON.codificar(dict(mensagem, request_id=request_id)))
+        return self.esperar(lambda m: m.get('request_id') == request_id)
+
+    def esperar(self, condicao):
+        while True:
+            mensagem = self.leitor.proxima()
+            if mensagem is None:
+                dados = self.socket.recv(65536)
+                assert dados, 'gateway fechou a conexão'
+                self.leitor.alimentar(dados)
+            elif condicao(mensagem):
+                return mensagem
+
+    def fechar(self):
+        self.socket.close()
+
+
+@pytest.fixture
+def tk(modulo_app):
+    clientes = []
+
+    def conectar(tipo, **extra):
+        cliente = ClienteTk(modulo_app.gateway_tcp)
+        clientes.append(cliente)
+        resposta = cliente.pedir(dict(type='register', client_type=tipo, servidor_id=UNIDADE, **extra))
+        assert resposta['type'] == 'register_success'
+        return cliente
+
+    yield conectar
+    for cliente in clientes:
+        cliente.fechar()
+
+
+@pytest.mark.parametrize('quadro', [
+    bytes([protocolo.MARCADOR_COMPACTO, 2, 0x04, 0x00]),  # Real truncado
+    protocolo.JSON.codificar([1, 2]),  # JSON que não é objeto
+    b'{nao e json\n',
+])
+def test_quadro_invalido_nao_derruba_o_cliente(tk, quadro):
+    recepcao = tk('recepcao')
+    recepcao.enviar_bytes(quadro)
+    assert recepcao.esperar(lambda m: m['type'] == 'error')['message'] == 'Formato de mensagem inválido'
+    assert recepcao.pedir({'type': 'get_rooms'})['type'] == 'rooms_update'
+
+
+def test_erro_ao_processar_nao_derruba_o_cliente(tk, modulo_app, monkeypatch):
+    def banco_fora(*args):
+        raise RuntimeError('banco fora do ar')
+
+    monkeypatch.setattr(modulo_app.gateway_tcp, 'publicar_chamada', banco_fora)
+    medico = tk('medico')
+    assert medico.pedir({'type': 'login_medico', 'sala': '31', 'nome': 'Dra. Ana'})['success']
+    resposta = medico.pedir({'type': 'chamar_paciente', 'paciente': 'Bia', 'cor': 'verde'})
+    assert resposta == {'type': 'error', 'message': 'Erro ao processar a mensagem', 'request_id': resposta['request_id']}
+    assert medico.pedir({'type': 'get_rooms'})['type'] == 'rooms_update'
+
+
+def test_chamadas_da_web_e_do_tk_chegam_na_recepcao_tk(tk, conectar):
+    recepcao = tk('recepcao', salas=['32'])
+    web = conectar('medico')
+    web.emit('chamar_paciente', {'paciente': 'Caio', 'sala': '32', 'cor': 'amarelo'}, callback=True)
+    web.emit('chamar_paciente', {'paciente': 'Outra sala', 'sala': '33', 'cor': 'verde'}, callback=True)
+    medico = tk('medico')
+    medico.pedir({'type': 'login_medico', 'sala': '32', 'nome': 'Dr. Davi'})
+    confirmacao = medico.pedir({'type': 'chamar_paciente', 'paciente': 'Duda', 'cor': 'vermelho'})
+    assert confirmacao['type'] == 'chamada_confirmada'
+    pacientes = [recepcao.esperar(lambda m: m['type'] == 'new_call')['call']['paciente'] for _ in range(2)]
+    assert pacientes == ['Caio', 'Duda']
+    fila = recepcao.pedir({'type': 'get_queue'})['queue']
+    assert [c['paciente'] for c in fila][:2] == ['Duda', 'Caio']
+    assert {c['sala'] for c in fila} == {'32'}
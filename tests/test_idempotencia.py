@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+
+from idempotencia import TAMANHO_MAXIMO_CHAVE, CacheIdempotencia, chave_valida
+
+
+def test_chave_valida():
+    assert chave_valida('a1b2')
+    assert chave_valida('x' * TAMANHO_MAXIMO_CHAVE)
+    for chave in ('', 'x' * (TAMANHO_MAXIMO_CHAVE + 1), 'com\nquebra', None, 12, ['k']):
+        assert not chave_valida(chave)
+
+
+def test_executa_uma_vez_por_chave():
+    cache = CacheIdempotencia()
+    execucoes = []
+
+    def chamar():
+        execucoes.append(1)
+        return {'id': len(execucoes)}
+
+    assert cache.executar('k', chamar) == ({'id': 1}, False)
+    assert cache.executar('k', chamar) == ({'id': 1}, True)
+    assert cache.executar('outra', chamar) == ({'id': 2}, False)
+    assert cache.repetidas == 1
+
+
+def test_falha_libera_a_chave():
+    cache = CacheIdempotencia()
+
+    def falhar():
+        raise RuntimeError('banco fora')
+
+    with pytest.raises(RuntimeError):
+        cache.executar('k', falhar)
+    assert cache.executar('k', lambda: 'ok') == ('ok', False)
+
+
+def test_chave_expira(monkeypatch):
+    agora = [0.0]
+    monkeypatch.setattr('idempotencia.time.monotonic', lambda: agora[0])
+    cache = CacheIdempotencia(validade=10)
+    cache.executar('k', lambda: 'primeira')
+    agora[0] = 11
+    assert cache.executar('k', lambda: 'segunda') == ('segunda', False)
+
+
+def test_limite_de_chaves():
+    cache = CacheIdempotencia(limite=2)
+    for chave in 'abc':
+        cache.executar(chave, lambda: chave)
+    cache.executar('d', lambda: 'd')
+    assert len(cache) <= 3
+    assert cache.executar('a', lambda: 'de novo') == ('de novo', False)
+
+
+def test_repeticao_durante_a_execucao_espera_o_resultado():
+    cache = CacheIdempotencia()
+    comecou = threading.Event()
+    liberar = threading.Event()
+    execucoes = []
+
+    def chamar():
+        execucoes.append(1)
+        comecou.set()
+        liberar.wait(5)
+        return 'gravada'
+
+    resultados = []
+    primeira = threading.Thread(target=lambda: resultados.append(cache.executar('k', chamar)))
+    primeira.start()
+    comecou.wait(5)
+    segunda = threading.Thread(target=lambda: resultados.append(cache.executar('k', chamar)))
+    segunda.start()
+    liberar.set()
+    primeira.join(5)
+    segunda.join(5)
+    assert len(execucoes) == 1
+    assert sorted(resultados) == [('gravada', False), ('gravada', True)]
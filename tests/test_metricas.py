@@ -0,0 +1,40 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+import metricas
+
+
+@pytest.fixture
+def registro():
+    registro = metricas.Registro()
+    registro.contador('chamadas_total', 'Chamadas').inc(3)
+    return registro
+
+
+def pedir(servidor, cabecalhos=None):
+    host, porta = servidor.server_address
+    pedido = urllib.request.Request(f'http://{host}:{porta}/metrics', headers=cabecalhos or {})
+    with urllib.request.urlopen(pedido, timeout=5) as resposta:
+        return resposta.read().decode('utf-8')
+
+
+def test_servir_http_escuta_so_localmente_por_padrao(registro):
+    servidor = metricas.servir_http(registro, 0)
+    try:
+        assert servidor.server_address[0] == '127.0.0.1'
+        assert 'chamada_hospitalar_chamadas_total 3' in pedir(servidor)
+    finally:
+        servidor.shutdown()
+
+
+def test_servir_http_com_token(registro):
+    servidor = metricas.servir_http(registro, 0, token='segredo')
+    try:
+        with pytest.raises(urllib.error.HTTPError) as erro:
+            pedir(servidor)
+        assert erro.value.code == 401
+        assert 'chamadas_total 3' in pedir(servidor, {'Authorization': 'Bearer segredo'})
+    finally:
+        servidor.shutdown()
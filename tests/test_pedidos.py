@@ -0,0 +1,84 @@
+import pytest
+
+from pedidos import ErroServidor, Pedidos
+
+
+class Agenda:
+    """Substitui o root.after: os prazos vencem quando o teste manda"""
+
+    def __init__(self):
+        self.pendentes = []
+
+    def __call__(self, segundos, funcao):
+        self.pendentes.append(funcao)
+
+    def vencer_todos(self):
+        while self.pendentes:
+            self.pendentes.pop(0)()
+
+
+def criar(enviar_ok=True):
+    enviados = []
+    agenda = Agenda()
+    pedidos = Pedidos(lambda m: enviados.append(m) or enviar_ok, tentativas=3, agendar=agenda)
+    return pedidos, enviados, agenda
+
+
+def test_resposta_casada_pelo_request_id():
+    pedidos, enviados, agenda = criar()
+    primeiro = pedidos.enviar({'type': 'get_queue'})
+    segundo = pedidos.enviar({'type': 'get_rooms'})
+    assert pedidos.resolver({'type': 'rooms_update', 'request_id': enviados[1]['request_id']})
+    assert pedidos.resolver({'type': 'queue_update', 'request_id': enviados[0]['request_id']})
+    assert primeiro.result()['type'] == 'queue_update'
+    assert segundo.result()['type'] == 'rooms_update'
+    agenda.vencer_todos()  # Prazo vencido depois da resposta não reenvia
+    assert len(enviados) == 2
+    assert len(pedidos) == 0
+
+
+def test_aviso_sem_request_id_nao_e_resposta():
+    pedidos, _, _ = criar()
+    assert not pedidos.resolver({'type': 'new_call'})
+    assert not pedidos.resolver({'type': 'queue_update', 'request_id': 99})
+
+
+def test_erro_do_servidor():
+    pedidos, enviados, _ = criar()
+    futuro = pedidos.enviar({'type': 'login_medico'})
+    pedidos.resolver({'type': 'error', 'message': 'Sala ocupada', 'request_id': enviados[0]['request_id']})
+    with pytest.raises(ErroServidor, match='Sala ocupada'):
+        futuro.result()
+
+
+@pytest.mark.parametrize('mensagem, envios', [
+    ({'type': 'get_queue'}, 3),
+    ({'type': 'register'}, 3),
+    ({'type': 'chamar_paciente', 'idempotency_key': 'k'}, 3),
+    ({'type': 'chamar_paciente'}, 1),
+    ({'type': 'confirm_call', 'call_id': 1}, 1),
+    ({'type': 'remove_call', 'call_id': 1}, 1),
+])
+def test_so_pedidos_idempotentes_sao_reenviados(mensagem, envios):
+    pedidos, enviados, agenda = criar()
+    futuro = pedidos.enviar(mensagem)
+    agenda.vencer_todos()
+    assert len(enviados) == envios
+    assert len({m['request_id'] for m in enviados}) == 1
+    with pytest.raises(TimeoutError):
+        futuro.result()
+
+
+def test_falha_ao_enviar():
+    pedidos, _, _ = criar(enviar_ok=False)
+    with pytest.raises(ConnectionError):
+        pedidos.enviar({'type': 'get_queue'}).result()
+
+
+def test_cancelar_todos():
+    pedidos, _, _ = criar()
+    futuros = [pedidos.enviar({'type': 'get_queue'}) for _ in range(3)]
+    pedidos.cancelar_todos()
+    for futuro in futuros:
+        with pytest.raises(ConnectionError):
+            futuro.result()
@@ -0,0 +1,132 @@
+import pytest
+
+import protocolo
+from protocolo import COMPACTO, JSON, LeitorMensagens
+
+CODECS = [JSON, COMPACTO]
+
+MENSAGENS = [
+    {'type': 'register', 'client_type': 'reception', 'codificacoes': ['compacto', 'json'], 'request_id': 1},
+    {'type': 'queue_update', 'queue': [], 'request_id': 2 ** 40},
+    {'type': 'new_call', 'call': {'id': 7, 'sala': '3', 'room': '3', 'paciente': 'José da Conceição',
+                                  'patient': 'José da Conceição', 'timestamp': '10:00:00',
+                                  'time': '10:00:00', 'cor': 'vermelho', 'trace_id': None}},
+    {'inteiros': [0, 127, 128, 300, -1, -2 ** 40], 'real': 1.5, 'logicos': [True, False],
+     'aninhado': {'lista': [{'a': None}]}, 'texto_novo': 'não está em VALORES'},
+]
+
+
+def ler(dados, limite=protocolo.TAMANHO_MAXIMO_QUADRO):
+    leitor = LeitorMensagens(limite)
+    leitor.alimentar(dados)
+    mensagens = []
+    while (mensagem := leitor.proxima()) is not None:
+        mensagens.append(mensagem)
+    return mensagens
+
+
+@pytest.mark.parametrize('codec', CODECS, ids=lambda c: c.nome)
+@pytest.mark.parametrize('mensagem', MENSAGENS)
+def test_ida_e_volta(codec, mensagem):
+    assert ler(codec.codificar(mensagem)) == [mensagem]
+
+
+def test_compacto_refaz_os_aliases():
+    assert ler(COMPACTO.codificar({'sala': '1', 'paciente': 'A'})) == [
+        {'sala': '1', 'room': '1', 'paciente': 'A', 'patient': 'A'}]
+
+
+def test_compacto_menor_que_json():
+    fila = {'type': 'queue_update', 'queue': [MENSAGENS[2]['call']] * 50}
+    assert len(COMPACTO.codificar(fila)) < len(JSON.codificar(fila)) / 2
+
+
+@pytest.mark.parametrize('codec', CODECS, ids=lambda c: c.nome)
+def test_campos_prontos_iguais_a_codificar_tudo(codec):
+    fila = [MENSAGENS[2]['call'], {'id': 8, 'sala': '4'}]
+    pronto = codec.codificar_valor(fila)
+    assert codec.codificar({'type': 'queue_update', 'request_id': 3}, {'queue': pronto}) == \
+        codec.codificar({'type': 'queue_update', 'request_id': 3, 'queue': fila})
+
+
+def test_formatos_misturados_e_quadros_partidos():
+    dados = JSON.codificar({'type': 'a'}) + b'\n\n' + COMPACTO.codificar({'type': 'b'}) + JSON.codificar({'type': 'c'})
+    leitor = LeitorMensagens()
+    recebidas = []
+    for i in range(len(dados)):
+        leitor.alimentar(dados[i:i + 1])
+        while (mensagem := leitor.proxima()) is not None:
+            recebidas.append(mensagem['type'])
+    assert recebidas == ['a', 'b', 'c']
+
+
+def test_muitas_linhas_em_branco_sem_recursao():
+    assert ler(b'\n' * 10000 + JSON.codificar({'type': 'a'})) == [{'type': 'a'}]
+
+
+def test_linha_invalida_descartada():
+    leitor = LeitorMensagens()
+    leitor.alimentar(b'{nao e json\n' + JSON.codificar({'type': 'a'}))
+    with pytest.raises(ValueError):
+        leitor.proxima()
+    assert leitor.proxima() == {'type': 'a'}
+
+
+def test_linha_sem_fim_acima_do_limite():
+    leitor = LeitorMensagens(limite=100)
+    leitor.alimentar(b'{' + b'a' * 100)
+    with pytest.raises(protocolo.QuadroMuitoGrande):
+        leitor.proxima()
+
+
+def test_quadro_compacto_acima_do_limite():
+    quadro = COMPACTO.codificar({'texto_novo': 'x' * 200})
+    leitor = LeitorMensagens(limite=100)
+    leitor.alimentar(quadro[:4])
+    with pytest.raises(protocolo.QuadroMuitoGrande):
+        leitor.proxima()
+
+
+def test_negociar():
+    assert protocolo.negociar(['compacto', 'json']) is COMPACTO
+    assert protocolo.negociar(['json']) is JSON
+    assert protocolo.negociar(['desconhecido']) is JSON
+    assert protocolo.negociar(None) is JSON
+
+
+def test_real_truncado_e_erro_de_protocolo():
+    corpo = bytes([0x04]) + b'\x00' * 3
+    leitor = LeitorMensagens()
+    leitor.alimentar(bytes([protocolo.MARCADOR_COMPACTO, len(corpo)]) + corpo + JSON.codificar({'type': 'a'}))
+    with pytest.raises(protocolo.ErroProtocolo):
+        leitor.proxima()
+    assert leitor.proxima() == {'type': 'a'}
+
+
+@pytest.mark.parametrize('codec', CODECS, ids=lambda c: c.nome)
+def test_aninhamento_profundo_e_erro_de_protocolo(codec):
+    if codec is COMPACTO:
+        corpo = bytes([0x06, 0x01]) * 5000 + bytes([0x00])
+        quadro = bytearray([protocolo.MARCADOR_COMPACTO])
+        protocolo._escrever_varint(quadro, len(corpo))
+        quadro += corpo
+    else:
+        quadro = b'[' * 100000 + b']' * 100000 + b'\n'
+    leitor = LeitorMensagens()
+    leitor.alimentar(bytes(quadro) + codec.codificar({'type': 'a'}))
+    with pytest.raises(protocolo.ErroProtocolo):
+        leitor.proxima()
+    assert leitor.proxima() == {'type': 'a'}
+
+
+def test_aninhamento_no_limite_e_aceito():
+    valor = None
+    for _ in range(protocolo.PROFUNDIDADE_MAXIMA - 1):
+        valor = [valor]
+    assert ler(COMPACTO.codificar({'v': valor})) == [{'v': valor}]
+
+
+@pytest.mark.parametrize('codec', CODECS, ids=lambda c: c.nome)
+def test_mensagem_que_nao_e_objeto(codec):
+    with pytest.raises(protocolo.ErroProtocolo):
+        ler(codec.codificar([1, 2]))
@@ -0,0 +1,36 @@
+import time
+
+import metricas
+from rastreio import Rastreador, novo_trace_id
+
+
+def test_trace_id_sugerido_so_se_razoavel():
+    assert novo_trace_id('abc') == 'abc'
+    assert novo_trace_id('x' * 65) != 'x' * 65
+    assert len(novo_trace_id(None)) == 16
+
+
+def test_percentis_separados_por_unidade():
+    rastreador = Rastreador(metricas.Registro())
+    for servidor_id in (1, 2):
+        trace_id = rastreador.iniciar(servidor_id=servidor_id, sala='3')
+        if servidor_id == 2:
+            time.sleep(0.02)
+        rastreador.marcar(trace_id, 'emitido')
+    um, dois = rastreador.percentis(1), rastreador.percentis(2)
+    assert set(um) == set(dois) == {'emitido'}
+    assert um['emitido']['p50'] < 10 <= dois['emitido']['p50']
+    assert rastreador.percentis(3) == {}
+    # O servidor central não informa unidade
+    rastreador.marcar(rastreador.iniciar(sala='1'), 'emitido')
+    assert set(rastreador.percentis()) == {'emitido'}
+
+
+def test_confirmacao_repetida_e_ignorada():
+    rastreador = Rastreador(metricas.Registro())
+    trace_id = rastreador.iniciar(servidor_id=1)
+    assert rastreador.confirmar(trace_id, 'tela', 'entregue')
+    assert not rastreador.confirmar(trace_id, 'tela', 'entregue')
+    assert not rastreador.confirmar(trace_id, 'tela', 'desconhecido')
+    assert [r['trace_id'] for r in rastreador.recentes(servidor_id=1)] == [trace_id]
+    assert rastreador.recentes(servidor_id=2) == []
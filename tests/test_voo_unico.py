@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+from voo_unico import VooUnico
+
+
+def test_reaproveita_enquanto_a_versao_nao_muda():
+    voo = VooUnico()
+    calculos = []
+
+    def calcular():
+        calculos.append(1)
+        return len(calculos)
+
+    assert voo.obter('fila', 1, calcular) == (1, False)
+    assert voo.obter('fila', 1, calcular) == (1, True)
+    assert voo.obter('fila', 2, calcular) == (2, False)
+    assert voo.obter('outra', 2, calcular) == (3, False)
+    assert voo.resumo() == {'calculados': 3, 'compartilhados': 1}
+
+
+def test_pedidos_simultaneos_dividem_um_calculo():
+    voo = VooUnico()
+    comecou = threading.Event()
+    liberar = threading.Event()
+    calculos = []
+
+    def calcular():
+        calculos.append(1)
+        comecou.set()
+        liberar.wait(5)
+        return 'fila'
+
+    resultados = []
+
+    def pedir():
+        resultados.append(voo.obter('fila', 1, calcular))
+
+    threads = [threading.Thread(target=pedir) for _ in range(8)]
+    threads[0].start()
+    comecou.wait(5)
+    # Os outros chegam com o cálculo em andamento e esperam por ele
+    for thread in threads[1:]:
+        thread.start()
+    liberar.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calculos) == 1
+    assert sorted(resultados) == [('fila', False)] + [('fila', True)] * 7
+
+
+def test_erro_nao_fica_guardado():
+    voo = VooUnico()
+
+    def falhar():
+        raise RuntimeError('banco fora')
+
+    with pytest.raises(RuntimeError):
+        voo.obter('fila', 1, falhar)
+    assert voo.obter('fila', 1, lambda: 'ok') == ('ok', False)
+
+
+def test_versao_antiga_nao_substitui_a_atual():
+    voo = VooUnico()
+    voo.obter('fila', 2, lambda: 'nova')
+    voo.obter('fila', 1, lambda: 'antiga')
+    assert voo.obter('fila', 2, lambda: 'recalculada') == ('nova', True)
+
+
+def test_guarda_no_maximo_as_chaves_mais_usadas():
+    voo = VooUnico(maximo_chaves=2)
+    voo.obter('a', 1, lambda: 'a1')
+    voo.obter('b', 1, lambda: 'b1')
+    voo.obter('a', 1, lambda: 'recalculado')  # 'a' passa a ser a mais usada
+    voo.obter('c', 1, lambda: 'c1')
+    assert voo.obter('a', 1, lambda: 'recalculado') == ('a1', True)
+    assert voo.obter('b', 1, lambda: 'b2') == ('b2', False)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sistema de Chamada Hospitalar - Snapshots compartilhados (single-flight)
+Pedidos iguais de snapshot da mesma unidade (get_fila, get_queue) dividem um
+único cálculo: quem chega enquanto ele roda espera o mesmo resultado, e quem
+chega depois o reaproveita enquanto a versão dos dados não muda.
+"""
+
+import threading
+from collections import Counter, OrderedDict
+
+# Resultados guardados (uma chave por unidade e conjunto de salas); acima disso
+# sai o usado há mais tempo
+MAXIMO_CHAVES = 256
+
+
+class _Voo:
+    __slots__ = ('evento', 'resultado', 'erro')
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+
+class VooUnico:
+    def __init__(self, maximo_chaves=MAXIMO_CHAVES):
+        self._lock = threading.Lock()
+        self.maximo_chaves = maximo_chaves
+        self._prontos = OrderedDict()  # {chave: (versao, resultado)}, do menos ao mais usado
+        self._em_voo = {}  # {(chave, versao): _Voo}
+        self.contadores = Counter()  # calculados, compartilhados
+
+    def obter(self, chave, versao, calcular):
+        """Resultado de calcular() para a chave na versão atual; retorna (resultado, compartilhado)"""
+        with self._lock:
+            pronto = self._prontos.get(chave)
+            if pronto is not None and pronto[0] == versao:
+                self._prontos.move_to_end(chave)
+                self.contadores['compartilhados'] += 1
+                return pronto[1], True
+            voo = self._em_voo.get((chave, versao))
+            dono = voo is None
+            if dono:
+                voo = self._em_voo[(chave, versao)] = _Voo()
+
+        if not dono:
+            voo.evento.wait()
+            if voo.erro is not None:
+                raise voo.erro
+            with self._lock:
+                self.contadores['compartilhados'] += 1
+            return voo.resultado, True
+
+        try:
+            voo.resultado = calcular()
+        except Exception as e:
+            voo.erro = e
+            raise
+        finally:
+            with self._lock:
+                del self._em_voo[(chave, versao)]
+                if voo.erro is None:
+                    anterior = self._prontos.get(chave)
+                    # Um cálculo mais lento de uma versão antiga não substitui o atual
+                    if anterior is None or anterior[0] <= versao:
+                        self._prontos[chave] = (versao, voo.resultado)
+                        self._prontos.move_to_end(chave)
+                        if len(self._prontos) > self.maximo_chaves:
+                            self._prontos.popitem(last=False)
+                    self.contadores['calculados'] += 1
+            voo.evento.set()
+        return voo.resultado, False
+
+    def resumo(self):
+        with self._lock:
+            return dict(self.contadores)